@@ -1,27 +1,445 @@
+import asyncio
 import json
+import math
 import os
 import hashlib
 import secrets
-from typing import Dict, Any
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Tuple
 from datetime import datetime, timedelta
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
-def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
+try:
+    import psycopg
+    from psycopg.rows import dict_row
+except ImportError:
+    psycopg = None
 
-def generate_session_token() -> str:
-    return secrets.token_urlsafe(32)
+try:
+    import redis
+except ImportError:
+    redis = None
 
-def get_user_from_session(cur, session_token: str) -> Dict[str, Any]:
-    cur.execute('''
+MAX_BULK_IDS = 10000
+STORY_OPERATIONS = ['publish', 'unpublish', 'delete']
+
+PREPARED_STATEMENTS = {
+    'session_user': '''
         SELECT u.id, u.email, u.username, u.full_name, u.avatar, u.role, u.bio
         FROM sessions s
         JOIN users u ON s.user_id = u.id
-        WHERE s.session_token = %s AND s.expires_at > NOW() AND u.is_active = true
-    ''', (session_token,))
+        WHERE s.session_token = $1 AND s.expires_at > NOW() AND u.is_active = true
+          AND s.expires_at >= $2 AND s.expires_at < $3
+    ''',
+    'login_user': '''
+        SELECT id, email, username, full_name, avatar, role, is_active
+        FROM users
+        WHERE email = $1 AND password_hash = $2
+    ''',
+    'session_insert': '''
+        INSERT INTO sessions (user_id, session_token, expires_at)
+        VALUES ($1, $2, $3)
+    '''
+}
+
+CONNECTION_MAX_AGE = 300
+
+_connection = None
+_connection_opened_at = 0.0
+_prepared_names: set = set()
+
+def get_connection():
+    global _connection, _connection_opened_at
+    conn = _connection
+    if conn is not None and not conn.closed:
+        if time.monotonic() - _connection_opened_at > CONNECTION_MAX_AGE:
+            conn.close()
+        elif conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                conn.close()
+    if conn is None or conn.closed:
+        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        _connection = conn
+        _connection_opened_at = time.monotonic()
+        _prepared_names.clear()
+    return conn
+
+def release_connection(conn) -> None:
+    if conn.closed:
+        return
+    try:
+        if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except psycopg2.Error:
+        conn.close()
+
+def execute_prepared(cur, name: str, params: tuple = ()) -> None:
+    if name not in _prepared_names:
+        cur.execute(f'PREPARE {name} AS {PREPARED_STATEMENTS[name]}')
+        _prepared_names.add(name)
+    if params:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cur.execute(f'EXECUTE {name}')
+
+PROFILE_QUERY = '''
+    SELECT u.id, u.username, u.full_name, u.avatar, u.bio, u.role, u.created_at::text,
+           COALESCE(us.stories_count, 0) as stories_count,
+           COALESCE(us.comments_count, 0) as comments_count,
+           COALESCE(us.views_received, 0) as views_received,
+           COALESCE(us.likes_received, 0) as likes_received,
+           COALESCE((
+               SELECT json_agg(r ORDER BY r.published_at DESC)
+               FROM (
+                   SELECT s.id, s.title, s.rating, s.views, s.likes, s.published_at::text as published_at
+                   FROM stories s
+                   WHERE s.created_by = u.id
+                   ORDER BY s.published_at DESC
+                   LIMIT 10
+               ) r
+           ), '[]') as recent_stories
+    FROM users u
+    LEFT JOIN user_stats us ON us.user_id = u.id
+    WHERE {profile_filter}
+'''
+
+ADMIN_STATS_QUERIES = [
+    ('SELECT COUNT(*) as count FROM users', None),
+    ('SELECT COUNT(*) as count FROM stories', None),
+    ('SELECT COUNT(*) as count FROM comments', None),
+    ("SELECT COUNT(*) as count FROM users WHERE created_at > NOW() - INTERVAL '7 days'", None),
+    ("SELECT COUNT(*) as count FROM stories WHERE published_at > NOW() - INTERVAL '7 days'", None)
+]
+
+_async_loop = None
+_async_connection = None
+
+async def _fetch_pipelined(queries: List[Any]) -> List[List[Dict[str, Any]]]:
+    global _async_connection
+    if _async_connection is None or _async_connection.closed:
+        _async_connection = await psycopg.AsyncConnection.connect(
+            os.environ['DATABASE_URL'], autocommit=True, row_factory=dict_row
+        )
+    conn = _async_connection
+    async with conn.pipeline():
+        cursors = [await conn.execute(sql, query_params) for sql, query_params in queries]
+    return [await c.fetchall() for c in cursors]
+
+def fetch_all_concurrently(cur, queries: List[Any]) -> List[List[Dict[str, Any]]]:
+    global _async_loop, _async_connection
+    if psycopg is None:
+        results = []
+        for sql, query_params in queries:
+            cur.execute(sql, query_params)
+            results.append(cur.fetchall())
+        return results
+    
+    if _async_loop is None:
+        _async_loop = asyncio.new_event_loop()
+    try:
+        return _async_loop.run_until_complete(_fetch_pipelined(queries))
+    except psycopg.OperationalError:
+        close_async_connection()
+        return _async_loop.run_until_complete(_fetch_pipelined(queries))
+
+def close_async_connection() -> None:
+    global _async_connection
+    conn, _async_connection = _async_connection, None
+    if conn is not None and not conn.closed:
+        try:
+            _async_loop.run_until_complete(conn.close())
+        except psycopg.Error:
+            pass
+
+def hash_password(password: str) -> str:
+    return hashlib.sha256(password.encode()).hexdigest()
+
+def generate_session_token(expires_at: datetime) -> str:
+    return f"{secrets.token_urlsafe(32)}.{expires_at.strftime('%Y%m%d')}"
+
+SESSION_ANY_EXPIRY = (datetime(1970, 1, 1), datetime(9999, 1, 1))
+
+def session_expiry_bounds(session_token: Any) -> Tuple[datetime, datetime]:
+    # Tokens end with the expiry day (generate_session_token), which names the
+    # sessions partition; older tokens without it fall back to every partition.
+    day = (session_token or '').rpartition('.')[2]
+    if len(day) == 8 and day.isdigit():
+        try:
+            start = datetime.strptime(day, '%Y%m%d')
+            return start, start + timedelta(days=1)
+        except ValueError:
+            pass
+    return SESSION_ANY_EXPIRY
+
+def get_user_from_session(cur, session_token: str) -> Dict[str, Any]:
+    execute_prepared(cur, 'session_user', (session_token, *session_expiry_bounds(session_token)))
     return cur.fetchone()
 
+def parse_id_list(raw_ids: Any) -> List[int]:
+    if not isinstance(raw_ids, list):
+        return []
+    ids = []
+    for raw_id in raw_ids:
+        try:
+            ids.append(int(raw_id))
+        except (TypeError, ValueError):
+            continue
+    return sorted(set(ids))
+
+def bulk_update_users(cur, user_ids: List[int], is_active: Any, role: Any) -> Dict[str, Any]:
+    updates = []
+    params_list: List[Any] = []
+
+    if is_active is not None:
+        updates.append('is_active = %s')
+        params_list.append(bool(is_active))
+
+    if role:
+        updates.append('role = %s')
+        params_list.append(role)
+
+    params_list.append(user_ids)
+    cur.execute(f'''
+        UPDATE users
+        SET {', '.join(updates)}, updated_at = NOW()
+        WHERE id = ANY(%s)
+        RETURNING id
+    ''', params_list)
+    updated_ids = [row['id'] for row in cur.fetchall()]
+
+    revoked_sessions = 0
+    if is_active is not None and not is_active and updated_ids:
+        cur.execute('DELETE FROM sessions WHERE user_id = ANY(%s)', (updated_ids,))
+        revoked_sessions = cur.rowcount
+
+    return {'updated': updated_ids, 'revokedSessions': revoked_sessions}
+
+def bulk_moderate_stories(cur, story_ids: List[int], operation: str) -> Dict[str, Any]:
+    if operation in ('publish', 'unpublish'):
+        new_status = 'published' if operation == 'publish' else 'unpublished'
+        delta = 1 if operation == 'publish' else -1
+        cur.execute('''
+            WITH changed AS (
+                UPDATE stories
+                SET status = %s, status_changed_at = NOW()
+                WHERE id = ANY(%s) AND status IS DISTINCT FROM %s
+                RETURNING id, author_id
+            ), adjusted AS (
+                UPDATE authors a
+                SET stories_count = GREATEST(a.stories_count + %s * c.cnt, 0)
+                FROM (SELECT author_id, COUNT(*) AS cnt FROM changed GROUP BY author_id) c
+                WHERE a.id = c.author_id
+            )
+            SELECT COALESCE(array_agg(id ORDER BY id), '{}') AS ids FROM changed
+        ''', (new_status, story_ids, new_status, delta))
+        return {'updated': cur.fetchone()['ids']}
+
+    cur.execute('''
+        UPDATE authors a
+        SET stories_count = GREATEST(a.stories_count - c.cnt, 0),
+            rating_sum = GREATEST(a.rating_sum - c.rating_sum, 0),
+            rating_count = GREATEST(a.rating_count - c.rating_count, 0),
+            rating = CASE WHEN c.rating_count > 0
+                THEN ROUND(GREATEST(a.rating_sum - c.rating_sum, 0)::numeric
+                           / NULLIF(GREATEST(a.rating_count - c.rating_count, 0), 0), 1)
+                ELSE a.rating END
+        FROM (
+            SELECT author_id,
+                   COUNT(*) FILTER (WHERE status = 'published') AS cnt,
+                   COALESCE(SUM(rating_sum), 0) AS rating_sum,
+                   COALESCE(SUM(rating_count), 0) AS rating_count
+            FROM stories
+            WHERE id = ANY(%s)
+            GROUP BY author_id
+        ) c
+        WHERE a.id = c.author_id
+    ''', (story_ids,))
+
+    cur.execute('''
+        UPDATE user_stats us
+        SET stories_count = GREATEST(us.stories_count - o.cnt, 0),
+            views_received = GREATEST(us.views_received - o.views, 0),
+            likes_received = GREATEST(us.likes_received - o.likes, 0),
+            updated_at = NOW()
+        FROM (
+            SELECT created_by, COUNT(*) AS cnt, SUM(views) AS views, SUM(likes) AS likes
+            FROM stories
+            WHERE id = ANY(%s) AND created_by IS NOT NULL
+            GROUP BY created_by
+        ) o
+        WHERE us.user_id = o.created_by
+    ''', (story_ids,))
+
+    cur.execute('''
+        UPDATE user_stats us
+        SET comments_count = GREATEST(us.comments_count - c.cnt, 0),
+            updated_at = NOW()
+        FROM (
+            SELECT created_by, COUNT(*) AS cnt
+            FROM comments
+            WHERE story_id = ANY(%s) AND created_by IS NOT NULL
+            GROUP BY created_by
+        ) c
+        WHERE us.user_id = c.created_by
+    ''', (story_ids,))
+
+    cur.execute('DELETE FROM story_genres WHERE story_id = ANY(%s)', (story_ids,))
+    cur.execute('DELETE FROM likes WHERE story_id = ANY(%s)', (story_ids,))
+    removed_likes = cur.rowcount
+    cur.execute('DELETE FROM comments WHERE story_id = ANY(%s)', (story_ids,))
+    removed_comments = cur.rowcount
+    cur.execute('DELETE FROM user_stories WHERE story_id = ANY(%s)', (story_ids,))
+    cur.execute('DELETE FROM story_ratings WHERE story_id = ANY(%s)', (story_ids,))
+    cur.execute('DELETE FROM reading_progress WHERE story_id = ANY(%s)', (story_ids,))
+    cur.execute('DELETE FROM following_inbox WHERE story_id = ANY(%s)', (story_ids,))
+    cur.execute('DELETE FROM story_content_archive WHERE story_id = ANY(%s)', (story_ids,))
+    cur.execute('DELETE FROM story_trending WHERE story_id = ANY(%s)', (story_ids,))
+    cur.execute('DELETE FROM notifications WHERE story_id = ANY(%s)', (story_ids,))
+    cur.execute('''
+        DELETE FROM story_similar WHERE story_id = ANY(%s) OR similar_story_id = ANY(%s)
+    ''', (story_ids, story_ids))
+    cur.execute('DELETE FROM stories WHERE id = ANY(%s) RETURNING id', (story_ids,))
+    deleted_ids = sorted(row['id'] for row in cur.fetchall())
+
+    return {
+        'deleted': deleted_ids,
+        'removedLikes': removed_likes,
+        'removedComments': removed_comments
+    }
+
+RATE_LIMITS = {
+    'login': (('ip', 20, 20 / 60), ('account', 5, 5 / 300)),
+    'register': (('ip', 5, 5 / 3600),)
+}
+RATE_LIMIT_MAX_BUCKETS = 10000
+RATE_LIMIT_SHARED_TIMEOUT = 0.05
+RATE_LIMIT_SHARED_RETRY = 30.0
+
+TOKEN_BUCKET_LUA = '''
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+redis.call('HINCRBY', KEYS[2], allowed == 1 and 'admitted' or 'rejected', 1)
+return {allowed, tostring(tokens)}
+'''
+
+_rate_buckets: 'OrderedDict[str, List[float]]' = OrderedDict()
+_rate_limit_stats: Dict[str, Dict[str, int]] = {}
+_rate_limit_script = None
+_rate_limit_shared_down_until = 0.0
+
+def get_rate_limit_script() -> Any:
+    global _rate_limit_script
+    url = os.environ.get('RATE_LIMIT_REDIS_URL')
+    if redis is None or not url or time.monotonic() < _rate_limit_shared_down_until:
+        return None
+    if _rate_limit_script is None:
+        client = redis.Redis.from_url(
+            url, socket_timeout=RATE_LIMIT_SHARED_TIMEOUT, socket_connect_timeout=RATE_LIMIT_SHARED_TIMEOUT
+        )
+        _rate_limit_script = client.register_script(TOKEN_BUCKET_LUA)
+    return _rate_limit_script
+
+def take_local_token(key: str, capacity: int, rate: float) -> float:
+    now = time.monotonic()
+    bucket = _rate_buckets.get(key)
+    if bucket is None:
+        bucket = [float(capacity), now]
+        _rate_buckets[key] = bucket
+        if len(_rate_buckets) > RATE_LIMIT_MAX_BUCKETS:
+            _rate_buckets.popitem(last=False)
+    else:
+        _rate_buckets.move_to_end(key)
+        bucket[0] = min(float(capacity), bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+    if bucket[0] < 1:
+        return (1 - bucket[0]) / rate
+    bucket[0] -= 1
+    return 0.0
+
+def take_shared_token(key: str, capacity: int, rate: float, action: str) -> Any:
+    global _rate_limit_shared_down_until
+    script = get_rate_limit_script()
+    if script is None:
+        return None
+    try:
+        allowed, tokens = script(keys=[f'ratelimit:{key}', f'ratelimit-stats:{action}'], args=[capacity, rate])
+    except redis.RedisError:
+        _rate_limit_shared_down_until = time.monotonic() + RATE_LIMIT_SHARED_RETRY
+        return None
+    return 0.0 if allowed else (1 - float(tokens)) / rate
+
+def request_ip(event: Dict[str, Any]) -> str:
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    return identity.get('sourceIp') or 'unknown'
+
+def check_rate_limit(action: Any, identities: Dict[str, Any], admit: bool = True) -> Any:
+    limits = RATE_LIMITS.get(action)
+    if not limits:
+        return None
+    stats = _rate_limit_stats.setdefault(action, {'admitted': 0, 'rejected': 0, 'rejectedLocally': 0, 'sharedChecks': 0})
+    retry_after = 0.0
+    for dimension, capacity, rate in limits:
+        if identities.get(dimension) is None:
+            continue
+        key = f'{action}:{dimension}:{identities[dimension]}'
+        wait = take_local_token(key, capacity, rate)
+        if wait:
+            stats['rejectedLocally'] += 1
+        else:
+            wait = take_shared_token(key, capacity, rate, action)
+            if wait is not None:
+                stats['sharedChecks'] += 1
+        retry_after = max(retry_after, wait or 0.0)
+    if not retry_after:
+        if admit:
+            stats['admitted'] += 1
+        return None
+    stats['rejected'] += 1
+    return {
+        'statusCode': 429,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Retry-After': str(math.ceil(retry_after))
+        },
+        'isBase64Encoded': False,
+        'body': json.dumps({'error': 'Too many requests', 'retryAfter': math.ceil(retry_after)})
+    }
+
+def rate_limit_stats() -> Dict[str, Any]:
+    report = {
+        'actions': {action: dict(stats) for action, stats in _rate_limit_stats.items()},
+        'buckets': len(_rate_buckets),
+        'shared': get_rate_limit_script() is not None
+    }
+    if report['shared']:
+        try:
+            client = _rate_limit_script.registered_client
+            report['sharedActions'] = {
+                action: {k.decode(): int(v) for k, v in client.hgetall(f'ratelimit-stats:{action}').items()}
+                for action in RATE_LIMITS
+            }
+        except redis.RedisError:
+            pass
+    return report
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: API для регистрации, авторизации, управления сессиями, профилем и админ-панели
@@ -48,13 +466,22 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': ''
         }
     
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
     if method == 'POST':
         body_data = json.loads(event.get('body', '{}'))
         action = body_data.get('action', 'login')
+        account = body_data.get('email')
         
+        limited = check_rate_limit(action, {
+            'ip': request_ip(event),
+            'account': hashlib.sha1(account.strip().lower().encode('utf-8')).hexdigest() if isinstance(account, str) else None
+        })
+        if limited:
+            return limited
+    
+    conn = get_connection()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    
+    if method == 'POST':
         if action == 'register':
             email = body_data.get('email')
             password = body_data.get('password')
@@ -63,7 +490,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             if not email or not password or not username:
                 cur.close()
-                conn.close()
+                release_connection(conn)
                 return {
                     'statusCode': 400,
                     'headers': {
@@ -85,7 +512,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             if cur.fetchone():
                 cur.close()
-                conn.close()
+                release_connection(conn)
                 return {
                     'statusCode': 409,
                     'headers': {
@@ -104,17 +531,20 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             user = cur.fetchone()
             
-            session_token = generate_session_token()
             expires_at = datetime.now() + timedelta(days=30)
+            session_token = generate_session_token(expires_at)
+            
+            execute_prepared(cur, 'session_insert', (user['id'], session_token, expires_at))
             
             cur.execute('''
-                INSERT INTO sessions (user_id, session_token, expires_at)
-                VALUES (%s, %s, %s)
-            ''', (user['id'], session_token, expires_at))
+                INSERT INTO user_stats (user_id)
+                VALUES (%s)
+                ON CONFLICT (user_id) DO NOTHING
+            ''', (user['id'],))
             
             conn.commit()
             cur.close()
-            conn.close()
+            release_connection(conn)
             
             return {
                 'statusCode': 201,
@@ -143,7 +573,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             if not email or not password:
                 cur.close()
-                conn.close()
+                release_connection(conn)
                 return {
                     'statusCode': 400,
                     'headers': {
@@ -158,17 +588,13 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             password_hash = hash_password(password)
             
-            cur.execute('''
-                SELECT id, email, username, full_name, avatar, role, is_active
-                FROM users
-                WHERE email = %s AND password_hash = %s
-            ''', (email, password_hash))
+            execute_prepared(cur, 'login_user', (email, password_hash))
             
             user = cur.fetchone()
             
             if not user:
                 cur.close()
-                conn.close()
+                release_connection(conn)
                 return {
                     'statusCode': 401,
                     'headers': {
@@ -181,7 +607,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             if not user['is_active']:
                 cur.close()
-                conn.close()
+                release_connection(conn)
                 return {
                     'statusCode': 403,
                     'headers': {
@@ -192,17 +618,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps({'error': 'Account is disabled'})
                 }
             
-            session_token = generate_session_token()
             expires_at = datetime.now() + timedelta(days=30)
+            session_token = generate_session_token(expires_at)
             
-            cur.execute('''
-                INSERT INTO sessions (user_id, session_token, expires_at)
-                VALUES (%s, %s, %s)
-            ''', (user['id'], session_token, expires_at))
+            execute_prepared(cur, 'session_insert', (user['id'], session_token, expires_at))
             
             conn.commit()
             cur.close()
-            conn.close()
+            release_connection(conn)
             
             return {
                 'statusCode': 200,
@@ -231,7 +654,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         if not session_token:
             cur.close()
-            conn.close()
+            release_connection(conn)
             return {
                 'statusCode': 401,
                 'headers': {
@@ -246,7 +669,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         if not user:
             cur.close()
-            conn.close()
+            release_connection(conn)
             return {
                 'statusCode': 401,
                 'headers': {
@@ -261,51 +684,31 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             username = params.get('username')
             
             if username:
-                cur.execute('''
-                    SELECT id, username, full_name, avatar, bio, role, created_at::text
-                    FROM users
-                    WHERE username = %s AND is_active = true
-                ''', (username,))
-                profile_user = cur.fetchone()
-                
-                if not profile_user:
-                    cur.close()
-                    conn.close()
-                    return {
-                        'statusCode': 404,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'isBase64Encoded': False,
-                        'body': json.dumps({'error': 'User not found'})
-                    }
-                
-                user_id = profile_user['id']
+                profile_filter = 'u.username = %s AND u.is_active = true'
+                profile_param = username
             else:
-                profile_user = user
-                user_id = user['id']
+                profile_filter = 'u.id = %s'
+                profile_param = user['id']
             
-            cur.execute('SELECT COUNT(*) as count FROM stories WHERE created_by = %s', (user_id,))
-            stories_count = cur.fetchone()['count']
-            
-            cur.execute('''
-                SELECT s.id, s.title, s.rating, s.views, s.likes, s.published_at::text as published_at
-                FROM stories s
-                WHERE s.created_by = %s
-                ORDER BY s.published_at DESC
-                LIMIT 10
-            ''', (user_id,))
-            recent_stories = cur.fetchall()
-            
-            cur.execute('SELECT COUNT(*) as count FROM comments WHERE created_by = %s', (user_id,))
-            comments_count = cur.fetchone()['count']
+            cur.execute(PROFILE_QUERY.format(profile_filter=profile_filter), (profile_param,))
+            profile_user = cur.fetchone()
             
             cur.close()
-            conn.close()
+            release_connection(conn)
+            
+            if not profile_user:
+                return {
+                    'statusCode': 404,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'User not found'})
+                }
             
             stories_list = []
-            for story in recent_stories:
+            for story in profile_user['recent_stories']:
                 stories_list.append({
                     'id': story['id'],
                     'title': story['title'],
@@ -330,11 +733,13 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'avatar': profile_user['avatar'],
                         'bio': profile_user['bio'],
                         'role': profile_user['role'],
-                        'createdAt': profile_user.get('created_at')
+                        'createdAt': profile_user['created_at']
                     },
                     'stats': {
-                        'storiesCount': stories_count,
-                        'commentsCount': comments_count
+                        'storiesCount': profile_user['stories_count'],
+                        'commentsCount': profile_user['comments_count'],
+                        'viewsReceived': profile_user['views_received'],
+                        'likesReceived': profile_user['likes_received']
                     },
                     'recentStories': stories_list
                 })
@@ -343,7 +748,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         if resource == 'admin':
             if user['role'] != 'admin':
                 cur.close()
-                conn.close()
+                release_connection(conn)
                 return {
                     'statusCode': 403,
                     'headers': {
@@ -357,23 +762,13 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             admin_resource = params.get('admin_resource', 'stats')
             
             if admin_resource == 'stats':
-                cur.execute('SELECT COUNT(*) as count FROM users')
-                users_count = cur.fetchone()['count']
-                
-                cur.execute('SELECT COUNT(*) as count FROM stories')
-                stories_count = cur.fetchone()['count']
-                
-                cur.execute('SELECT COUNT(*) as count FROM comments')
-                comments_count = cur.fetchone()['count']
-                
-                cur.execute("SELECT COUNT(*) as count FROM users WHERE created_at > NOW() - INTERVAL '7 days'")
-                new_users = cur.fetchone()['count']
-                
-                cur.execute("SELECT COUNT(*) as count FROM stories WHERE published_at > NOW() - INTERVAL '7 days'")
-                new_stories = cur.fetchone()['count']
+                counts = fetch_all_concurrently(cur, ADMIN_STATS_QUERIES)
+                users_count, stories_count, comments_count, new_users, new_stories = [
+                    rows[0]['count'] for rows in counts
+                ]
                 
                 cur.close()
-                conn.close()
+                release_connection(conn)
                 
                 return {
                     'statusCode': 200,
@@ -389,7 +784,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             'totalComments': comments_count,
                             'newUsersWeek': new_users,
                             'newStoriesWeek': new_stories
-                        }
+                        },
+                        'rateLimits': rate_limit_stats()
                     })
                 }
             
@@ -397,21 +793,20 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 limit = int(params.get('limit', 50))
                 offset = int(params.get('offset', 0))
                 
-                cur.execute('''
-                    SELECT id, username, email, full_name, role, is_active, 
-                           created_at::text, updated_at::text
-                    FROM users
-                    ORDER BY created_at DESC
-                    LIMIT %s OFFSET %s
-                ''', (limit, offset))
-                
-                users_list = cur.fetchall()
-                
-                cur.execute('SELECT COUNT(*) as count FROM users')
-                total = cur.fetchone()['count']
+                users_list, total_rows = fetch_all_concurrently(cur, [
+                    ('''
+                        SELECT id, username, email, full_name, role, is_active, 
+                               created_at::text, updated_at::text
+                        FROM users
+                        ORDER BY created_at DESC
+                        LIMIT %s OFFSET %s
+                    ''', (limit, offset)),
+                    ('SELECT COUNT(*) as count FROM users', None)
+                ])
+                total = total_rows[0]['count']
                 
                 cur.close()
-                conn.close()
+                release_connection(conn)
                 
                 result_users = []
                 for u in users_list:
@@ -445,22 +840,21 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 limit = int(params.get('limit', 50))
                 offset = int(params.get('offset', 0))
                 
-                cur.execute('''
-                    SELECT s.id, s.title, s.views, s.likes, s.comments_count, 
-                           s.published_at::text, u.username as author
-                    FROM stories s
-                    LEFT JOIN users u ON s.created_by = u.id
-                    ORDER BY s.published_at DESC
-                    LIMIT %s OFFSET %s
-                ''', (limit, offset))
-                
-                stories_list = cur.fetchall()
-                
-                cur.execute('SELECT COUNT(*) as count FROM stories')
-                total = cur.fetchone()['count']
+                stories_list, total_rows = fetch_all_concurrently(cur, [
+                    ('''
+                        SELECT s.id, s.title, s.views, s.likes, s.comments_count, s.status,
+                               s.published_at::text, u.username as author
+                        FROM stories s
+                        LEFT JOIN users u ON s.created_by = u.id
+                        ORDER BY s.published_at DESC
+                        LIMIT %s OFFSET %s
+                    ''', (limit, offset)),
+                    ('SELECT COUNT(*) as count FROM stories', None)
+                ])
+                total = total_rows[0]['count']
                 
                 cur.close()
-                conn.close()
+                release_connection(conn)
                 
                 result_stories = []
                 for s in stories_list:
@@ -471,6 +865,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'views': s['views'],
                         'likes': s['likes'],
                         'comments': s['comments_count'],
+                        'status': s['status'],
                         'publishedAt': s['published_at']
                     })
                 
@@ -490,7 +885,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 }
         
         cur.close()
-        conn.close()
+        release_connection(conn)
         
         return {
             'statusCode': 200,
@@ -515,7 +910,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     if method == 'PUT':
         if not session_token_header:
             cur.close()
-            conn.close()
+            release_connection(conn)
             return {
                 'statusCode': 401,
                 'headers': {
@@ -530,7 +925,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         if not user:
             cur.close()
-            conn.close()
+            release_connection(conn)
             return {
                 'statusCode': 401,
                 'headers': {
@@ -544,13 +939,91 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         body_data = json.loads(event.get('body', '{}'))
         
         if resource == 'admin' and user['role'] == 'admin':
+            admin_action = body_data.get('action')
+
+            if admin_action in ('bulk_users', 'bulk_stories'):
+                ids_key = 'userIds' if admin_action == 'bulk_users' else 'storyIds'
+                target_ids = parse_id_list(body_data.get(ids_key))
+                operation = body_data.get('operation')
+                is_active = body_data.get('isActive')
+                role = body_data.get('role')
+
+                error = None
+                if not target_ids:
+                    error = f'{ids_key} must be a non-empty list of ids'
+                elif len(target_ids) > MAX_BULK_IDS:
+                    error = f'At most {MAX_BULK_IDS} ids per request'
+                elif admin_action == 'bulk_users' and is_active is None and not role:
+                    error = 'isActive or role required'
+                elif admin_action == 'bulk_users' and user['id'] in target_ids:
+                    error = 'Cannot moderate your own account'
+                elif admin_action == 'bulk_stories' and operation not in STORY_OPERATIONS:
+                    error = f'operation must be one of {STORY_OPERATIONS}'
+
+                if error:
+                    cur.close()
+                    release_connection(conn)
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': error})
+                    }
+
+                started = time.perf_counter()
+                try:
+                    if admin_action == 'bulk_users':
+                        result = bulk_update_users(cur, target_ids, is_active, role)
+                    else:
+                        result = bulk_moderate_stories(cur, target_ids, operation)
+                    conn.commit()
+                except psycopg2.Error:
+                    conn.rollback()
+                    cur.close()
+                    release_connection(conn)
+                    return {
+                        'statusCode': 500,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'Bulk operation failed, nothing was changed'})
+                    }
+                elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+
+                cur.close()
+                release_connection(conn)
+
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({
+                        'success': True,
+                        'action': admin_action,
+                        'requested': len(target_ids),
+                        'result': result,
+                        'timing': {
+                            'elapsedMs': elapsed_ms,
+                            'perItemMs': round(elapsed_ms / len(target_ids), 4)
+                        }
+                    })
+                }
+
             user_id_to_update = body_data.get('userId')
             is_active = body_data.get('isActive')
             role = body_data.get('role')
             
             if not user_id_to_update:
                 cur.close()
-                conn.close()
+                release_connection(conn)
                 return {
                     'statusCode': 400,
                     'headers': {
@@ -583,10 +1056,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 
                 cur.execute(query, params_list)
                 updated_user = cur.fetchone()
+
+                if updated_user and not updated_user['is_active']:
+                    cur.execute('DELETE FROM sessions WHERE user_id = %s', (updated_user['id'],))
+
                 conn.commit()
                 
                 cur.close()
-                conn.close()
+                release_connection(conn)
                 
                 return {
                     'statusCode': 200,
@@ -627,7 +1104,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         if not update_fields:
             cur.close()
-            conn.close()
+            release_connection(conn)
             return {
                 'statusCode': 400,
                 'headers': {
@@ -653,7 +1130,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         conn.commit()
         cur.close()
-        conn.close()
+        release_connection(conn)
         
         return {
             'statusCode': 200,
@@ -681,12 +1158,13 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         if session_token:
             cur.execute('''
-                DELETE FROM sessions WHERE session_token = %s
-            ''', (session_token,))
+                DELETE FROM sessions
+                WHERE session_token = %s AND expires_at >= %s AND expires_at < %s
+            ''', (session_token, *session_expiry_bounds(session_token)))
             conn.commit()
         
         cur.close()
-        conn.close()
+        release_connection(conn)
         
         return {
             'statusCode': 200,
@@ -699,7 +1177,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     cur.close()
-    conn.close()
+    release_connection(conn)
     
     return {
         'statusCode': 405,
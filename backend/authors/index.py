@@ -1,9 +1,503 @@
+import base64
+import gzip
+import hashlib
 import json
 import os
-from typing import Dict, Any
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Any, List, Tuple
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
+LEADERBOARD_CACHE_TTL = 15
+LEADERBOARD_CACHE_MAX_ENTRIES = 64
+LEADERBOARD_MAX_TOP = 100
+ENGAGEMENT_WINDOW_DAYS = 7
+AUTHOR_PAGE_SIZE = 20
+AUTHOR_PAGE_MAX_SIZE = 50
+AUTHOR_PAGE_MAX_AGE = 30
+MAX_INT4 = 2147483647
+FANOUT_MAX_FOLLOWERS = 5000
+FOLLOW_BACKFILL_STORIES = 50
+FOLLOWING_FEED_SIZE = 20
+FOLLOWING_FEED_MAX_SIZE = 50
+ANALYTICS_SCOPES = ('story', 'author', 'site')
+ANALYTICS_SERIES = {'hour': 'engagement_hourly_series', 'day': 'engagement_daily_series'}
+ANALYTICS_DEFAULT_DAYS = 30
+ANALYTICS_MAX_DAYS = 365
+HOURLY_RETENTION_DAYS = 7
+ANALYTICS_MAX_AGE = 60
+SNAPSHOT_CACHE_TTL = 5
+SNAPSHOT_CACHE_MAX_ENTRIES = 256
+SNAPSHOT_MAX_AGE = 600
+
+LEADERBOARD_SCORES = {
+    'followers': ('a.followers', ''),
+    'rating': ('a.rating', ''),
+    'stories': ('a.stories_count', ''),
+    'engagement': ('COALESCE(e.score, 0)', f'''
+        LEFT JOIN (
+            SELECT s.author_id, SUM(x.weight) AS score
+            FROM (
+                SELECT story_id, 1 AS weight FROM likes
+                WHERE created_at > NOW() - INTERVAL '{ENGAGEMENT_WINDOW_DAYS} days'
+                UNION ALL
+                SELECT story_id, 2 AS weight FROM comments
+                WHERE created_at > NOW() - INTERVAL '{ENGAGEMENT_WINDOW_DAYS} days'
+            ) x
+            JOIN stories s ON s.id = x.story_id
+            GROUP BY s.author_id
+        ) e ON e.author_id = a.id
+    ''')
+}
+
+PREPARED_STATEMENTS = {
+    'author_by_id': '''
+        SELECT id, name, avatar, bio, rating, stories_count as stories, followers
+        FROM authors
+        WHERE id = $1
+    ''',
+    'author_page': '''
+        SELECT a.id, a.name, a.avatar, a.bio, a.rating, a.stories_count as stories, a.followers,
+               COALESCE((
+                   SELECT json_agg(p ORDER BY p.published_at DESC, p.id DESC)
+                   FROM (
+                       SELECT s.id, s.title, s.description, s.rating, s.views, s.likes,
+                              s.comments_count as comments, s.reading_time as "readingTime",
+                              s.published_at, s.published_at::text as "publishedAt",
+                              ARRAY(SELECT sg.genre FROM story_genres sg WHERE sg.story_id = s.id) as genre
+                       FROM stories s
+                       WHERE s.author_id = a.id AND s.status = 'published'
+                         AND ($2::timestamp IS NULL OR (s.published_at, s.id) < ($2::timestamp, $3::int))
+                       ORDER BY s.published_at DESC, s.id DESC
+                       LIMIT $4
+                   ) p
+               ), '[]') as story_page
+        FROM authors a
+        WHERE a.id = $1
+    ''',
+    'feed_snapshot': '''
+        SELECT content_hash, body, built_at FROM feed_snapshots
+        WHERE snapshot_key = $1 AND refreshed_at > NOW() - make_interval(secs => $2)
+    ''',
+    'leaderboard_top': '''
+        SELECT a.id, a.name, a.avatar, a.bio, a.rating, a.stories_count as stories, a.followers,
+               lb.rank, lb.score
+        FROM author_leaderboard lb
+        JOIN authors a ON a.id = lb.author_id
+        WHERE lb.mode = $1 AND lb.rank <= COALESCE($2, 2147483647)
+        ORDER BY lb.rank
+    ''',
+    'session_user_id': '''
+        SELECT user_id FROM sessions
+        WHERE session_token = $1 AND expires_at > NOW() AND expires_at >= $2 AND expires_at < $3
+    ''',
+    'analytics_access': '''
+        SELECT u.role = 'admin' AS is_admin,
+               EXISTS (
+                   SELECT 1 FROM stories st
+                   WHERE st.created_by = u.id
+                     AND CASE $2::text WHEN 'story' THEN st.id = $3 WHEN 'author' THEN st.author_id = $3 ELSE false END
+               ) AS is_owner
+        FROM sessions s
+        JOIN users u ON u.id = s.user_id
+        WHERE s.session_token = $1 AND s.expires_at > NOW() AND u.is_active = true
+          AND s.expires_at >= $4 AND s.expires_at < $5
+    ''',
+    'follow_insert': '''
+        INSERT INTO author_follows (user_id, author_id)
+        VALUES ($1, $2)
+        ON CONFLICT (user_id, author_id) DO NOTHING
+        RETURNING author_id
+    ''',
+    'follow_delete': '''
+        DELETE FROM author_follows
+        WHERE user_id = $1 AND author_id = $2
+        RETURNING author_id
+    ''',
+    'author_followers_bump': '''
+        UPDATE authors
+        SET followers = GREATEST(followers + $2, 0)
+        WHERE id = $1
+        RETURNING followers, fanout_pull
+    ''',
+    'author_followers': '''
+        SELECT followers, fanout_pull FROM authors WHERE id = $1
+    ''',
+    'inbox_backfill': '''
+        INSERT INTO following_inbox (user_id, story_id, author_id, published_at)
+        SELECT $1, s.id, s.author_id, s.published_at
+        FROM stories s
+        WHERE s.author_id = $2 AND s.status = 'published'
+        ORDER BY s.published_at DESC, s.id DESC
+        LIMIT $3
+        ON CONFLICT (user_id, story_id) DO NOTHING
+    ''',
+    'inbox_remove_author': '''
+        DELETE FROM following_inbox
+        WHERE user_id = $1 AND author_id = $2
+    ''',
+    'following_feed': '''
+        SELECT s.id, s.title, s.description, s.rating, s.views, s.likes,
+               s.comments_count as comments, s.reading_time as "readingTime",
+               s.published_at::text as "publishedAt",
+               a.id as author_id, a.name as author_name, a.avatar as author_avatar,
+               ARRAY(SELECT sg.genre FROM story_genres sg WHERE sg.story_id = s.id) as genre
+        FROM (
+            (
+                SELECT i.story_id AS id, i.published_at
+                FROM following_inbox i
+                JOIN stories ps ON ps.id = i.story_id AND ps.status = 'published'
+                WHERE i.user_id = $1
+                  AND ($2::timestamp IS NULL OR (i.published_at, i.story_id) < ($2::timestamp, $3::int))
+                ORDER BY i.published_at DESC, i.story_id DESC
+                LIMIT $4
+            )
+            UNION
+            (
+                SELECT pulled.id, pulled.published_at
+                FROM author_follows f
+                JOIN authors fa ON fa.id = f.author_id AND fa.fanout_pull
+                CROSS JOIN LATERAL (
+                    SELECT ps.id, ps.published_at
+                    FROM stories ps
+                    WHERE ps.author_id = f.author_id AND ps.status = 'published'
+                      AND ($2::timestamp IS NULL OR (ps.published_at, ps.id) < ($2::timestamp, $3::int))
+                    ORDER BY ps.published_at DESC, ps.id DESC
+                    LIMIT $4
+                ) pulled
+                WHERE f.user_id = $1
+            )
+        ) feed
+        JOIN stories s ON s.id = feed.id
+        JOIN authors a ON a.id = s.author_id
+        ORDER BY feed.published_at DESC, feed.id DESC
+        LIMIT $4
+    ''',
+    'engagement_hourly_series': '''
+        SELECT bucket::text as bucket, views, likes, comments
+        FROM engagement_hourly
+        WHERE scope = $1 AND scope_id = $2 AND bucket >= NOW() - make_interval(days => $3)
+        ORDER BY bucket
+    ''',
+    'engagement_daily_series': '''
+        SELECT day::text as bucket, SUM(views)::int as views, SUM(likes)::int as likes,
+               SUM(comments)::int as comments
+        FROM (
+            SELECT day, views, likes, comments
+            FROM engagement_daily
+            WHERE scope = $1 AND scope_id = $2 AND day >= (NOW() - make_interval(days => $3))::date
+            UNION ALL
+            SELECT bucket::date, views, likes, comments
+            FROM engagement_hourly
+            WHERE scope = $1 AND scope_id = $2 AND bucket >= (NOW() - make_interval(days => $3))::date
+        ) series
+        GROUP BY day
+        ORDER BY day
+    ''',
+    'leaderboard_ranks': '''
+        SELECT lb.mode, lb.rank, lb.score, r.authors_count as total
+        FROM author_leaderboard lb
+        JOIN author_leaderboard_refresh r ON r.mode = lb.mode
+        WHERE lb.author_id = $1
+    '''
+}
+
+CONNECTION_MAX_AGE = 300
+
+_connection = None
+_connection_opened_at = 0.0
+_prepared_names: set = set()
+
+def get_connection():
+    global _connection, _connection_opened_at
+    conn = _connection
+    if conn is not None and not conn.closed:
+        if time.monotonic() - _connection_opened_at > CONNECTION_MAX_AGE:
+            conn.close()
+        elif conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                conn.close()
+    if conn is None or conn.closed:
+        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        _connection = conn
+        _connection_opened_at = time.monotonic()
+        _prepared_names.clear()
+    return conn
+
+def release_connection(conn) -> None:
+    if conn.closed:
+        return
+    try:
+        if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except psycopg2.Error:
+        conn.close()
+
+REPLICA_MAX_LAG_SECONDS = 5.0
+REPLICA_CHECK_INTERVAL = 5.0
+
+_replica_connection = None
+_replica_opened_at = 0.0
+_replica_prepared_names: set = set()
+_replica_status: Dict[str, Any] = {'checked_at': 0.0, 'lag': None, 'replay_lsn': 0}
+
+def parse_lsn(lsn: Any) -> int:
+    try:
+        high, low = str(lsn).split('/')
+        return (int(high, 16) << 32) | int(low, 16)
+    except (ValueError, AttributeError):
+        return 0
+
+def get_replica_connection():
+    global _replica_connection, _replica_opened_at
+    dsns = [dsn.strip() for dsn in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if dsn.strip()]
+    if not dsns:
+        return None
+    conn = _replica_connection
+    if conn is not None and not conn.closed and time.monotonic() - _replica_opened_at > CONNECTION_MAX_AGE:
+        conn.close()
+    if conn is None or conn.closed:
+        try:
+            conn = psycopg2.connect(dsns[os.getpid() % len(dsns)], connect_timeout=2)
+        except psycopg2.OperationalError:
+            _replica_status.update({'checked_at': time.monotonic(), 'lag': None})
+            return None
+        conn.autocommit = True
+        _replica_connection = conn
+        _replica_opened_at = time.monotonic()
+        _replica_prepared_names.clear()
+    return conn
+
+def refresh_replica_status(conn) -> None:
+    cur = conn.cursor()
+    cur.execute('''
+        SELECT pg_last_wal_replay_lsn()::text,
+               CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0)
+               END
+    ''')
+    replay_lsn, lag = cur.fetchone()
+    cur.close()
+    _replica_status.update({'checked_at': time.monotonic(), 'lag': float(lag), 'replay_lsn': parse_lsn(replay_lsn)})
+
+def get_read_connection(consistency_token: Any = None) -> Any:
+    replica = get_replica_connection()
+    if replica is None:
+        return get_connection(), 'primary'
+    try:
+        required_lsn = parse_lsn(consistency_token) if consistency_token else 0
+        stale = time.monotonic() - _replica_status['checked_at'] > REPLICA_CHECK_INTERVAL
+        if stale or (required_lsn and _replica_status['replay_lsn'] < required_lsn):
+            refresh_replica_status(replica)
+    except psycopg2.Error:
+        replica.close()
+        _replica_status.update({'checked_at': time.monotonic(), 'lag': None})
+        return get_connection(), 'primary'
+    if _replica_status['lag'] is None or _replica_status['lag'] > REPLICA_MAX_LAG_SECONDS:
+        return get_connection(), 'primary'
+    if required_lsn and _replica_status['replay_lsn'] < required_lsn:
+        return get_connection(), 'primary'
+    return replica, 'replica'
+
+def request_consistency_token(event: Dict[str, Any]) -> Any:
+    headers = event.get('headers', {}) or {}
+    return headers.get('X-Consistency-Token') or headers.get('x-consistency-token')
+
+def execute_prepared(cur, name: str, params: tuple = ()) -> None:
+    prepared_names = _replica_prepared_names if cur.connection is _replica_connection else _prepared_names
+    if name not in prepared_names:
+        cur.execute(f'PREPARE {name} AS {PREPARED_STATEMENTS[name]}')
+        prepared_names.add(name)
+    if params:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cur.execute(f'EXECUTE {name}')
+
+_leaderboard_cache: 'OrderedDict[Any, Any]' = OrderedDict()
+
+def rebuild_leaderboard(cur, mode: str) -> bool:
+    cur.execute('SELECT pg_try_advisory_xact_lock(hashtext(%s)) AS locked', (f'author_leaderboard:{mode}',))
+    if not cur.fetchone()['locked']:
+        return False
+    
+    score_expr, score_join = LEADERBOARD_SCORES[mode]
+    cur.execute('DELETE FROM author_leaderboard WHERE mode = %s', (mode,))
+    cur.execute(f'''
+        INSERT INTO author_leaderboard (mode, rank, author_id, score)
+        SELECT %s, ROW_NUMBER() OVER (ORDER BY ranked.score DESC, ranked.id), ranked.id, ranked.score
+        FROM (
+            SELECT a.id, COALESCE({score_expr}, 0)::float AS score
+            FROM authors a
+            {score_join}
+        ) ranked
+    ''', (mode,))
+    authors_count = cur.rowcount
+    cur.execute('''
+        INSERT INTO author_leaderboard_refresh (mode, refreshed_at, authors_count)
+        VALUES (%s, NOW(), %s)
+        ON CONFLICT (mode) DO UPDATE
+        SET refreshed_at = EXCLUDED.refreshed_at, authors_count = EXCLUDED.authors_count
+    ''', (mode, authors_count))
+    return True
+
+def rebuild_leaderboards(conn, cur, modes: List[str], only_missing: bool = False) -> None:
+    if only_missing:
+        cur.execute('SELECT mode FROM author_leaderboard_refresh WHERE mode = ANY(%s)', (modes,))
+        built = {row['mode'] for row in cur.fetchall()}
+        modes = [mode for mode in modes if mode not in built]
+    
+    rebuilt = False
+    for mode in modes:
+        rebuilt = rebuild_leaderboard(cur, mode) or rebuilt
+    if rebuilt:
+        conn.commit()
+
+def encode_cursor(published_at: str, story_id: int) -> str:
+    return base64.urlsafe_b64encode(f'{published_at}|{story_id}'.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: Any) -> Any:
+    if not cursor:
+        return None, None
+    padded = cursor + '=' * (-len(cursor) % 4)
+    published_at, story_id = base64.urlsafe_b64decode(padded.encode()).decode().rsplit('|', 1)
+    datetime.fromisoformat(published_at)
+    if not story_id.isdigit() or not 0 < int(story_id) <= MAX_INT4:
+        raise ValueError('cursor id out of range')
+    return published_at, int(story_id)
+
+SESSION_ANY_EXPIRY = (datetime(1970, 1, 1), datetime(9999, 1, 1))
+
+def session_expiry_bounds(session_token: Any) -> Tuple[datetime, datetime]:
+    # Tokens end with the expiry day (generate_session_token), which names the
+    # sessions partition; older tokens without it fall back to every partition.
+    day = (session_token or '').rpartition('.')[2]
+    if len(day) == 8 and day.isdigit():
+        try:
+            start = datetime.strptime(day, '%Y%m%d')
+            return start, start + timedelta(days=1)
+        except ValueError:
+            pass
+    return SESSION_ANY_EXPIRY
+
+def get_session_user_id(cur, session_token: str) -> Any:
+    if not session_token:
+        return None
+    execute_prepared(cur, 'session_user_id', (session_token, *session_expiry_bounds(session_token)))
+    row = cur.fetchone()
+    return row['user_id'] if row else None
+
+def get_analytics_access(cur, session_token: str, scope: str, scope_id: int) -> Any:
+    # Story and author series belong to whoever published the story (or any
+    # story under that author); admins see every scope, including the site.
+    if not session_token:
+        return None
+    execute_prepared(cur, 'analytics_access', (session_token, scope, scope_id, *session_expiry_bounds(session_token)))
+    row = cur.fetchone()
+    if not row:
+        return None
+    return row['is_admin'] or (scope != 'site' and row['is_owner'])
+
+def set_following(cur, user_id: int, author_id: int, follow: bool) -> Any:
+    execute_prepared(cur, 'follow_insert' if follow else 'follow_delete', (user_id, author_id))
+    changed = cur.fetchone() is not None
+    
+    if not changed:
+        execute_prepared(cur, 'author_followers', (author_id,))
+        return cur.fetchone()
+    
+    execute_prepared(cur, 'author_followers_bump', (author_id, 1 if follow else -1))
+    author = cur.fetchone()
+    if follow and not author['fanout_pull']:
+        execute_prepared(cur, 'inbox_backfill', (user_id, author_id, FOLLOW_BACKFILL_STORIES))
+    elif not follow:
+        execute_prepared(cur, 'inbox_remove_author', (user_id, author_id))
+    return author
+
+def format_author(row: Dict[str, Any]) -> Dict[str, Any]:
+    author = {
+        'id': row['id'],
+        'name': row['name'],
+        'avatar': row['avatar'],
+        'bio': row['bio'],
+        'rating': float(row['rating']) if row['rating'] else 0,
+        'stories': row['stories'],
+        'followers': row['followers']
+    }
+    if 'rank' in row:
+        author['rank'] = row['rank']
+    return author
+
+def leaderboard_snapshot_key(sort_by: str, limit: Any) -> str:
+    return f'authors:{sort_by}:top:{limit or "all"}'
+
+def render_leaderboard(authors: List[Dict[str, Any]], sort_by: str) -> str:
+    return json.dumps({'authors': authors, 'sort': sort_by})
+
+_snapshot_cache: 'OrderedDict[str, Any]' = OrderedDict()
+
+def load_snapshot(cur, key: str, max_age: int = SNAPSHOT_MAX_AGE) -> Any:
+    cached = _snapshot_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        _snapshot_cache.move_to_end(key)
+        return cached[1]
+    execute_prepared(cur, 'feed_snapshot', (key, max_age))
+    row = cur.fetchone()
+    if not row:
+        _snapshot_cache.pop(key, None)
+        return None
+    snapshot = {
+        'hash': row['content_hash'],
+        'body': bytes(row['body']),
+        'built_at': row['built_at'].replace(microsecond=0, tzinfo=timezone.utc)
+    }
+    _snapshot_cache[key] = (time.monotonic() + SNAPSHOT_CACHE_TTL, snapshot)
+    _snapshot_cache.move_to_end(key)
+    while len(_snapshot_cache) > SNAPSHOT_CACHE_MAX_ENTRIES:
+        _snapshot_cache.popitem(last=False)
+    return snapshot
+
+def snapshot_response(event: Dict[str, Any], snapshot: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    request_headers = event.get('headers', {}) or {}
+    etag = f'"{snapshot["hash"]}"'
+    response_headers = {
+        **headers,
+        'ETag': etag,
+        'Last-Modified': format_datetime(snapshot['built_at'], usegmt=True),
+        'Vary': 'Accept-Encoding',
+        'X-Snapshot': 'hit'
+    }
+    if_none_match = request_headers.get('If-None-Match') or request_headers.get('if-none-match')
+    if_modified_since = request_headers.get('If-Modified-Since') or request_headers.get('if-modified-since')
+    if if_none_match:
+        not_modified = if_none_match == etag
+    else:
+        try:
+            not_modified = bool(if_modified_since) and parsedate_to_datetime(if_modified_since) >= snapshot['built_at']
+        except (TypeError, ValueError):
+            not_modified = False
+    if not_modified:
+        return {'statusCode': 304, 'headers': response_headers, 'isBase64Encoded': False, 'body': ''}
+    accept_encoding = request_headers.get('Accept-Encoding') or request_headers.get('accept-encoding') or ''
+    if 'gzip' in accept_encoding:
+        response_headers['Content-Encoding'] = 'gzip'
+        return {
+            'statusCode': 200,
+            'headers': response_headers,
+            'isBase64Encoded': True,
+            'body': base64.b64encode(snapshot['body']).decode('ascii')
+        }
+    return {
+        'statusCode': 200,
+        'headers': response_headers,
+        'isBase64Encoded': False,
+        'body': gzip.decompress(snapshot['body']).decode('utf-8')
+    }
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: API для получения информации об авторах и топ авторов
@@ -18,31 +512,364 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Session-Token, X-Consistency-Token, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
         }
     
+    if method == 'POST':
+        body_data = json.loads(event.get('body', '{}'))
+        action = body_data.get('action')
+        author_id = body_data.get('authorId')
+        
+        if action not in ('follow', 'unfollow') or not str(author_id or '').isdigit():
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'isBase64Encoded': False,
+                'body': json.dumps({
+                    'error': 'Invalid request',
+                    'required': ['action', 'authorId'],
+                    'validActions': ['follow', 'unfollow']
+                })
+            }
+        
+        headers = event.get('headers', {}) or {}
+        conn = get_connection()
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        user_id = get_session_user_id(cur, headers.get('X-Session-Token') or headers.get('x-session-token'))
+        
+        if not user_id:
+            cur.close()
+            release_connection(conn)
+            return {
+                'statusCode': 401,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'isBase64Encoded': False,
+                'body': json.dumps({'error': 'Unauthorized'})
+            }
+        
+        try:
+            author = set_following(cur, user_id, int(author_id), action == 'follow')
+        except psycopg2.IntegrityError:
+            author = None
+        
+        if not author:
+            conn.rollback()
+            cur.close()
+            release_connection(conn)
+            return {
+                'statusCode': 404,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'isBase64Encoded': False,
+                'body': json.dumps({'error': 'Author not found'})
+            }
+        
+        conn.commit()
+        cur.close()
+        release_connection(conn)
+        
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'isBase64Encoded': False,
+            'body': json.dumps({
+                'success': True,
+                'authorId': int(author_id),
+                'following': action == 'follow',
+                'followers': author['followers']
+            })
+        }
+    
     if method == 'GET':
         params = event.get('queryStringParameters', {}) or {}
         author_id = params.get('id')
         top = params.get('top')
         
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        if params.get('analytics') or params.get('feed') == 'following' or author_id:
+            conn, read_source = get_read_connection(request_consistency_token(event))
+        else:
+            conn, read_source = get_connection(), 'primary'
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
+        if params.get('analytics'):
+            scope = params['analytics']
+            scope_id = params.get('id', '') if scope != 'site' else '0'
+            granularity = params.get('granularity', 'day')
+            days = params.get('days', '')
+            
+            if scope not in ANALYTICS_SCOPES or not scope_id.isdigit() or granularity not in ANALYTICS_SERIES:
+                cur.close()
+                release_connection(conn)
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({
+                        'error': 'Invalid analytics request',
+                        'validScopes': list(ANALYTICS_SCOPES),
+                        'validGranularities': list(ANALYTICS_SERIES.keys())
+                    })
+                }
+            
+            request_headers = event.get('headers', {}) or {}
+            session_token = request_headers.get('X-Session-Token') or request_headers.get('x-session-token')
+            allowed = get_analytics_access(cur, session_token, scope, int(scope_id))
+            
+            if allowed is None and read_source == 'replica' and session_token:
+                cur.close()
+                release_connection(conn)
+                conn, read_source = get_connection(), 'primary'
+                cur = conn.cursor(cursor_factory=RealDictCursor)
+                allowed = get_analytics_access(cur, session_token, scope, int(scope_id))
+            
+            if not allowed:
+                cur.close()
+                release_connection(conn)
+                return {
+                    'statusCode': 401 if allowed is None else 403,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'Unauthorized' if allowed is None else 'Analytics access denied'})
+                }
+            
+            max_days = HOURLY_RETENTION_DAYS if granularity == 'hour' else ANALYTICS_MAX_DAYS
+            default_days = HOURLY_RETENTION_DAYS if granularity == 'hour' else ANALYTICS_DEFAULT_DAYS
+            days = min(int(days), max_days) if days.isdigit() and int(days) > 0 else default_days
+            
+            started = time.perf_counter()
+            execute_prepared(cur, ANALYTICS_SERIES[granularity], (scope, int(scope_id), days))
+            series = [dict(row) for row in cur.fetchall()]
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 3)
+            cur.close()
+            release_connection(conn)
+            
+            totals = {
+                'views': sum(point['views'] for point in series),
+                'likes': sum(point['likes'] for point in series),
+                'comments': sum(point['comments'] for point in series)
+            }
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    'Cache-Control': f'private, max-age={ANALYTICS_MAX_AGE}',
+                    'X-Read-Source': read_source
+                },
+                'isBase64Encoded': False,
+                'body': json.dumps({
+                    'scope': scope,
+                    'id': int(scope_id),
+                    'granularity': granularity,
+                    'days': days,
+                    'series': series,
+                    'totals': totals,
+                    'elapsedMs': elapsed_ms
+                })
+            }
+        
+        if params.get('feed') == 'following':
+            request_headers = event.get('headers', {}) or {}
+            session_token = request_headers.get('X-Session-Token') or request_headers.get('x-session-token')
+            user_id = get_session_user_id(cur, session_token)
+            
+            if not user_id and read_source == 'replica' and session_token:
+                cur.close()
+                release_connection(conn)
+                conn, read_source = get_connection(), 'primary'
+                cur = conn.cursor(cursor_factory=RealDictCursor)
+                user_id = get_session_user_id(cur, session_token)
+            
+            if not user_id:
+                cur.close()
+                release_connection(conn)
+                return {
+                    'statusCode': 401,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'Unauthorized'})
+                }
+            
+            page_size = params.get('limit', '')
+            page_size = min(int(page_size), FOLLOWING_FEED_MAX_SIZE) if page_size.isdigit() and int(page_size) > 0 else FOLLOWING_FEED_SIZE
+            try:
+                cursor_published_at, cursor_id = decode_cursor(params.get('cursor'))
+            except ValueError:
+                cur.close()
+                release_connection(conn)
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'Invalid cursor'})
+                }
+            
+            started = time.perf_counter()
+            execute_prepared(cur, 'following_feed', (user_id, cursor_published_at, cursor_id, page_size + 1))
+            rows = cur.fetchall()
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 3)
+            cur.close()
+            release_connection(conn)
+            
+            has_more = len(rows) > page_size
+            rows = rows[:page_size]
+            
+            stories = []
+            for row in rows:
+                stories.append({
+                    'id': row['id'],
+                    'title': row['title'],
+                    'description': row['description'],
+                    'rating': float(row['rating']) if row['rating'] else 0,
+                    'views': row['views'],
+                    'likes': row['likes'],
+                    'comments': row['comments'],
+                    'readingTime': row['readingTime'],
+                    'publishedAt': row['publishedAt'],
+                    'genre': [g for g in row['genre'] if g],
+                    'author': {
+                        'id': row['author_id'],
+                        'name': row['author_name'],
+                        'avatar': row['author_avatar']
+                    }
+                })
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    'Cache-Control': 'private, no-store',
+                    'X-Read-Source': read_source
+                },
+                'isBase64Encoded': False,
+                'body': json.dumps({
+                    'stories': stories,
+                    'nextCursor': encode_cursor(rows[-1]['publishedAt'], rows[-1]['id']) if has_more else None,
+                    'elapsedMs': elapsed_ms
+                })
+            }
+        
+        if author_id and params.get('include') == 'stories':
+            page_size = params.get('limit', '')
+            page_size = min(int(page_size), AUTHOR_PAGE_MAX_SIZE) if page_size.isdigit() and int(page_size) > 0 else AUTHOR_PAGE_SIZE
+            try:
+                cursor_published_at, cursor_id = decode_cursor(params.get('cursor'))
+            except ValueError:
+                cur.close()
+                release_connection(conn)
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'Invalid cursor'})
+                }
+            
+            execute_prepared(cur, 'author_page', (int(author_id), cursor_published_at, cursor_id, page_size + 1))
+            row = cur.fetchone()
+            cur.close()
+            release_connection(conn)
+            
+            if not row:
+                return {
+                    'statusCode': 404,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'Author not found'})
+                }
+            
+            page = row['story_page']
+            has_more = len(page) > page_size
+            page = page[:page_size]
+            
+            stories = []
+            for story in page:
+                stories.append({
+                    'id': story['id'],
+                    'title': story['title'],
+                    'description': story['description'],
+                    'rating': float(story['rating']) if story['rating'] else 0,
+                    'views': story['views'],
+                    'likes': story['likes'],
+                    'comments': story['comments'],
+                    'readingTime': story['readingTime'],
+                    'publishedAt': story['publishedAt'],
+                    'genre': [g for g in story['genre'] if g]
+                })
+            
+            author = format_author(row)
+            author['storiesPage'] = {
+                'items': stories,
+                'nextCursor': encode_cursor(page[-1]['publishedAt'], page[-1]['id']) if has_more else None
+            }
+            
+            body = json.dumps(author)
+            etag = 'W/"' + hashlib.sha1(body.encode()).hexdigest() + '"'
+            request_headers = event.get('headers', {}) or {}
+            if_none_match = request_headers.get('If-None-Match') or request_headers.get('if-none-match')
+            cache_headers = {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+                'Cache-Control': f'public, max-age={AUTHOR_PAGE_MAX_AGE}',
+                'ETag': etag,
+                'X-Read-Source': read_source
+            }
+            
+            if if_none_match == etag:
+                return {
+                    'statusCode': 304,
+                    'headers': cache_headers,
+                    'isBase64Encoded': False,
+                    'body': ''
+                }
+            
+            return {
+                'statusCode': 200,
+                'headers': cache_headers,
+                'isBase64Encoded': False,
+                'body': body
+            }
+        
         if author_id:
-            cur.execute('''
-                SELECT id, name, avatar, bio, rating, stories_count as stories, followers
-                FROM authors
-                WHERE id = %s
-            ''', (int(author_id),))
+            execute_prepared(cur, 'author_by_id', (int(author_id),))
             
             row = cur.fetchone()
             cur.close()
-            conn.close()
+            release_connection(conn)
             
             if not row:
                 return {
@@ -55,15 +882,63 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps({'error': 'Author not found'})
                 }
             
-            author = {
-                'id': row['id'],
-                'name': row['name'],
-                'avatar': row['avatar'],
-                'bio': row['bio'],
-                'rating': float(row['rating']) if row['rating'] else 0,
-                'stories': row['stories'],
-                'followers': row['followers']
+            author = format_author(row)
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    'X-Read-Source': read_source
+                },
+                'isBase64Encoded': False,
+                'body': json.dumps(author)
+            }
+        
+        sort_by = params.get('sort', 'followers')
+        rank_of = params.get('rankOf')
+        
+        if sort_by not in LEADERBOARD_SCORES:
+            cur.close()
+            release_connection(conn)
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'isBase64Encoded': False,
+                'body': json.dumps({
+                    'error': 'Invalid sort',
+                    'validSorts': list(LEADERBOARD_SCORES.keys())
+                })
             }
+        
+        if rank_of and rank_of.isdigit():
+            rebuild_leaderboards(conn, cur, list(LEADERBOARD_SCORES.keys()), only_missing=True)
+            execute_prepared(cur, 'leaderboard_ranks', (int(rank_of),))
+            rows = cur.fetchall()
+            cur.close()
+            release_connection(conn)
+            
+            ranks = {}
+            for row in rows:
+                ranks[row['mode']] = {
+                    'rank': row['rank'],
+                    'score': row['score'],
+                    'total': row['total']
+                }
+            
+            if not ranks:
+                return {
+                    'statusCode': 404,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'Author not ranked yet'})
+                }
             
             return {
                 'statusCode': 200,
@@ -72,44 +947,45 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'Access-Control-Allow-Origin': '*'
                 },
                 'isBase64Encoded': False,
-                'body': json.dumps(author)
+                'body': json.dumps({'authorId': int(rank_of), 'ranks': ranks})
             }
         
-        limit_clause = ''
-        if top and top.isdigit():
-            limit_clause = f'LIMIT {int(top)}'
+        limit = max(1, min(int(top), LEADERBOARD_MAX_TOP)) if top and top.isdigit() else None
+        leaderboard_headers = {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Cache-Control': f'public, max-age={LEADERBOARD_CACHE_TTL}'
+        }
         
-        cur.execute(f'''
-            SELECT id, name, avatar, bio, rating, stories_count as stories, followers
-            FROM authors
-            ORDER BY followers DESC
-            {limit_clause}
-        ''')
+        snapshot = load_snapshot(cur, leaderboard_snapshot_key(sort_by, limit))
+        if snapshot:
+            cur.close()
+            release_connection(conn)
+            return snapshot_response(event, snapshot, leaderboard_headers)
         
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
+        cache_key = (sort_by, limit)
+        cached = _leaderboard_cache.get(cache_key)
         
-        authors = []
-        for row in rows:
-            authors.append({
-                'id': row['id'],
-                'name': row['name'],
-                'avatar': row['avatar'],
-                'bio': row['bio'],
-                'rating': float(row['rating']) if row['rating'] else 0,
-                'stories': row['stories'],
-                'followers': row['followers']
-            })
+        if cached and cached[0] > time.monotonic():
+            _leaderboard_cache.move_to_end(cache_key)
+            authors = cached[1]
+        else:
+            rebuild_leaderboards(conn, cur, [sort_by], only_missing=True)
+            execute_prepared(cur, 'leaderboard_top', (sort_by, limit))
+            authors = [format_author(row) for row in cur.fetchall()]
+            _leaderboard_cache[cache_key] = (time.monotonic() + LEADERBOARD_CACHE_TTL, authors)
+            _leaderboard_cache.move_to_end(cache_key)
+            while len(_leaderboard_cache) > LEADERBOARD_CACHE_MAX_ENTRIES:
+                _leaderboard_cache.popitem(last=False)
+        
+        cur.close()
+        release_connection(conn)
         
         return {
             'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
+            'headers': leaderboard_headers,
             'isBase64Encoded': False,
-            'body': json.dumps({'authors': authors})
+            'body': render_leaderboard(authors, sort_by)
         }
     
     return {
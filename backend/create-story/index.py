@@ -1,10 +1,367 @@
+import hashlib
 import json
+import math
 import os
-from typing import Dict, Any
-from datetime import datetime
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Tuple
+from datetime import datetime, timedelta
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
+try:
+    import redis
+except ImportError:
+    redis = None
+
+FANOUT_MAX_FOLLOWERS = 5000
+
+PREPARED_STATEMENTS = {
+    'session_user_id': '''
+        SELECT user_id FROM sessions
+        WHERE session_token = $1 AND expires_at > NOW() AND expires_at >= $2 AND expires_at < $3
+    ''',
+    'story_insert': '''
+        INSERT INTO stories (title, description, content, author_id, reading_time, created_by)
+        VALUES ($1, $2, $3, $4, $5, $6)
+        RETURNING id, published_at::text as published_at
+    ''',
+    'story_genre_insert': '''
+        INSERT INTO story_genres (story_id, genre)
+        VALUES ($1, $2)
+    ''',
+    'author_story_bump': '''
+        UPDATE authors
+        SET stories_count = stories_count + 1,
+            fanout_pull = fanout_pull OR followers > $2
+        WHERE id = $1
+        RETURNING fanout_pull
+    ''',
+    'following_fanout': '''
+        INSERT INTO following_inbox (user_id, story_id, author_id, published_at)
+        SELECT f.user_id, $1, $2, $3::timestamp
+        FROM author_follows f
+        WHERE f.author_id = $2
+        ON CONFLICT (user_id, story_id) DO NOTHING
+    ''',
+    'idempotency_claim': '''
+        INSERT INTO idempotency_keys (scope, idempotency_key, request_hash, expires_at)
+        VALUES ($1, $2, $3, NOW() + make_interval(secs => $4))
+        ON CONFLICT (scope, idempotency_key) DO UPDATE
+        SET request_hash = EXCLUDED.request_hash, status_code = NULL, response = NULL,
+            expires_at = EXCLUDED.expires_at
+        WHERE idempotency_keys.expires_at <= NOW()
+        RETURNING 1 AS claimed
+    ''',
+    'idempotency_lookup': '''
+        SELECT request_hash, status_code, response FROM idempotency_keys
+        WHERE scope = $1 AND idempotency_key = $2
+    ''',
+    'idempotency_save': '''
+        UPDATE idempotency_keys SET status_code = $3, response = $4
+        WHERE scope = $1 AND idempotency_key = $2
+    ''',
+    'idempotency_purge': '''
+        DELETE FROM idempotency_keys
+        WHERE ctid = ANY(ARRAY(
+            SELECT ctid FROM idempotency_keys WHERE expires_at < NOW() LIMIT $1
+        ))
+    '''
+}
+
+CONNECTION_MAX_AGE = 300
+
+_connection = None
+_connection_opened_at = 0.0
+_prepared_names: set = set()
+
+def get_connection():
+    global _connection, _connection_opened_at
+    conn = _connection
+    if conn is not None and not conn.closed:
+        if time.monotonic() - _connection_opened_at > CONNECTION_MAX_AGE:
+            conn.close()
+        elif conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                conn.close()
+    if conn is None or conn.closed:
+        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        _connection = conn
+        _connection_opened_at = time.monotonic()
+        _prepared_names.clear()
+    return conn
+
+def release_connection(conn) -> None:
+    if conn.closed:
+        return
+    try:
+        if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except psycopg2.Error:
+        conn.close()
+
+def execute_prepared(cur, name: str, params: tuple = ()) -> None:
+    if name not in _prepared_names:
+        cur.execute(f'PREPARE {name} AS {PREPARED_STATEMENTS[name]}')
+        _prepared_names.add(name)
+    if params:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cur.execute(f'EXECUTE {name}')
+
+SESSION_ANY_EXPIRY = (datetime(1970, 1, 1), datetime(9999, 1, 1))
+
+def session_expiry_bounds(session_token: Any) -> Tuple[datetime, datetime]:
+    # Tokens end with the expiry day (generate_session_token), which names the
+    # sessions partition; older tokens without it fall back to every partition.
+    day = (session_token or '').rpartition('.')[2]
+    if len(day) == 8 and day.isdigit():
+        try:
+            start = datetime.strptime(day, '%Y%m%d')
+            return start, start + timedelta(days=1)
+        except ValueError:
+            pass
+    return SESSION_ANY_EXPIRY
+
+def get_session_user_id(cur, session_token: str) -> Any:
+    if not session_token:
+        return None
+    execute_prepared(cur, 'session_user_id', (session_token, *session_expiry_bounds(session_token)))
+    row = cur.fetchone()
+    return row['user_id'] if row else None
+
+def current_wal_lsn(cur) -> str:
+    cur.execute('SELECT pg_current_wal_lsn()::text AS lsn')
+    return cur.fetchone()['lsn']
+
+IDEMPOTENCY_SCOPE = 'create-story'
+IDEMPOTENCY_TTL = 86400
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+IDEMPOTENCY_CACHE_TTL = 600
+IDEMPOTENCY_CACHE_MAX = 2000
+IDEMPOTENCY_PURGE_INTERVAL = 300
+IDEMPOTENCY_PURGE_BATCH = 1000
+
+_idempotency_cache: 'OrderedDict[Tuple[str, str], Tuple[float, bytes, int, str]]' = OrderedDict()
+_idempotency_purged_at = 0.0
+
+def request_idempotency(event: Dict[str, Any], user_id: Any = None) -> Any:
+    headers = event.get('headers', {}) or {}
+    key = headers.get('Idempotency-Key') or headers.get('idempotency-key')
+    if not key:
+        return None
+    # Keys are per caller: the same key from another user is a different request.
+    return {
+        'scope': f'{IDEMPOTENCY_SCOPE}:{user_id or "anonymous"}',
+        'key': key,
+        'hash': hashlib.sha1((event.get('body') or '').encode('utf-8')).digest()
+    }
+
+def idempotency_error(status_code: int, message: str) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'isBase64Encoded': False,
+        'body': json.dumps({'error': message})
+    }
+
+def idempotent_replay(request_hash: bytes, idempotency: Dict[str, Any], status_code: Any, body: Any) -> Dict[str, Any]:
+    if request_hash != idempotency['hash']:
+        return idempotency_error(422, 'Idempotency-Key was already used for a different request')
+    if status_code is None:
+        return idempotency_error(409, 'A request with this Idempotency-Key is still in progress')
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Idempotent-Replayed': 'true'
+    }
+    consistency_token = json.loads(body).get('consistencyToken')
+    if consistency_token:
+        headers['X-Consistency-Token'] = consistency_token
+    return {'statusCode': status_code, 'headers': headers, 'isBase64Encoded': False, 'body': body}
+
+def idempotency_cache_key(idempotency: Dict[str, Any]) -> Tuple[str, str]:
+    return idempotency['scope'], idempotency['key']
+
+def cached_idempotent_response(idempotency: Dict[str, Any]) -> Any:
+    cached = _idempotency_cache.get(idempotency_cache_key(idempotency))
+    if not cached or cached[0] <= time.monotonic():
+        return None
+    _idempotency_cache.move_to_end(idempotency_cache_key(idempotency))
+    return idempotent_replay(cached[1], idempotency, cached[2], cached[3])
+
+def claim_idempotency_key(cur, idempotency: Dict[str, Any]) -> Any:
+    execute_prepared(cur, 'idempotency_claim', (idempotency['scope'], idempotency['key'], idempotency['hash'], IDEMPOTENCY_TTL))
+    if cur.fetchone():
+        return None
+    execute_prepared(cur, 'idempotency_lookup', (idempotency['scope'], idempotency['key']))
+    row = cur.fetchone()
+    if not row:
+        return idempotency_error(409, 'A request with this Idempotency-Key is still in progress')
+    body = row['response']
+    if body is not None:
+        payload = json.loads(body)
+        if 'consistencyToken' in payload:
+            payload['consistencyToken'] = current_wal_lsn(cur)
+            body = json.dumps(payload)
+    return idempotent_replay(bytes(row['request_hash']), idempotency, row['status_code'], body)
+
+def save_idempotent_response(cur, idempotency: Any, status_code: int, body: Dict[str, Any]) -> None:
+    if idempotency:
+        execute_prepared(cur, 'idempotency_save', (idempotency['scope'], idempotency['key'], status_code, json.dumps(body)))
+
+def finish_idempotent_request(conn, cur, idempotency: Any, status_code: int, body: Dict[str, Any]) -> None:
+    global _idempotency_purged_at
+    if not idempotency:
+        return
+    _idempotency_cache[idempotency_cache_key(idempotency)] = (
+        time.monotonic() + IDEMPOTENCY_CACHE_TTL, idempotency['hash'], status_code, json.dumps(body)
+    )
+    _idempotency_cache.move_to_end(idempotency_cache_key(idempotency))
+    while len(_idempotency_cache) > IDEMPOTENCY_CACHE_MAX:
+        _idempotency_cache.popitem(last=False)
+    if time.monotonic() - _idempotency_purged_at < IDEMPOTENCY_PURGE_INTERVAL:
+        return
+    _idempotency_purged_at = time.monotonic()
+    try:
+        execute_prepared(cur, 'idempotency_purge', (IDEMPOTENCY_PURGE_BATCH,))
+        conn.commit()
+    except psycopg2.Error:
+        conn.rollback()
+
+RATE_LIMITS = {
+    'create': (('ip', 10, 10 / 3600), ('user', 5, 5 / 3600))
+}
+RATE_LIMIT_MAX_BUCKETS = 10000
+RATE_LIMIT_SHARED_TIMEOUT = 0.05
+RATE_LIMIT_SHARED_RETRY = 30.0
+
+TOKEN_BUCKET_LUA = '''
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+redis.call('HINCRBY', KEYS[2], allowed == 1 and 'admitted' or 'rejected', 1)
+return {allowed, tostring(tokens)}
+'''
+
+_rate_buckets: 'OrderedDict[str, List[float]]' = OrderedDict()
+_rate_limit_stats: Dict[str, Dict[str, int]] = {}
+_rate_limit_script = None
+_rate_limit_shared_down_until = 0.0
+
+def get_rate_limit_script() -> Any:
+    global _rate_limit_script
+    url = os.environ.get('RATE_LIMIT_REDIS_URL')
+    if redis is None or not url or time.monotonic() < _rate_limit_shared_down_until:
+        return None
+    if _rate_limit_script is None:
+        client = redis.Redis.from_url(
+            url, socket_timeout=RATE_LIMIT_SHARED_TIMEOUT, socket_connect_timeout=RATE_LIMIT_SHARED_TIMEOUT
+        )
+        _rate_limit_script = client.register_script(TOKEN_BUCKET_LUA)
+    return _rate_limit_script
+
+def take_local_token(key: str, capacity: int, rate: float) -> float:
+    now = time.monotonic()
+    bucket = _rate_buckets.get(key)
+    if bucket is None:
+        bucket = [float(capacity), now]
+        _rate_buckets[key] = bucket
+        if len(_rate_buckets) > RATE_LIMIT_MAX_BUCKETS:
+            _rate_buckets.popitem(last=False)
+    else:
+        _rate_buckets.move_to_end(key)
+        bucket[0] = min(float(capacity), bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+    if bucket[0] < 1:
+        return (1 - bucket[0]) / rate
+    bucket[0] -= 1
+    return 0.0
+
+def take_shared_token(key: str, capacity: int, rate: float, action: str) -> Any:
+    global _rate_limit_shared_down_until
+    script = get_rate_limit_script()
+    if script is None:
+        return None
+    try:
+        allowed, tokens = script(keys=[f'ratelimit:{key}', f'ratelimit-stats:{action}'], args=[capacity, rate])
+    except redis.RedisError:
+        _rate_limit_shared_down_until = time.monotonic() + RATE_LIMIT_SHARED_RETRY
+        return None
+    return 0.0 if allowed else (1 - float(tokens)) / rate
+
+def request_ip(event: Dict[str, Any]) -> str:
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    return identity.get('sourceIp') or 'unknown'
+
+def check_rate_limit(action: Any, identities: Dict[str, Any], admit: bool = True) -> Any:
+    limits = RATE_LIMITS.get(action)
+    if not limits:
+        return None
+    stats = _rate_limit_stats.setdefault(action, {'admitted': 0, 'rejected': 0, 'rejectedLocally': 0, 'sharedChecks': 0})
+    retry_after = 0.0
+    for dimension, capacity, rate in limits:
+        if identities.get(dimension) is None:
+            continue
+        key = f'{action}:{dimension}:{identities[dimension]}'
+        wait = take_local_token(key, capacity, rate)
+        if wait:
+            stats['rejectedLocally'] += 1
+        else:
+            wait = take_shared_token(key, capacity, rate, action)
+            if wait is not None:
+                stats['sharedChecks'] += 1
+        retry_after = max(retry_after, wait or 0.0)
+    if not retry_after:
+        if admit:
+            stats['admitted'] += 1
+        return None
+    stats['rejected'] += 1
+    return {
+        'statusCode': 429,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Retry-After': str(math.ceil(retry_after))
+        },
+        'isBase64Encoded': False,
+        'body': json.dumps({'error': 'Too many requests', 'retryAfter': math.ceil(retry_after)})
+    }
+
+def rate_limit_stats() -> Dict[str, Any]:
+    report = {
+        'actions': {action: dict(stats) for action, stats in _rate_limit_stats.items()},
+        'buckets': len(_rate_buckets),
+        'shared': get_rate_limit_script() is not None
+    }
+    if report['shared']:
+        try:
+            client = _rate_limit_script.registered_client
+            report['sharedActions'] = {
+                action: {k.decode(): int(v) for k, v in client.hgetall(f'ratelimit-stats:{action}').items()}
+                for action in RATE_LIMITS
+            }
+        except redis.RedisError:
+            pass
+    return report
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: API для создания новых рассказов ужасов
@@ -20,7 +377,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Session-Token, X-Consistency-Token, Idempotency-Key',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
@@ -50,14 +407,33 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 })
             }
         
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        limited = check_rate_limit('create', {'ip': request_ip(event)}, admit=False)
+        if limited:
+            return limited
+        
+        headers = event.get('headers', {}) or {}
+        conn = get_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
+        created_by = get_session_user_id(cur, headers.get('X-Session-Token') or headers.get('x-session-token'))
+        
+        idempotency = request_idempotency(event, created_by)
+        if idempotency:
+            if len(idempotency['key']) > IDEMPOTENCY_KEY_MAX_LENGTH:
+                replay = idempotency_error(400, f'Idempotency-Key must be at most {IDEMPOTENCY_KEY_MAX_LENGTH} characters')
+            else:
+                replay = cached_idempotent_response(idempotency) or claim_idempotency_key(cur, idempotency)
+            if replay:
+                cur.close()
+                release_connection(conn)
+                return replay
         
-        cur.execute('''
-            INSERT INTO stories (title, description, content, author_id, reading_time)
-            VALUES (%s, %s, %s, %s, %s)
-            RETURNING id, published_at::text as published_at
-        ''', (title, description, content, int(author_id), reading_time))
+        limited = check_rate_limit('create', {'user': created_by})
+        if limited:
+            cur.close()
+            release_connection(conn)
+            return limited
+        
+        execute_prepared(cur, 'story_insert', (title, description, content, int(author_id), reading_time, created_by))
         
         result = cur.fetchone()
         story_id = result['id']
@@ -66,20 +442,22 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         genre_list = genre if isinstance(genre, list) else [genre]
         for g in genre_list:
             if g:
-                cur.execute('''
-                    INSERT INTO story_genres (story_id, genre)
-                    VALUES (%s, %s)
-                ''', (story_id, g))
+                execute_prepared(cur, 'story_genre_insert', (story_id, g))
         
-        cur.execute('''
-            UPDATE authors
-            SET stories_count = stories_count + 1
-            WHERE id = %s
-        ''', (int(author_id),))
+        execute_prepared(cur, 'author_story_bump', (int(author_id), FANOUT_MAX_FOLLOWERS))
+        author = cur.fetchone()
+        fanned_out = 0
+        if author and not author['fanout_pull']:
+            execute_prepared(cur, 'following_fanout', (story_id, int(author_id), published_at))
+            fanned_out = cur.rowcount
         
-        conn.commit()
-        cur.close()
-        conn.close()
+        if created_by:
+            cur.execute('''
+                INSERT INTO user_stats (user_id, stories_count)
+                VALUES (%s, 1)
+                ON CONFLICT (user_id) DO UPDATE
+                SET stories_count = user_stats.stories_count + 1, updated_at = NOW()
+            ''', (created_by,))
         
         new_story = {
             'id': story_id,
@@ -96,19 +474,31 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'publishedAt': published_at,
             'status': 'published'
         }
+        response_body = {
+            'success': True,
+            'story': new_story,
+            'fannedOut': fanned_out,
+            'consistencyToken': None,
+            'message': 'Story created successfully'
+        }
+        save_idempotent_response(cur, idempotency, 201, response_body)
+        
+        conn.commit()
+        consistency_token = current_wal_lsn(cur)
+        response_body['consistencyToken'] = consistency_token
+        finish_idempotent_request(conn, cur, idempotency, 201, response_body)
+        cur.close()
+        release_connection(conn)
         
         return {
             'statusCode': 201,
             'headers': {
                 'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
+                'Access-Control-Allow-Origin': '*',
+                'X-Consistency-Token': consistency_token
             },
             'isBase64Encoded': False,
-            'body': json.dumps({
-                'success': True,
-                'story': new_story,
-                'message': 'Story created successfully'
-            })
+            'body': json.dumps(response_body)
         }
     
     return {
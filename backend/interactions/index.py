@@ -1,14 +1,781 @@
+import base64
+import hashlib
 import json
+import math
 import os
-from typing import Dict, Any
-from datetime import datetime
+import select
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Tuple
+from datetime import datetime, timedelta
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+READING_LIST_PAGE_SIZE = 20
+READING_LIST_MAX_PAGE_SIZE = 50
+MAX_INT4 = 2147483647
+BOOKMARK_STATE_MAX_IDS = 100
+PROGRESS_FLUSH_INTERVAL = 5.0
+PROGRESS_BUFFER_MAX = 500
+CONTINUE_READING_LIMIT = 20
+COMMENT_CHANNEL = 'story_comments'
+COMMENT_WAIT_MAX = 25
+COMMENT_DELTA_LIMIT = 100
+COMMENT_OVERLAP_IDS = 1000
+COMMENT_OVERLAP_SECONDS = 30
+COMMENT_WAITERS_MAX = 64
+COMMENT_RETRY_SECONDS = 5
+LISTENER_RECONNECT_DELAY = 2.0
+
+PREPARED_STATEMENTS = {
+    'comments_by_story': '''
+        SELECT id, user_id as "userId", user_name as "userName", text,
+               likes, created_at::text as "createdAt"
+        FROM comments
+        WHERE story_id = $1
+        ORDER BY created_at DESC
+    ''',
+    'session_user': '''
+        SELECT s.user_id, u.username, s.expires_at
+        FROM sessions s
+        JOIN users u ON u.id = s.user_id
+        WHERE s.session_token = $1 AND s.expires_at > NOW() AND u.is_active = true
+          AND s.expires_at >= $2 AND s.expires_at < $3
+    ''',
+    'comments_since': '''
+        SELECT id, user_id as "userId", user_name as "userName", text,
+               likes, created_at::text as "createdAt"
+        FROM (
+            (SELECT * FROM comments
+             WHERE story_id = $1 AND id > $2
+             ORDER BY id
+             LIMIT $3)
+            UNION ALL
+            (SELECT * FROM comments
+             WHERE story_id = $1 AND id <= $2 AND id > $2 - $4
+               AND created_at > NOW() - make_interval(secs => $5)
+             ORDER BY id
+             LIMIT $3)
+        ) delta
+        ORDER BY id
+    ''',
+    'like_insert': '''
+        INSERT INTO likes (story_id, user_id)
+        VALUES ($1, $2)
+        ON CONFLICT (story_id, user_id) DO NOTHING
+        RETURNING id
+    ''',
+    'outbox_enqueue': '''
+        WITH queued AS (
+            INSERT INTO interaction_outbox (event_type, story_id, user_id)
+            SELECT $1, s.id, $3
+            FROM stories s
+            WHERE s.id = $2
+            RETURNING story_id
+        )
+        SELECT s.likes, s.views, s.comments_count
+        FROM stories s
+        JOIN queued q ON q.story_id = s.id
+    ''',
+    'rating_previous': '''
+        SELECT score FROM story_ratings
+        WHERE story_id = $1 AND user_id = $2
+    ''',
+    'rating_upsert': '''
+        INSERT INTO story_ratings (story_id, user_id, score)
+        VALUES ($1, $2, $3)
+        ON CONFLICT (story_id, user_id) DO UPDATE
+        SET score = EXCLUDED.score, updated_at = NOW()
+    ''',
+    'story_rating_apply': '''
+        UPDATE stories
+        SET rating_sum = rating_sum + $2,
+            rating_count = rating_count + $3,
+            rating = ROUND((rating_sum + $2)::numeric / NULLIF(rating_count + $3, 0), 1)
+        WHERE id = $1
+        RETURNING rating, rating_count, author_id
+    ''',
+    'bookmark_set': '''
+        INSERT INTO user_stories (user_id, story_id, is_bookmarked, bookmarked_at)
+        VALUES ($1, $2, true, NOW())
+        ON CONFLICT (user_id, story_id) DO UPDATE
+        SET is_bookmarked = true,
+            bookmarked_at = CASE WHEN user_stories.is_bookmarked
+                                 THEN user_stories.bookmarked_at ELSE NOW() END
+        RETURNING bookmarked_at::text as bookmarked_at
+    ''',
+    'bookmark_clear': '''
+        UPDATE user_stories
+        SET is_bookmarked = false, bookmarked_at = NULL
+        WHERE user_id = $1 AND story_id = $2 AND is_bookmarked
+    ''',
+    'reading_list': '''
+        SELECT us.story_id, us.bookmarked_at::text as "bookmarkedAt",
+               s.title, s.description, s.rating, s.views, s.likes,
+               s.comments_count as comments, s.reading_time as "readingTime",
+               s.published_at::text as "publishedAt",
+               a.id as author_id, a.name as author_name, a.avatar as author_avatar,
+               ARRAY(SELECT sg.genre FROM story_genres sg WHERE sg.story_id = s.id) as genre
+        FROM user_stories us
+        JOIN stories s ON s.id = us.story_id
+        JOIN authors a ON a.id = s.author_id
+        WHERE us.user_id = $1 AND us.is_bookmarked AND s.status = 'published'
+          AND ($2::timestamp IS NULL OR (us.bookmarked_at, us.story_id) < ($2::timestamp, $3::int))
+        ORDER BY us.bookmarked_at DESC, us.story_id DESC
+        LIMIT $4
+    ''',
+    'bookmark_state': '''
+        SELECT story_id FROM user_stories
+        WHERE user_id = $1 AND story_id = ANY($2::int[]) AND is_bookmarked
+    ''',
+    'progress_for_story': '''
+        SELECT progress, updated_at::text as "updatedAt"
+        FROM reading_progress
+        WHERE user_id = $1 AND story_id = $2
+    ''',
+    'continue_reading': '''
+        SELECT rp.story_id, rp.progress, rp.updated_at::text as "updatedAt",
+               s.title, s.description, s.reading_time as "readingTime",
+               a.id as author_id, a.name as author_name, a.avatar as author_avatar
+        FROM reading_progress rp
+        JOIN stories s ON s.id = rp.story_id
+        JOIN authors a ON a.id = s.author_id
+        WHERE rp.user_id = $1 AND rp.progress < 0.98 AND s.status = 'published'
+        ORDER BY rp.updated_at DESC
+        LIMIT $2
+    ''',
+    'author_rating_apply': '''
+        UPDATE authors
+        SET rating_sum = rating_sum + $2,
+            rating_count = rating_count + $3,
+            rating = ROUND((rating_sum + $2)::numeric / NULLIF(rating_count + $3, 0), 1)
+        WHERE id = $1
+    ''',
+    'idempotency_claim': '''
+        INSERT INTO idempotency_keys (scope, idempotency_key, request_hash, expires_at)
+        VALUES ($1, $2, $3, NOW() + make_interval(secs => $4))
+        ON CONFLICT (scope, idempotency_key) DO UPDATE
+        SET request_hash = EXCLUDED.request_hash, status_code = NULL, response = NULL,
+            expires_at = EXCLUDED.expires_at
+        WHERE idempotency_keys.expires_at <= NOW()
+        RETURNING 1 AS claimed
+    ''',
+    'idempotency_lookup': '''
+        SELECT request_hash, status_code, response FROM idempotency_keys
+        WHERE scope = $1 AND idempotency_key = $2
+    ''',
+    'idempotency_save': '''
+        UPDATE idempotency_keys SET status_code = $3, response = $4
+        WHERE scope = $1 AND idempotency_key = $2
+    ''',
+    'idempotency_purge': '''
+        DELETE FROM idempotency_keys
+        WHERE ctid = ANY(ARRAY(
+            SELECT ctid FROM idempotency_keys WHERE expires_at < NOW() LIMIT $1
+        ))
+    '''
+}
+
+CONNECTION_MAX_AGE = 300
+
+_connection = None
+_connection_opened_at = 0.0
+_prepared_names: set = set()
+
+def get_connection():
+    global _connection, _connection_opened_at
+    conn = _connection
+    if conn is not None and not conn.closed:
+        if time.monotonic() - _connection_opened_at > CONNECTION_MAX_AGE:
+            conn.close()
+        elif conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                conn.close()
+    if conn is None or conn.closed:
+        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        _connection = conn
+        _connection_opened_at = time.monotonic()
+        _prepared_names.clear()
+    return conn
+
+def release_connection(conn) -> None:
+    if conn.closed:
+        return
+    try:
+        if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except psycopg2.Error:
+        conn.close()
+
+REPLICA_MAX_LAG_SECONDS = 5.0
+REPLICA_CHECK_INTERVAL = 5.0
+
+_replica_connection = None
+_replica_opened_at = 0.0
+_replica_prepared_names: set = set()
+_replica_status: Dict[str, Any] = {'checked_at': 0.0, 'lag': None, 'replay_lsn': 0}
+
+def parse_lsn(lsn: Any) -> int:
+    try:
+        high, low = str(lsn).split('/')
+        return (int(high, 16) << 32) | int(low, 16)
+    except (ValueError, AttributeError):
+        return 0
+
+def get_replica_connection():
+    global _replica_connection, _replica_opened_at
+    dsns = [dsn.strip() for dsn in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if dsn.strip()]
+    if not dsns:
+        return None
+    conn = _replica_connection
+    if conn is not None and not conn.closed and time.monotonic() - _replica_opened_at > CONNECTION_MAX_AGE:
+        conn.close()
+    if conn is None or conn.closed:
+        try:
+            conn = psycopg2.connect(dsns[os.getpid() % len(dsns)], connect_timeout=2)
+        except psycopg2.OperationalError:
+            _replica_status.update({'checked_at': time.monotonic(), 'lag': None})
+            return None
+        conn.autocommit = True
+        _replica_connection = conn
+        _replica_opened_at = time.monotonic()
+        _replica_prepared_names.clear()
+    return conn
+
+def refresh_replica_status(conn) -> None:
+    cur = conn.cursor()
+    cur.execute('''
+        SELECT pg_last_wal_replay_lsn()::text,
+               CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0)
+               END
+    ''')
+    replay_lsn, lag = cur.fetchone()
+    cur.close()
+    _replica_status.update({'checked_at': time.monotonic(), 'lag': float(lag), 'replay_lsn': parse_lsn(replay_lsn)})
+
+def get_read_connection(consistency_token: Any = None) -> Any:
+    replica = get_replica_connection()
+    if replica is None:
+        return get_connection(), 'primary'
+    try:
+        required_lsn = parse_lsn(consistency_token) if consistency_token else 0
+        stale = time.monotonic() - _replica_status['checked_at'] > REPLICA_CHECK_INTERVAL
+        if stale or (required_lsn and _replica_status['replay_lsn'] < required_lsn):
+            refresh_replica_status(replica)
+    except psycopg2.Error:
+        replica.close()
+        _replica_status.update({'checked_at': time.monotonic(), 'lag': None})
+        return get_connection(), 'primary'
+    if _replica_status['lag'] is None or _replica_status['lag'] > REPLICA_MAX_LAG_SECONDS:
+        return get_connection(), 'primary'
+    if required_lsn and _replica_status['replay_lsn'] < required_lsn:
+        return get_connection(), 'primary'
+    return replica, 'replica'
+
+def request_consistency_token(event: Dict[str, Any]) -> Any:
+    headers = event.get('headers', {}) or {}
+    return headers.get('X-Consistency-Token') or headers.get('x-consistency-token')
+
+SESSION_CACHE_TTL = 5
+SESSION_CACHE_MAX = 10000
+
+_session_users: 'OrderedDict[str, Tuple[float, Any, Any]]' = OrderedDict()
+
+def request_session_token(event: Dict[str, Any]) -> Any:
+    headers = event.get('headers', {}) or {}
+    return headers.get('X-Session-Token') or headers.get('x-session-token')
+
+SESSION_ANY_EXPIRY = (datetime(1970, 1, 1), datetime(9999, 1, 1))
+
+def session_expiry_bounds(session_token: Any) -> Tuple[datetime, datetime]:
+    # Tokens end with the expiry day (generate_session_token), which names the
+    # sessions partition; older tokens without it fall back to every partition.
+    day = (session_token or '').rpartition('.')[2]
+    if len(day) == 8 and day.isdigit():
+        try:
+            start = datetime.strptime(day, '%Y%m%d')
+            return start, start + timedelta(days=1)
+        except ValueError:
+            pass
+    return SESSION_ANY_EXPIRY
+
+def resolve_session_user(session_token: Any, use_cache: bool = True) -> Any:
+    # Reads may reuse a lookup for a few seconds; writes always ask the database
+    # so logout, revocation and bans in auth take effect at once.
+    if not session_token:
+        return None
+    cached = _session_users.get(session_token) if use_cache else None
+    if cached and cached[0] > time.monotonic() and (cached[1] is None or cached[1] > datetime.now()):
+        _session_users.move_to_end(session_token)
+        return cached[2]
+    conn = get_connection()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    execute_prepared(cur, 'session_user', (session_token, *session_expiry_bounds(session_token)))
+    row = cur.fetchone()
+    cur.close()
+    release_connection(conn)
+    user = {'id': row['user_id'], 'username': row['username']} if row else None
+    _session_users[session_token] = (time.monotonic() + SESSION_CACHE_TTL, row['expires_at'] if row else None, user)
+    _session_users.move_to_end(session_token)
+    while len(_session_users) > SESSION_CACHE_MAX:
+        _session_users.popitem(last=False)
+    return user
+
+def current_wal_lsn(cur) -> str:
+    cur.execute('SELECT pg_current_wal_lsn()::text AS lsn')
+    return cur.fetchone()['lsn']
+
+def execute_prepared(cur, name: str, params: tuple = ()) -> None:
+    prepared_names = _replica_prepared_names if cur.connection is _replica_connection else _prepared_names
+    if name not in prepared_names:
+        cur.execute(f'PREPARE {name} AS {PREPARED_STATEMENTS[name]}')
+        prepared_names.add(name)
+    if params:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cur.execute(f'EXECUTE {name}')
+
+def enqueue_interaction(cur, event_type: str, story_id: int, user_id: int) -> Any:
+    execute_prepared(cur, 'outbox_enqueue', (event_type, story_id, user_id))
+    return cur.fetchone()
+
+IDEMPOTENCY_SCOPE = 'interactions'
+IDEMPOTENCY_TTL = 86400
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+IDEMPOTENCY_CACHE_TTL = 600
+IDEMPOTENCY_CACHE_MAX = 2000
+IDEMPOTENCY_PURGE_INTERVAL = 300
+IDEMPOTENCY_PURGE_BATCH = 1000
+
+_idempotency_cache: 'OrderedDict[Tuple[str, str], Tuple[float, bytes, int, str]]' = OrderedDict()
+_idempotency_purged_at = 0.0
+
+def request_idempotency(event: Dict[str, Any], user_id: Any = None) -> Any:
+    headers = event.get('headers', {}) or {}
+    key = headers.get('Idempotency-Key') or headers.get('idempotency-key')
+    if not key:
+        return None
+    # Keys are per caller: the same key from another user is a different request.
+    return {
+        'scope': f'{IDEMPOTENCY_SCOPE}:{user_id or "anonymous"}',
+        'key': key,
+        'hash': hashlib.sha1(f'{user_id}:{event.get("body") or ""}'.encode('utf-8')).digest()
+    }
+
+def idempotency_error(status_code: int, message: str) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'isBase64Encoded': False,
+        'body': json.dumps({'error': message})
+    }
+
+def idempotent_replay(request_hash: bytes, idempotency: Dict[str, Any], status_code: Any, body: Any) -> Dict[str, Any]:
+    if request_hash != idempotency['hash']:
+        return idempotency_error(422, 'Idempotency-Key was already used for a different request')
+    if status_code is None:
+        return idempotency_error(409, 'A request with this Idempotency-Key is still in progress')
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Idempotent-Replayed': 'true'
+    }
+    consistency_token = json.loads(body).get('consistencyToken')
+    if consistency_token:
+        headers['X-Consistency-Token'] = consistency_token
+    return {'statusCode': status_code, 'headers': headers, 'isBase64Encoded': False, 'body': body}
+
+def idempotency_cache_key(idempotency: Dict[str, Any]) -> Tuple[str, str]:
+    return idempotency['scope'], idempotency['key']
+
+def cached_idempotent_response(idempotency: Dict[str, Any]) -> Any:
+    cached = _idempotency_cache.get(idempotency_cache_key(idempotency))
+    if not cached or cached[0] <= time.monotonic():
+        return None
+    _idempotency_cache.move_to_end(idempotency_cache_key(idempotency))
+    return idempotent_replay(cached[1], idempotency, cached[2], cached[3])
+
+def claim_idempotency_key(cur, idempotency: Dict[str, Any]) -> Any:
+    execute_prepared(cur, 'idempotency_claim', (idempotency['scope'], idempotency['key'], idempotency['hash'], IDEMPOTENCY_TTL))
+    if cur.fetchone():
+        return None
+    execute_prepared(cur, 'idempotency_lookup', (idempotency['scope'], idempotency['key']))
+    row = cur.fetchone()
+    if not row:
+        return idempotency_error(409, 'A request with this Idempotency-Key is still in progress')
+    body = row['response']
+    if body is not None:
+        payload = json.loads(body)
+        if 'consistencyToken' in payload:
+            payload['consistencyToken'] = current_wal_lsn(cur)
+            body = json.dumps(payload)
+    return idempotent_replay(bytes(row['request_hash']), idempotency, row['status_code'], body)
+
+def save_idempotent_response(cur, idempotency: Any, status_code: int, body: Dict[str, Any]) -> None:
+    if idempotency:
+        execute_prepared(cur, 'idempotency_save', (idempotency['scope'], idempotency['key'], status_code, json.dumps(body)))
+
+def finish_idempotent_request(conn, cur, idempotency: Any, status_code: int, body: Dict[str, Any]) -> None:
+    global _idempotency_purged_at
+    if not idempotency:
+        return
+    _idempotency_cache[idempotency_cache_key(idempotency)] = (
+        time.monotonic() + IDEMPOTENCY_CACHE_TTL, idempotency['hash'], status_code, json.dumps(body)
+    )
+    _idempotency_cache.move_to_end(idempotency_cache_key(idempotency))
+    while len(_idempotency_cache) > IDEMPOTENCY_CACHE_MAX:
+        _idempotency_cache.popitem(last=False)
+    if time.monotonic() - _idempotency_purged_at < IDEMPOTENCY_PURGE_INTERVAL:
+        return
+    _idempotency_purged_at = time.monotonic()
+    try:
+        execute_prepared(cur, 'idempotency_purge', (IDEMPOTENCY_PURGE_BATCH,))
+        conn.commit()
+    except psycopg2.Error:
+        conn.rollback()
+
+_progress_buffer: Dict[Tuple[int, int], Tuple[float, datetime]] = {}
+_progress_buffer_since = 0.0
+
+def buffer_progress(user_id: int, story_id: int, progress: float) -> None:
+    global _progress_buffer_since
+    if not _progress_buffer:
+        _progress_buffer_since = time.monotonic()
+    _progress_buffer[(user_id, story_id)] = (progress, datetime.now())
+
+def progress_flush_due() -> bool:
+    if not _progress_buffer:
+        return False
+    return (len(_progress_buffer) >= PROGRESS_BUFFER_MAX
+            or time.monotonic() - _progress_buffer_since >= PROGRESS_FLUSH_INTERVAL)
+
+def flush_progress(conn, cur) -> int:
+    global _progress_buffer_since
+    if not _progress_buffer:
+        return 0
+    
+    pending = dict(_progress_buffer)
+    _progress_buffer.clear()
+    rows = [(user_id, story_id, progress, updated_at)
+            for (user_id, story_id), (progress, updated_at) in pending.items()]
+    
+    try:
+        execute_values(cur, '''
+            INSERT INTO reading_progress (user_id, story_id, progress, updated_at)
+            SELECT v.user_id, v.story_id, v.progress, v.updated_at
+            FROM (VALUES %s) AS v(user_id, story_id, progress, updated_at)
+            JOIN stories s ON s.id = v.story_id
+            ON CONFLICT (user_id, story_id) DO UPDATE
+            SET progress = EXCLUDED.progress, updated_at = EXCLUDED.updated_at
+            WHERE reading_progress.updated_at <= EXCLUDED.updated_at
+        ''', rows, template='(%s::int, %s::int, %s::real, %s::timestamp)', page_size=PROGRESS_BUFFER_MAX)
+        conn.commit()
+    except psycopg2.Error:
+        conn.rollback()
+        for key, value in pending.items():
+            if key not in _progress_buffer:
+                _progress_buffer[key] = value
+        _progress_buffer_since = time.monotonic()
+        raise
+    
+    return len(rows)
+
+_listener_lock = threading.Lock()
+_listener_thread = None
+_comment_waiters: Dict[int, set] = {}
+
+def comment_listener_loop() -> None:
+    while True:
+        listen_conn = None
+        try:
+            listen_conn = psycopg2.connect(os.environ['DATABASE_URL'])
+            listen_conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            listen_conn.cursor().execute(f'LISTEN {COMMENT_CHANNEL}')
+            wake_comment_waiters(None)
+            while True:
+                if select.select([listen_conn], [], [], 30) == ([], [], []):
+                    continue
+                listen_conn.poll()
+                story_ids = set()
+                while listen_conn.notifies:
+                    payload = listen_conn.notifies.pop(0).payload
+                    story_ids.add(int(payload.split(':', 1)[0]))
+                for notified_story_id in story_ids:
+                    wake_comment_waiters(notified_story_id)
+        except (psycopg2.Error, OSError, ValueError):
+            wake_comment_waiters(None)
+            time.sleep(LISTENER_RECONNECT_DELAY)
+        finally:
+            if listen_conn is not None and not listen_conn.closed:
+                listen_conn.close()
+
+def ensure_comment_listener() -> None:
+    global _listener_thread
+    with _listener_lock:
+        if _listener_thread is None or not _listener_thread.is_alive():
+            _listener_thread = threading.Thread(target=comment_listener_loop, name='comment-listener', daemon=True)
+            _listener_thread.start()
+
+def add_comment_waiter(story_id: int) -> threading.Event:
+    waiter = threading.Event()
+    with _listener_lock:
+        _comment_waiters.setdefault(story_id, set()).add(waiter)
+    return waiter
+
+def remove_comment_waiter(story_id: int, waiter: threading.Event) -> None:
+    with _listener_lock:
+        waiters = _comment_waiters.get(story_id)
+        if waiters is not None:
+            waiters.discard(waiter)
+            if not waiters:
+                del _comment_waiters[story_id]
+
+def wake_comment_waiters(story_id: Any) -> None:
+    with _listener_lock:
+        if story_id is None:
+            woken = [w for waiters in _comment_waiters.values() for w in waiters]
+        else:
+            woken = list(_comment_waiters.get(story_id, ()))
+    for waiter in woken:
+        waiter.set()
+
+def fetch_comments_since(story_id: int, after_id: int) -> List[Dict[str, Any]]:
+    conn = get_connection()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    execute_prepared(cur, 'comments_since', (
+        story_id, after_id, COMMENT_DELTA_LIMIT, COMMENT_OVERLAP_IDS, COMMENT_OVERLAP_SECONDS
+    ))
+    rows = cur.fetchall()
+    cur.close()
+    release_connection(conn)
+    return [dict(row) for row in rows]
+
+def comment_waiter_count() -> int:
+    with _listener_lock:
+        return sum(len(waiters) for waiters in _comment_waiters.values())
+
+def wait_for_comments(story_id: int, after_id: int, wait_seconds: float) -> Tuple[List[Dict[str, Any]], bool]:
+    # Comment ids are taken at INSERT but become visible at COMMIT, so a lower id
+    # can appear after a higher one was already delivered. Each fetch re-reads a
+    # short overlap window below the cursor; only ids above it end the wait, and
+    # clients de-duplicate the overlap by id. The flag tells the caller the wait
+    # was cut short because too many requests are already waiting.
+    shortened = wait_seconds > 0 and comment_waiter_count() >= COMMENT_WAITERS_MAX
+    if shortened:
+        wait_seconds = 0
+    ensure_comment_listener()
+    deadline = time.monotonic() + wait_seconds
+    while True:
+        waiter = add_comment_waiter(story_id)
+        try:
+            comments = fetch_comments_since(story_id, after_id)
+            remaining = deadline - time.monotonic()
+            if any(comment['id'] > after_id for comment in comments) or remaining <= 0:
+                return comments, shortened
+            waiter.wait(remaining)
+        finally:
+            remove_comment_waiter(story_id, waiter)
+
+def format_comment_events(comments: List[Dict[str, Any]], cursor: int, retry_seconds: int = 1) -> str:
+    frames = [f'retry: {retry_seconds * 1000}\n']
+    for comment in comments:
+        frames.append(f"id: {comment['id']}\nevent: comment\ndata: {json.dumps(comment)}\n\n")
+    if not comments:
+        frames.append(': no new comments\n')
+    if not comments or comments[-1]['id'] != cursor:
+        frames.append(f'id: {cursor}\n\n')
+    return ''.join(frames)
+
+def encode_cursor(position: str, story_id: int) -> str:
+    return base64.urlsafe_b64encode(f'{position}|{story_id}'.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: Any) -> Any:
+    if not cursor:
+        return None, None
+    padded = cursor + '=' * (-len(cursor) % 4)
+    position, story_id = base64.urlsafe_b64decode(padded.encode()).decode().rsplit('|', 1)
+    datetime.fromisoformat(position)
+    if not story_id.isdigit() or not 0 < int(story_id) <= MAX_INT4:
+        raise ValueError('cursor id out of range')
+    return position, int(story_id)
+
+def parse_story_ids(raw: str) -> List[int]:
+    ids = []
+    for part in raw.split(','):
+        if part.strip().isdigit():
+            ids.append(int(part.strip()))
+    return sorted(set(ids))[:BOOKMARK_STATE_MAX_IDS]
+
+def apply_rating(cur, story_id: int, user_id: int, score: int) -> Dict[str, Any]:
+    cur.execute('SELECT pg_advisory_xact_lock(%s, %s)', (story_id, user_id))
+    execute_prepared(cur, 'rating_previous', (story_id, user_id))
+    previous = cur.fetchone()
+    previous_score = previous['score'] if previous else None
+    
+    if previous_score == score:
+        cur.execute('SELECT rating, rating_count FROM stories WHERE id = %s', (story_id,))
+        return {'changed': False, 'story': cur.fetchone()}
+    
+    sum_delta = score - (previous_score or 0)
+    count_delta = 0 if previous_score is not None else 1
+    
+    execute_prepared(cur, 'rating_upsert', (story_id, user_id, score))
+    execute_prepared(cur, 'story_rating_apply', (story_id, sum_delta, count_delta))
+    story = cur.fetchone()
+    if story and story['author_id']:
+        execute_prepared(cur, 'author_rating_apply', (story['author_id'], sum_delta, count_delta))
+    
+    return {'changed': True, 'story': story}
+
+RATE_LIMITS = {
+    'comment': (('ip', 20, 20 / 60), ('user', 5, 5 / 60)),
+    'like': (('ip', 60, 1.0), ('user', 30, 0.5)),
+    'rate': (('ip', 60, 1.0), ('user', 30, 0.5)),
+    'bookmark': (('ip', 60, 1.0), ('user', 30, 0.5)),
+    'unbookmark': (('ip', 60, 1.0), ('user', 30, 0.5)),
+    'view': (('ip', 120, 2.0),)
+}
+RATE_LIMIT_MAX_BUCKETS = 10000
+RATE_LIMIT_SHARED_TIMEOUT = 0.05
+RATE_LIMIT_SHARED_RETRY = 30.0
+
+TOKEN_BUCKET_LUA = '''
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+redis.call('HINCRBY', KEYS[2], allowed == 1 and 'admitted' or 'rejected', 1)
+return {allowed, tostring(tokens)}
+'''
+
+_rate_buckets: 'OrderedDict[str, List[float]]' = OrderedDict()
+_rate_limit_stats: Dict[str, Dict[str, int]] = {}
+_rate_limit_script = None
+_rate_limit_shared_down_until = 0.0
+
+def get_rate_limit_script() -> Any:
+    global _rate_limit_script
+    url = os.environ.get('RATE_LIMIT_REDIS_URL')
+    if redis is None or not url or time.monotonic() < _rate_limit_shared_down_until:
+        return None
+    if _rate_limit_script is None:
+        client = redis.Redis.from_url(
+            url, socket_timeout=RATE_LIMIT_SHARED_TIMEOUT, socket_connect_timeout=RATE_LIMIT_SHARED_TIMEOUT
+        )
+        _rate_limit_script = client.register_script(TOKEN_BUCKET_LUA)
+    return _rate_limit_script
+
+def take_local_token(key: str, capacity: int, rate: float) -> float:
+    now = time.monotonic()
+    bucket = _rate_buckets.get(key)
+    if bucket is None:
+        bucket = [float(capacity), now]
+        _rate_buckets[key] = bucket
+        if len(_rate_buckets) > RATE_LIMIT_MAX_BUCKETS:
+            _rate_buckets.popitem(last=False)
+    else:
+        _rate_buckets.move_to_end(key)
+        bucket[0] = min(float(capacity), bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+    if bucket[0] < 1:
+        return (1 - bucket[0]) / rate
+    bucket[0] -= 1
+    return 0.0
+
+def take_shared_token(key: str, capacity: int, rate: float, action: str) -> Any:
+    global _rate_limit_shared_down_until
+    script = get_rate_limit_script()
+    if script is None:
+        return None
+    try:
+        allowed, tokens = script(keys=[f'ratelimit:{key}', f'ratelimit-stats:{action}'], args=[capacity, rate])
+    except redis.RedisError:
+        _rate_limit_shared_down_until = time.monotonic() + RATE_LIMIT_SHARED_RETRY
+        return None
+    return 0.0 if allowed else (1 - float(tokens)) / rate
+
+def request_ip(event: Dict[str, Any]) -> str:
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    return identity.get('sourceIp') or 'unknown'
+
+def check_rate_limit(action: Any, identities: Dict[str, Any], admit: bool = True) -> Any:
+    limits = RATE_LIMITS.get(action)
+    if not limits:
+        return None
+    stats = _rate_limit_stats.setdefault(action, {'admitted': 0, 'rejected': 0, 'rejectedLocally': 0, 'sharedChecks': 0})
+    retry_after = 0.0
+    for dimension, capacity, rate in limits:
+        if identities.get(dimension) is None:
+            continue
+        key = f'{action}:{dimension}:{identities[dimension]}'
+        wait = take_local_token(key, capacity, rate)
+        if wait:
+            stats['rejectedLocally'] += 1
+        else:
+            wait = take_shared_token(key, capacity, rate, action)
+            if wait is not None:
+                stats['sharedChecks'] += 1
+        retry_after = max(retry_after, wait or 0.0)
+    if not retry_after:
+        if admit:
+            stats['admitted'] += 1
+        return None
+    stats['rejected'] += 1
+    return {
+        'statusCode': 429,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Retry-After': str(math.ceil(retry_after))
+        },
+        'isBase64Encoded': False,
+        'body': json.dumps({'error': 'Too many requests', 'retryAfter': math.ceil(retry_after)})
+    }
+
+def rate_limit_stats() -> Dict[str, Any]:
+    report = {
+        'actions': {action: dict(stats) for action, stats in _rate_limit_stats.items()},
+        'buckets': len(_rate_buckets),
+        'shared': get_rate_limit_script() is not None
+    }
+    if report['shared']:
+        try:
+            client = _rate_limit_script.registered_client
+            report['sharedActions'] = {
+                action: {k.decode(): int(v) for k, v in client.hgetall(f'ratelimit-stats:{action}').items()}
+                for action in RATE_LIMITS
+            }
+        except redis.RedisError:
+            pass
+    return report
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: API для лайков, комментариев и взаимодействия с рассказами
-    Args: event - dict с httpMethod, body (storyId, action, userId, comment)
+    Args: event - dict с httpMethod, body (storyId, action, comment), X-Session-Token
           context - object с request_id, function_name
     Returns: JSON результата операции
     '''
@@ -20,7 +787,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Session-Token, X-Consistency-Token, Last-Event-ID, Idempotency-Key',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
@@ -31,9 +798,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         story_id = body_data.get('storyId')
         action = body_data.get('action')
-        user_id = body_data.get('userId')
         
-        if not story_id or not action or not user_id:
+        if not story_id or not action:
             return {
                 'statusCode': 400,
                 'headers': {
@@ -43,34 +809,111 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'isBase64Encoded': False,
                 'body': json.dumps({
                     'error': 'Missing required fields',
-                    'required': ['storyId', 'action', 'userId']
+                    'required': ['storyId', 'action']
                 })
             }
         
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        limited = check_rate_limit(action, {'ip': request_ip(event)}, admit=False)
+        if limited:
+            return limited
+        
+        session_user = resolve_session_user(request_session_token(event), use_cache=action == 'view')
+        user_id = session_user['id'] if session_user else None
+        
+        if user_id is None and action != 'view':
+            return {
+                'statusCode': 401,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'isBase64Encoded': False,
+                'body': json.dumps({'error': 'Unauthorized'})
+            }
+        
+        limited = check_rate_limit(action, {'user': user_id})
+        if limited:
+            return limited
+        
+        if action == 'progress':
+            progress = body_data.get('progress')
+            
+            if isinstance(progress, bool) or not isinstance(progress, (int, float)) or not 0 <= progress <= 1:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'progress must be a number from 0 to 1'})
+                }
+            
+            buffer_progress(user_id, int(story_id), float(progress))
+            
+            flushed = 0
+            if body_data.get('final') or progress_flush_due():
+                conn = get_connection()
+                cur = conn.cursor(cursor_factory=RealDictCursor)
+                try:
+                    flushed = flush_progress(conn, cur)
+                except psycopg2.Error:
+                    flushed = 0
+                cur.close()
+                release_connection(conn)
+            
+            return {
+                'statusCode': 202,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'isBase64Encoded': False,
+                'body': json.dumps({
+                    'success': True,
+                    'storyId': story_id,
+                    'progress': progress,
+                    'flushed': flushed
+                })
+            }
+        
+        idempotency = request_idempotency(event, user_id)
+        if idempotency:
+            if len(idempotency['key']) > IDEMPOTENCY_KEY_MAX_LENGTH:
+                return idempotency_error(400, f'Idempotency-Key must be at most {IDEMPOTENCY_KEY_MAX_LENGTH} characters')
+            cached = cached_idempotent_response(idempotency)
+            if cached:
+                return cached
+        
+        conn = get_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
+        if idempotency:
+            replay = claim_idempotency_key(cur, idempotency)
+            if replay:
+                cur.close()
+                release_connection(conn)
+                return replay
+        
         if action == 'like':
-            cur.execute('''
-                INSERT INTO likes (story_id, user_id)
-                VALUES (%s, %s)
-                ON CONFLICT (story_id, user_id) DO NOTHING
-                RETURNING id
-            ''', (int(story_id), int(user_id)))
+            execute_prepared(cur, 'like_insert', (int(story_id), user_id))
             
             inserted = cur.fetchone()
             
             if inserted:
-                cur.execute('''
-                    UPDATE stories
-                    SET likes = likes + 1
-                    WHERE id = %s
-                    RETURNING likes
-                ''', (int(story_id),))
-                result = cur.fetchone()
+                result = enqueue_interaction(cur, 'like', int(story_id), user_id)
+                response_body = {
+                    'success': True,
+                    'storyId': story_id,
+                    'likes': result['likes'] + 1 if result else 1,
+                    'liked': True,
+                    'message': 'Story liked successfully'
+                }
+                save_idempotent_response(cur, idempotency, 200, response_body)
                 conn.commit()
+                finish_idempotent_request(conn, cur, idempotency, 200, response_body)
                 cur.close()
-                conn.close()
+                release_connection(conn)
                 
                 return {
                     'statusCode': 200,
@@ -79,17 +922,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'Access-Control-Allow-Origin': '*'
                     },
                     'isBase64Encoded': False,
-                    'body': json.dumps({
-                        'success': True,
-                        'storyId': story_id,
-                        'likes': result['likes'],
-                        'liked': True,
-                        'message': 'Story liked successfully'
-                    })
+                    'body': json.dumps(response_body)
                 }
             else:
                 cur.close()
-                conn.close()
+                release_connection(conn)
                 return {
                     'statusCode': 200,
                     'headers': {
@@ -105,11 +942,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         if action == 'comment':
             comment_text = body_data.get('comment')
-            user_name = body_data.get('userName', f'User{user_id}')
+            user_name = session_user['username']
             
             if not comment_text:
                 cur.close()
-                conn.close()
+                release_connection(conn)
                 return {
                     'statusCode': 400,
                     'headers': {
@@ -121,22 +958,13 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 }
             
             cur.execute('''
-                INSERT INTO comments (story_id, user_id, user_name, text)
-                VALUES (%s, %s, %s, %s)
-                RETURNING id, created_at::text as created_at, likes
-            ''', (int(story_id), int(user_id), user_name, comment_text))
+                INSERT INTO comments (story_id, user_id, user_name, text, created_by)
+                VALUES (%s, %s, %s, %s, (SELECT id FROM users WHERE id = %s))
+                RETURNING id, created_at::text as created_at, likes, created_by
+            ''', (int(story_id), user_id, user_name, comment_text, user_id))
             
             result = cur.fetchone()
-            
-            cur.execute('''
-                UPDATE stories
-                SET comments_count = comments_count + 1
-                WHERE id = %s
-            ''', (int(story_id),))
-            
-            conn.commit()
-            cur.close()
-            conn.close()
+            enqueue_interaction(cur, 'comment', int(story_id), user_id)
             
             new_comment = {
                 'id': result['id'],
@@ -147,33 +975,125 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'createdAt': result['created_at'],
                 'likes': result['likes']
             }
+            response_body = {
+                'success': True,
+                'comment': new_comment,
+                'consistencyToken': None,
+                'message': 'Comment added successfully'
+            }
+            save_idempotent_response(cur, idempotency, 201, response_body)
+            
+            conn.commit()
+            consistency_token = current_wal_lsn(cur)
+            response_body['consistencyToken'] = consistency_token
+            finish_idempotent_request(conn, cur, idempotency, 201, response_body)
+            cur.close()
+            release_connection(conn)
             
             return {
                 'statusCode': 201,
                 'headers': {
                     'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
+                    'Access-Control-Allow-Origin': '*',
+                    'X-Consistency-Token': consistency_token
                 },
                 'isBase64Encoded': False,
-                'body': json.dumps({
+                'body': json.dumps(response_body)
+            }
+        
+        if action in ('bookmark', 'unbookmark'):
+            try:
+                if action == 'bookmark':
+                    execute_prepared(cur, 'bookmark_set', (user_id, int(story_id)))
+                    bookmarked_at = cur.fetchone()['bookmarked_at']
+                else:
+                    execute_prepared(cur, 'bookmark_clear', (user_id, int(story_id)))
+                    bookmarked_at = None
+                response_body = {
                     'success': True,
-                    'comment': new_comment,
-                    'message': 'Comment added successfully'
-                })
+                    'storyId': story_id,
+                    'bookmarked': action == 'bookmark',
+                    'bookmarkedAt': bookmarked_at
+                }
+                save_idempotent_response(cur, idempotency, 200, response_body)
+                conn.commit()
+            except psycopg2.IntegrityError:
+                conn.rollback()
+                cur.close()
+                release_connection(conn)
+                return {
+                    'statusCode': 404,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'Story or user not found'})
+                }
+            
+            finish_idempotent_request(conn, cur, idempotency, 200, response_body)
+            cur.close()
+            release_connection(conn)
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'isBase64Encoded': False,
+                'body': json.dumps(response_body)
             }
         
-        if action == 'view':
-            cur.execute('''
-                UPDATE stories
-                SET views = views + 1
-                WHERE id = %s
-                RETURNING views
-            ''', (int(story_id),))
+        if action == 'rate':
+            score = body_data.get('score')
             
-            result = cur.fetchone()
+            if not isinstance(score, int) or isinstance(score, bool) or not 1 <= score <= 5:
+                cur.close()
+                release_connection(conn)
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'score must be an integer from 1 to 5'})
+                }
+            
+            try:
+                result = apply_rating(cur, int(story_id), user_id, score)
+                story = result['story']
+            except psycopg2.IntegrityError:
+                story = None
+            
+            if not story:
+                conn.rollback()
+                cur.close()
+                release_connection(conn)
+                return {
+                    'statusCode': 404,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'Story not found'})
+                }
+            
+            response_body = {
+                'success': True,
+                'storyId': story_id,
+                'score': score,
+                'rating': float(story['rating']) if story['rating'] else 0,
+                'ratingsCount': story['rating_count'],
+                'changed': result['changed']
+            }
+            save_idempotent_response(cur, idempotency, 200, response_body)
             conn.commit()
+            finish_idempotent_request(conn, cur, idempotency, 200, response_body)
             cur.close()
-            conn.close()
+            release_connection(conn)
             
             return {
                 'statusCode': 200,
@@ -182,16 +1102,35 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'Access-Control-Allow-Origin': '*'
                 },
                 'isBase64Encoded': False,
-                'body': json.dumps({
-                    'success': True,
-                    'storyId': story_id,
-                    'views': result['views'] if result else 0,
-                    'message': 'View recorded'
-                })
+                'body': json.dumps(response_body)
+            }
+        
+        if action == 'view':
+            result = enqueue_interaction(cur, 'view', int(story_id), user_id)
+            response_body = {
+                'success': True,
+                'storyId': story_id,
+                'views': result['views'] + 1 if result else 0,
+                'message': 'View recorded'
+            }
+            save_idempotent_response(cur, idempotency, 200, response_body)
+            conn.commit()
+            finish_idempotent_request(conn, cur, idempotency, 200, response_body)
+            cur.close()
+            release_connection(conn)
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'isBase64Encoded': False,
+                'body': json.dumps(response_body)
             }
         
         cur.close()
-        conn.close()
+        release_connection(conn)
         
         return {
             'statusCode': 400,
@@ -202,7 +1141,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False,
             'body': json.dumps({
                 'error': 'Invalid action',
-                'validActions': ['like', 'comment', 'view']
+                'validActions': ['like', 'comment', 'rate', 'view', 'bookmark', 'unbookmark', 'progress']
             })
         }
     
@@ -210,6 +1149,227 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         params = event.get('queryStringParameters', {}) or {}
         story_id = params.get('storyId')
         
+        if params.get('resource') == 'progress':
+            session_user = resolve_session_user(request_session_token(event))
+            if not session_user:
+                return {
+                    'statusCode': 401,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'Unauthorized'})
+                }
+            user_id = str(session_user['id'])
+            
+            conn = get_connection()
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            try:
+                flush_progress(conn, cur)
+            except psycopg2.Error:
+                pass
+            
+            if story_id:
+                execute_prepared(cur, 'progress_for_story', (int(user_id), int(story_id)))
+                row = cur.fetchone()
+                cur.close()
+                release_connection(conn)
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({
+                        'storyId': int(story_id),
+                        'progress': row['progress'] if row else 0,
+                        'updatedAt': row['updatedAt'] if row else None
+                    })
+                }
+            
+            execute_prepared(cur, 'continue_reading', (int(user_id), CONTINUE_READING_LIMIT))
+            rows = cur.fetchall()
+            cur.close()
+            release_connection(conn)
+            
+            stories = []
+            for row in rows:
+                stories.append({
+                    'id': row['story_id'],
+                    'title': row['title'],
+                    'description': row['description'],
+                    'readingTime': row['readingTime'],
+                    'progress': row['progress'],
+                    'updatedAt': row['updatedAt'],
+                    'author': {
+                        'id': row['author_id'],
+                        'name': row['author_name'],
+                        'avatar': row['author_avatar']
+                    }
+                })
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'isBase64Encoded': False,
+                'body': json.dumps({'stories': stories})
+            }
+        
+        if params.get('resource') == 'comments':
+            request_headers = event.get('headers', {}) or {}
+            last_event_id = request_headers.get('Last-Event-ID') or request_headers.get('last-event-id')
+            after = params.get('after') or last_event_id or ''
+            wait = params.get('wait', '')
+            
+            if not story_id or not story_id.isdigit() or not after.isdigit():
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'storyId and after parameters required'})
+                }
+            
+            wait_seconds = min(float(wait), COMMENT_WAIT_MAX) if wait.replace('.', '', 1).isdigit() else 0
+            comments, shortened = wait_for_comments(int(story_id), int(after), wait_seconds)
+            cursor = max([int(after)] + [comment['id'] for comment in comments])
+            retry_seconds = COMMENT_RETRY_SECONDS if shortened else 1
+            
+            accept = request_headers.get('Accept') or request_headers.get('accept') or ''
+            if 'text/event-stream' in accept:
+                headers = {
+                    'Content-Type': 'text/event-stream',
+                    'Cache-Control': 'no-cache',
+                    'Access-Control-Allow-Origin': '*'
+                }
+                body = format_comment_events(comments, cursor, retry_seconds)
+            else:
+                headers = {
+                    'Content-Type': 'application/json',
+                    'Cache-Control': 'no-store',
+                    'Access-Control-Allow-Origin': '*'
+                }
+                body = json.dumps({
+                    'storyId': int(story_id),
+                    'comments': comments,
+                    'cursor': cursor,
+                    'retry': retry_seconds
+                })
+            if shortened:
+                headers['Retry-After'] = str(retry_seconds)
+                headers['Access-Control-Expose-Headers'] = 'Retry-After'
+            
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'isBase64Encoded': False,
+                'body': body
+            }
+        
+        if params.get('resource') == 'bookmarks':
+            session_user = resolve_session_user(request_session_token(event))
+            if not session_user:
+                return {
+                    'statusCode': 401,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'Unauthorized'})
+                }
+            user_id = str(session_user['id'])
+            
+            conn = get_connection()
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            
+            if params.get('storyIds') is not None:
+                story_ids = parse_story_ids(params['storyIds'])
+                execute_prepared(cur, 'bookmark_state', (int(user_id), story_ids))
+                bookmarked_ids = sorted(row['story_id'] for row in cur.fetchall())
+                cur.close()
+                release_connection(conn)
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({
+                        'userId': int(user_id),
+                        'bookmarked': bookmarked_ids
+                    })
+                }
+            
+            page_size = params.get('limit', '')
+            page_size = min(int(page_size), READING_LIST_MAX_PAGE_SIZE) if page_size.isdigit() and int(page_size) > 0 else READING_LIST_PAGE_SIZE
+            try:
+                cursor_bookmarked_at, cursor_story_id = decode_cursor(params.get('cursor'))
+            except ValueError:
+                cur.close()
+                release_connection(conn)
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'Invalid cursor'})
+                }
+            
+            execute_prepared(cur, 'reading_list', (int(user_id), cursor_bookmarked_at, cursor_story_id, page_size + 1))
+            rows = cur.fetchall()
+            cur.close()
+            release_connection(conn)
+            
+            has_more = len(rows) > page_size
+            rows = rows[:page_size]
+            
+            stories = []
+            for row in rows:
+                stories.append({
+                    'id': row['story_id'],
+                    'title': row['title'],
+                    'description': row['description'],
+                    'rating': float(row['rating']) if row['rating'] else 0,
+                    'views': row['views'],
+                    'likes': row['likes'],
+                    'comments': row['comments'],
+                    'readingTime': row['readingTime'],
+                    'publishedAt': row['publishedAt'],
+                    'bookmarkedAt': row['bookmarkedAt'],
+                    'genre': [g for g in row['genre'] if g],
+                    'author': {
+                        'id': row['author_id'],
+                        'name': row['author_name'],
+                        'avatar': row['author_avatar']
+                    }
+                })
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'isBase64Encoded': False,
+                'body': json.dumps({
+                    'stories': stories,
+                    'nextCursor': encode_cursor(rows[-1]['bookmarkedAt'], rows[-1]['story_id']) if has_more else None
+                })
+            }
+        
         if not story_id:
             return {
                 'statusCode': 400,
@@ -221,20 +1381,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'body': json.dumps({'error': 'storyId parameter required'})
             }
         
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        conn, read_source = get_read_connection(request_consistency_token(event))
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
-        cur.execute('''
-            SELECT id, user_id as "userId", user_name as "userName", text, 
-                   likes, created_at::text as "createdAt"
-            FROM comments
-            WHERE story_id = %s
-            ORDER BY created_at DESC
-        ''', (int(story_id),))
+        execute_prepared(cur, 'comments_by_story', (int(story_id),))
         
         rows = cur.fetchall()
         cur.close()
-        conn.close()
+        release_connection(conn)
         
         comments = []
         for row in rows:
@@ -251,13 +1405,15 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 200,
             'headers': {
                 'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
+                'Access-Control-Allow-Origin': '*',
+                'X-Read-Source': read_source
             },
             'isBase64Encoded': False,
             'body': json.dumps({
                 'storyId': story_id,
                 'comments': comments,
-                'total': len(comments)
+                'total': len(comments),
+                'cursor': max((c['id'] for c in comments), default=0)
             })
         }
     
@@ -1,9 +1,694 @@
+import asyncio
+import base64
+import csv
+import gzip
+import heapq
+import io
 import json
+import math
 import os
-from typing import Dict, Any
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+import zlib
+from collections import OrderedDict
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
+try:
+    import psycopg
+    from psycopg.rows import dict_row
+except ImportError:
+    psycopg = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+STORY_CARD_COLUMNS = '''
+    s.id, s.title, s.description, s.rating, s.views,
+    s.likes, s.comments_count as comments, s.reading_time as "readingTime",
+    s.published_at::text as "publishedAt",
+    a.id as author_id, a.name as author_name, a.avatar as author_avatar,
+    a.rating as author_rating, a.stories_count as author_stories,
+    array_agg(sg.genre) as genre
+'''
+
+EXPORT_STORY_COLUMNS = '''
+    s.id, s.title, s.description, s.content, s.content_archived,
+    sca.codec AS archive_codec, sca.content AS archive_content,
+    s.author_id AS "authorId", a.name AS "authorName", s.status,
+    s.rating::float AS rating, s.views, s.likes, s.comments_count AS comments,
+    s.reading_time AS "readingTime", s.published_at::text AS "publishedAt",
+    ARRAY(SELECT sg.genre FROM story_genres sg WHERE sg.story_id = s.id ORDER BY sg.genre) AS genre
+'''
+
+EXPORT_QUERIES = {
+    'catalogue': [
+        ('story', f'''
+            SELECT {EXPORT_STORY_COLUMNS}
+            FROM stories s
+            JOIN authors a ON a.id = s.author_id
+            LEFT JOIN story_content_archive sca ON sca.story_id = s.id
+            WHERE s.status = 'published'
+            ORDER BY s.id
+        ''')
+    ],
+    'author': [
+        ('story', f'''
+            SELECT {EXPORT_STORY_COLUMNS},
+                   (SELECT COALESCE(json_agg(json_build_object(
+                               'id', c.id, 'userName', c.user_name, 'text', c.text,
+                               'likes', c.likes, 'createdAt', c.created_at::text
+                           ) ORDER BY c.id), '[]')
+                    FROM comments c WHERE c.story_id = s.id) AS "commentList"
+            FROM stories s
+            JOIN authors a ON a.id = s.author_id
+            LEFT JOIN story_content_archive sca ON sca.story_id = s.id
+            WHERE s.author_id = %(id)s AND s.status = 'published'
+            ORDER BY s.id
+        ''')
+    ],
+    'user': [
+        ('profile', '''
+            SELECT id, email, username, full_name AS "fullName", avatar, bio, role,
+                   created_at::text AS "createdAt"
+            FROM users WHERE id = %(id)s
+        '''),
+        ('story', f'''
+            SELECT {EXPORT_STORY_COLUMNS}
+            FROM stories s
+            JOIN authors a ON a.id = s.author_id
+            LEFT JOIN story_content_archive sca ON sca.story_id = s.id
+            WHERE s.created_by = %(id)s
+            ORDER BY s.id
+        '''),
+        ('comment', '''
+            SELECT id, story_id AS "storyId", user_name AS "userName", text, likes,
+                   created_at::text AS "createdAt"
+            FROM comments WHERE user_id = %(id)s ORDER BY id
+        '''),
+        ('like', '''
+            SELECT story_id AS "storyId", created_at::text AS "createdAt"
+            FROM likes WHERE user_id = %(id)s ORDER BY story_id
+        '''),
+        ('rating', '''
+            SELECT story_id AS "storyId", score, updated_at::text AS "updatedAt"
+            FROM story_ratings WHERE user_id = %(id)s ORDER BY story_id
+        '''),
+        ('bookmark', '''
+            SELECT story_id AS "storyId", bookmarked_at::text AS "bookmarkedAt"
+            FROM user_stories WHERE user_id = %(id)s AND is_bookmarked ORDER BY story_id
+        '''),
+        ('progress', '''
+            SELECT story_id AS "storyId", progress, updated_at::text AS "updatedAt"
+            FROM reading_progress WHERE user_id = %(id)s ORDER BY story_id
+        '''),
+        ('follow', '''
+            SELECT author_id AS "authorId", created_at::text AS "createdAt"
+            FROM author_follows WHERE user_id = %(id)s ORDER BY author_id
+        ''')
+    ]
+}
+
+STORY_LIST_ORDERS = {
+    'latest': 's.published_at DESC',
+    'popular': 's.views DESC',
+    'rating': 's.rating DESC'
+}
+
+PREPARED_STATEMENTS = {
+    'story_detail': f'''
+        SELECT {STORY_CARD_COLUMNS}, s.content, s.content_archived
+        FROM stories s
+        JOIN authors a ON s.author_id = a.id
+        LEFT JOIN story_genres sg ON s.id = sg.story_id
+        WHERE s.id = $1 AND s.status = 'published'
+        GROUP BY s.id, a.id
+    ''',
+    'story_archived_content': '''
+        SELECT codec, content FROM story_content_archive WHERE story_id = $1
+    ''',
+    'session_user_id': '''
+        SELECT user_id FROM sessions
+        WHERE session_token = $1 AND expires_at > NOW() AND expires_at >= $2 AND expires_at < $3
+    ''',
+    'feed_snapshot': '''
+        SELECT content_hash, body, built_at FROM feed_snapshots
+        WHERE snapshot_key = $1 AND refreshed_at > NOW() - make_interval(secs => $2)
+    '''
+}
+PREPARED_STATEMENTS['story_related'] = f'''
+    SELECT {STORY_CARD_COLUMNS}
+    FROM story_similar ss
+    JOIN stories s ON s.id = ss.similar_story_id
+    JOIN authors a ON s.author_id = a.id
+    LEFT JOIN story_genres sg ON s.id = sg.story_id
+    WHERE ss.story_id = $1 AND ss.rank <= $2 AND s.status = 'published'
+    GROUP BY ss.rank, s.id, a.id
+    ORDER BY ss.rank
+'''
+PREPARED_STATEMENTS['session_affinity'] = '''
+    SELECT se.user_id, ua.genre,
+           ua.score * POWER(0.5, EXTRACT(EPOCH FROM NOW() - ua.updated_at) / 86400.0 / $2) AS score
+    FROM sessions se
+    LEFT JOIN user_genre_affinity ua ON ua.user_id = se.user_id
+    WHERE se.session_token = $1 AND se.expires_at > NOW() AND se.expires_at >= $3 AND se.expires_at < $4
+'''
+PREPARED_STATEMENTS['liked_among'] = '''
+    SELECT story_id FROM likes
+    WHERE user_id = $1 AND story_id = ANY($2::int[])
+'''
+PREPARED_STATEMENTS['feed_candidates'] = f'''
+    SELECT {STORY_CARD_COLUMNS}, EXTRACT(EPOCH FROM s.published_at) AS published_epoch
+    FROM (
+        SELECT DISTINCT story_id
+        FROM (
+            SELECT sg.story_id,
+                   ROW_NUMBER() OVER (PARTITION BY sg.genre ORDER BY s.likes * 5 + s.views DESC, s.id DESC) AS popular_rank,
+                   ROW_NUMBER() OVER (PARTITION BY sg.genre ORDER BY s.published_at DESC, s.id DESC) AS recent_rank
+            FROM story_genres sg
+            JOIN stories s ON s.id = sg.story_id
+            WHERE s.status = 'published'
+        ) ranked
+        WHERE popular_rank <= $1 OR recent_rank <= $1
+    ) candidates
+    JOIN stories s ON s.id = candidates.story_id
+    JOIN authors a ON s.author_id = a.id
+    LEFT JOIN story_genres sg ON s.id = sg.story_id
+    GROUP BY s.id, a.id
+'''
+for sort_name, order_clause in STORY_LIST_ORDERS.items():
+    PREPARED_STATEMENTS[f'story_list_{sort_name}'] = f'''
+        SELECT {STORY_CARD_COLUMNS}
+        FROM stories s
+        JOIN authors a ON s.author_id = a.id
+        LEFT JOIN story_genres sg ON s.id = sg.story_id
+        WHERE s.status = 'published'
+        GROUP BY s.id, a.id
+        ORDER BY {order_clause}
+    '''
+
+RELATED_LIMIT_MAX = 12
+MAX_INT4 = 2147483647
+PAGE_COMMENTS_LIMIT = 50
+PAGE_RELATED_LIMIT = 6
+
+PERSONAL_FEED_SIZE = 20
+CANDIDATES_PER_GENRE = 200
+CANDIDATE_POOL_TTL = 60
+AFFINITY_HALF_LIFE_DAYS = 30
+TOP_AFFINITY_GENRES = 5
+FRESHNESS_HALF_LIFE_DAYS = 14
+FEED_FRESHNESS_WEIGHT = 0.3
+FEED_POPULARITY_WEIGHT = 0.2
+
+CONTENT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+EXPORT_ITERSIZE = 2000
+EXPORT_GZIP_LEVEL = 6
+EXPORT_MAX_RESPONSE_BYTES = 4 * 1024 * 1024
+HTTP_EXPORTS = ('author', 'me')
+SNAPSHOT_CACHE_TTL = 5
+SNAPSHOT_CACHE_MAX_ENTRIES = 256
+SNAPSHOT_MAX_AGE = 600
+SYNDICATION_MAX_AGE = 7 * 86400
+SYNDICATION_CONTENT_TYPES = {
+    'rss': 'application/rss+xml; charset=utf-8',
+    'atom': 'application/atom+xml; charset=utf-8',
+    'sitemap': 'application/xml; charset=utf-8'
+}
+
+CONNECTION_MAX_AGE = 300
+
+_connection = None
+_connection_opened_at = 0.0
+_prepared_names: set = set()
+
+def get_connection():
+    global _connection, _connection_opened_at
+    conn = _connection
+    if conn is not None and not conn.closed:
+        if time.monotonic() - _connection_opened_at > CONNECTION_MAX_AGE:
+            conn.close()
+        elif conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                conn.close()
+    if conn is None or conn.closed:
+        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        _connection = conn
+        _connection_opened_at = time.monotonic()
+        _prepared_names.clear()
+    return conn
+
+def release_connection(conn) -> None:
+    if conn.closed:
+        return
+    try:
+        if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except psycopg2.Error:
+        conn.close()
+
+REPLICA_MAX_LAG_SECONDS = 5.0
+REPLICA_CHECK_INTERVAL = 5.0
+
+_replica_connection = None
+_replica_opened_at = 0.0
+_replica_prepared_names: set = set()
+_replica_status: Dict[str, Any] = {'checked_at': 0.0, 'lag': None, 'replay_lsn': 0}
+
+def parse_lsn(lsn: Any) -> int:
+    try:
+        high, low = str(lsn).split('/')
+        return (int(high, 16) << 32) | int(low, 16)
+    except (ValueError, AttributeError):
+        return 0
+
+def get_replica_connection():
+    global _replica_connection, _replica_opened_at
+    dsns = [dsn.strip() for dsn in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if dsn.strip()]
+    if not dsns:
+        return None
+    conn = _replica_connection
+    if conn is not None and not conn.closed and time.monotonic() - _replica_opened_at > CONNECTION_MAX_AGE:
+        conn.close()
+    if conn is None or conn.closed:
+        try:
+            conn = psycopg2.connect(dsns[os.getpid() % len(dsns)], connect_timeout=2)
+        except psycopg2.OperationalError:
+            _replica_status.update({'checked_at': time.monotonic(), 'lag': None})
+            return None
+        conn.autocommit = True
+        _replica_connection = conn
+        _replica_opened_at = time.monotonic()
+        _replica_prepared_names.clear()
+    return conn
+
+def refresh_replica_status(conn) -> None:
+    cur = conn.cursor()
+    cur.execute('''
+        SELECT pg_last_wal_replay_lsn()::text,
+               CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0)
+               END
+    ''')
+    replay_lsn, lag = cur.fetchone()
+    cur.close()
+    _replica_status.update({'checked_at': time.monotonic(), 'lag': float(lag), 'replay_lsn': parse_lsn(replay_lsn)})
+
+def get_read_connection(consistency_token: Any = None) -> Any:
+    replica = get_replica_connection()
+    if replica is None:
+        return get_connection(), 'primary'
+    try:
+        required_lsn = parse_lsn(consistency_token) if consistency_token else 0
+        stale = time.monotonic() - _replica_status['checked_at'] > REPLICA_CHECK_INTERVAL
+        if stale or (required_lsn and _replica_status['replay_lsn'] < required_lsn):
+            refresh_replica_status(replica)
+    except psycopg2.Error:
+        replica.close()
+        _replica_status.update({'checked_at': time.monotonic(), 'lag': None})
+        return get_connection(), 'primary'
+    if _replica_status['lag'] is None or _replica_status['lag'] > REPLICA_MAX_LAG_SECONDS:
+        return get_connection(), 'primary'
+    if required_lsn and _replica_status['replay_lsn'] < required_lsn:
+        return get_connection(), 'primary'
+    return replica, 'replica'
+
+def request_consistency_token(event: Dict[str, Any]) -> Any:
+    headers = event.get('headers', {}) or {}
+    return headers.get('X-Consistency-Token') or headers.get('x-consistency-token')
+
+def execute_prepared(cur, name: str, params: tuple = ()) -> None:
+    prepared_names = _replica_prepared_names if cur.connection is _replica_connection else _prepared_names
+    if name not in prepared_names:
+        cur.execute(f'PREPARE {name} AS {PREPARED_STATEMENTS[name]}')
+        prepared_names.add(name)
+    if params:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cur.execute(f'EXECUTE {name}')
+
+STORY_PAGE_QUERIES = {
+    'story': f'''
+        SELECT {STORY_CARD_COLUMNS}, s.content, s.content_archived
+        FROM stories s
+        JOIN authors a ON s.author_id = a.id
+        LEFT JOIN story_genres sg ON s.id = sg.story_id
+        WHERE s.id = %(story_id)s AND s.status = 'published'
+        GROUP BY s.id, a.id
+    ''',
+    'comments': '''
+        SELECT id, user_id as "userId", user_name as "userName", text,
+               likes, created_at::text as "createdAt"
+        FROM comments
+        WHERE story_id = %(story_id)s
+        ORDER BY id DESC
+        LIMIT %(comments_limit)s
+    ''',
+    'related': f'''
+        SELECT {STORY_CARD_COLUMNS}
+        FROM story_similar ss
+        JOIN stories s ON s.id = ss.similar_story_id
+        JOIN authors a ON s.author_id = a.id
+        LEFT JOIN story_genres sg ON s.id = sg.story_id
+        WHERE ss.story_id = %(story_id)s AND ss.rank <= %(related_limit)s AND s.status = 'published'
+        GROUP BY ss.rank, s.id, a.id
+        ORDER BY ss.rank
+    ''',
+    'viewer': '''
+        SELECT se.user_id,
+               EXISTS (SELECT 1 FROM likes l
+                       WHERE l.story_id = %(story_id)s AND l.user_id = se.user_id) as liked,
+               EXISTS (SELECT 1 FROM user_stories us
+                       WHERE us.story_id = %(story_id)s AND us.user_id = se.user_id AND us.is_bookmarked) as bookmarked
+        FROM sessions se
+        WHERE se.session_token = %(session_token)s AND se.expires_at > NOW()
+          AND se.expires_at >= %(session_from)s AND se.expires_at < %(session_until)s
+    ''',
+    'view': '''
+        INSERT INTO interaction_outbox (event_type, story_id, user_id)
+        SELECT 'view', s.id,
+               (SELECT user_id FROM sessions
+                WHERE session_token = %(session_token)s AND expires_at > NOW()
+                  AND expires_at >= %(session_from)s AND expires_at < %(session_until)s)
+        FROM stories s
+        WHERE s.id = %(story_id)s AND s.status = 'published'
+        RETURNING id
+    '''
+}
+
+_async_loop = None
+_async_connection = None
+
+async def _fetch_pipelined(queries: List[Any]) -> List[List[Dict[str, Any]]]:
+    global _async_connection
+    if _async_connection is None or _async_connection.closed:
+        _async_connection = await psycopg.AsyncConnection.connect(
+            os.environ['DATABASE_URL'], autocommit=True, row_factory=dict_row
+        )
+    conn = _async_connection
+    async with conn.pipeline():
+        cursors = [await conn.execute(sql, query_params) for sql, query_params in queries]
+    return [await c.fetchall() for c in cursors]
+
+def fetch_all_concurrently(cur, queries: List[Any]) -> List[List[Dict[str, Any]]]:
+    global _async_loop, _async_connection
+    if psycopg is None:
+        results = []
+        for sql, query_params in queries:
+            cur.execute(sql, query_params)
+            results.append(cur.fetchall())
+        return results
+    
+    if _async_loop is None:
+        _async_loop = asyncio.new_event_loop()
+    try:
+        return _async_loop.run_until_complete(_fetch_pipelined(queries))
+    except psycopg.OperationalError:
+        close_async_connection()
+        return _async_loop.run_until_complete(_fetch_pipelined(queries))
+
+def close_async_connection() -> None:
+    global _async_connection
+    conn, _async_connection = _async_connection, None
+    if conn is not None and not conn.closed:
+        try:
+            _async_loop.run_until_complete(conn.close())
+        except psycopg.Error:
+            pass
+
+def format_story(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'id': row['id'],
+        'title': row['title'],
+        'description': row['description'],
+        'rating': float(row['rating']) if row['rating'] else 0,
+        'views': row['views'],
+        'likes': row['likes'],
+        'comments': row['comments'],
+        'readingTime': row['readingTime'],
+        'publishedAt': row['publishedAt'],
+        'genre': [g for g in row['genre'] if g],
+        'author': {
+            'id': row['author_id'],
+            'name': row['author_name'],
+            'avatar': row['author_avatar'],
+            'rating': float(row['author_rating']) if row['author_rating'] else 0,
+            'stories': row['author_stories']
+        }
+    }
+
+_content_cache: 'OrderedDict[int, str]' = OrderedDict()
+_content_cache_stats: Dict[str, int] = {'bytes': 0, 'hits': 0, 'misses': 0}
+
+def decompress_content(codec: str, data: bytes) -> str:
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('zstandard is required to read zstd-archived stories')
+        return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+    return zlib.decompress(data).decode('utf-8')
+
+def load_story_content(cur, row: Dict[str, Any]) -> Any:
+    if not row['content_archived']:
+        return row['content'], 'hot'
+    story_id = row['id']
+    content = _content_cache.get(story_id)
+    if content is not None:
+        _content_cache.move_to_end(story_id)
+        _content_cache_stats['hits'] += 1
+        return content, 'archive-cache'
+    _content_cache_stats['misses'] += 1
+    execute_prepared(cur, 'story_archived_content', (story_id,))
+    archived = cur.fetchone()
+    content = decompress_content(archived['codec'], bytes(archived['content'])) if archived else ''
+    size = len(content)
+    if size <= CONTENT_CACHE_MAX_BYTES:
+        _content_cache[story_id] = content
+        _content_cache_stats['bytes'] += size
+        while _content_cache_stats['bytes'] > CONTENT_CACHE_MAX_BYTES:
+            _, evicted = _content_cache.popitem(last=False)
+            _content_cache_stats['bytes'] -= len(evicted)
+    return content, 'archive'
+
+def export_records(conn, dataset: str, params: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    for record_type, query in EXPORT_QUERIES[dataset]:
+        cur = conn.cursor(name=f'export_{record_type}', cursor_factory=RealDictCursor)
+        cur.itersize = EXPORT_ITERSIZE
+        try:
+            cur.execute(query, params)
+            for row in cur:
+                record = dict(row)
+                if 'archive_codec' in record:
+                    codec, archived = record.pop('archive_codec'), record.pop('archive_content')
+                    if record.pop('content_archived') and archived is not None:
+                        record['content'] = decompress_content(codec, bytes(archived))
+                yield record_type, record
+        finally:
+            cur.close()
+
+def encode_records(records: Iterator[Tuple[str, Dict[str, Any]]], export_format: str) -> Iterator[str]:
+    if export_format == 'ndjson':
+        for record_type, record in records:
+            yield json.dumps({'type': record_type, **record}, ensure_ascii=False, default=str) + '\n'
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    current_type = None
+    for record_type, record in records:
+        if record_type != current_type:
+            writer.writerow(['type', *record.keys()])
+            current_type = record_type
+        writer.writerow([record_type, *(
+            json.dumps(value, ensure_ascii=False) if isinstance(value, (list, dict)) else value
+            for value in record.values()
+        )])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+def gzip_chunks(chunks: Iterator[str], level: int = EXPORT_GZIP_LEVEL) -> Iterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def story_list_snapshot_key(sort_by: str, genre: Optional[str]) -> str:
+    return f'stories:{sort_by}:genre:{genre}' if genre else f'stories:{sort_by}'
+
+def render_story_list(rows: List[Dict[str, Any]], genre: Optional[str]) -> str:
+    stories = []
+    for row in rows:
+        story = format_story(row)
+        if genre and genre not in story['genre']:
+            continue
+        stories.append(story)
+    return json.dumps({'stories': stories, 'total': len(stories), 'feed': 'global'})
+
+def syndication_snapshot_key(kind: str, scope: str = 'global', value: Any = None) -> str:
+    if kind == 'sitemap':
+        return f'sitemap:{value}'
+    return f'{kind}:{scope}:{value}' if value is not None else f'{kind}:global'
+
+_snapshot_cache: 'OrderedDict[str, Any]' = OrderedDict()
+
+def load_snapshot(cur, key: str, max_age: int = SNAPSHOT_MAX_AGE) -> Optional[Dict[str, Any]]:
+    cached = _snapshot_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        _snapshot_cache.move_to_end(key)
+        return cached[1]
+    execute_prepared(cur, 'feed_snapshot', (key, max_age))
+    row = cur.fetchone()
+    if not row:
+        _snapshot_cache.pop(key, None)
+        return None
+    snapshot = {
+        'hash': row['content_hash'],
+        'body': bytes(row['body']),
+        'built_at': row['built_at'].replace(microsecond=0, tzinfo=timezone.utc)
+    }
+    _snapshot_cache[key] = (time.monotonic() + SNAPSHOT_CACHE_TTL, snapshot)
+    _snapshot_cache.move_to_end(key)
+    while len(_snapshot_cache) > SNAPSHOT_CACHE_MAX_ENTRIES:
+        _snapshot_cache.popitem(last=False)
+    return snapshot
+
+def snapshot_response(event: Dict[str, Any], snapshot: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    request_headers = event.get('headers', {}) or {}
+    etag = f'"{snapshot["hash"]}"'
+    response_headers = {
+        **headers,
+        'ETag': etag,
+        'Last-Modified': format_datetime(snapshot['built_at'], usegmt=True),
+        'Vary': 'Accept-Encoding',
+        'X-Snapshot': 'hit'
+    }
+    if_none_match = request_headers.get('If-None-Match') or request_headers.get('if-none-match')
+    if_modified_since = request_headers.get('If-Modified-Since') or request_headers.get('if-modified-since')
+    if if_none_match:
+        not_modified = if_none_match == etag
+    else:
+        try:
+            not_modified = bool(if_modified_since) and parsedate_to_datetime(if_modified_since) >= snapshot['built_at']
+        except (TypeError, ValueError):
+            not_modified = False
+    if not_modified:
+        return {'statusCode': 304, 'headers': response_headers, 'isBase64Encoded': False, 'body': ''}
+    accept_encoding = request_headers.get('Accept-Encoding') or request_headers.get('accept-encoding') or ''
+    if 'gzip' in accept_encoding:
+        response_headers['Content-Encoding'] = 'gzip'
+        return {
+            'statusCode': 200,
+            'headers': response_headers,
+            'isBase64Encoded': True,
+            'body': base64.b64encode(snapshot['body']).decode('ascii')
+        }
+    return {
+        'statusCode': 200,
+        'headers': response_headers,
+        'isBase64Encoded': False,
+        'body': gzip.decompress(snapshot['body']).decode('utf-8')
+    }
+
+_candidate_pool: Dict[str, Any] = {'loaded_at': 0.0, 'stories': {}, 'by_genre': {}}
+
+def load_candidate_pool(cur) -> Dict[str, Any]:
+    if time.monotonic() - _candidate_pool['loaded_at'] < CANDIDATE_POOL_TTL:
+        return _candidate_pool
+    
+    execute_prepared(cur, 'feed_candidates', (CANDIDATES_PER_GENRE,))
+    stories: Dict[int, Dict[str, Any]] = {}
+    by_genre: Dict[str, List[int]] = {}
+    max_engagement = 1.0
+    for row in cur.fetchall():
+        story = format_story(row)
+        engagement = math.log1p((row['likes'] or 0) * 5 + (row['views'] or 0))
+        max_engagement = max(max_engagement, engagement)
+        stories[row['id']] = {
+            'story': story,
+            'engagement': engagement,
+            'published_epoch': float(row['published_epoch'] or 0)
+        }
+        for genre_name in story['genre']:
+            by_genre.setdefault(genre_name, []).append(row['id'])
+    now = time.time()
+    for candidate in stories.values():
+        age_days = max(now - candidate['published_epoch'], 0) / 86400.0
+        freshness = 0.5 ** (age_days / FRESHNESS_HALF_LIFE_DAYS)
+        popularity = candidate['engagement'] / max_engagement
+        candidate['base_score'] = FEED_FRESHNESS_WEIGHT * freshness + FEED_POPULARITY_WEIGHT * popularity
+        candidate['genre_norm'] = math.sqrt(len(candidate['story']['genre']) or 1)
+    
+    _candidate_pool.update({'loaded_at': time.monotonic(), 'stories': stories, 'by_genre': by_genre})
+    return _candidate_pool
+
+def rank_personal_feed(pool: Dict[str, Any], affinity: Dict[str, float], limit: int) -> List[Dict[str, Any]]:
+    top_genres = sorted(affinity, key=affinity.get, reverse=True)[:TOP_AFFINITY_GENRES]
+    strongest = affinity[top_genres[0]]
+    weights = {g: affinity[g] / strongest for g in top_genres}
+    
+    candidate_ids = set()
+    for genre_name in top_genres:
+        candidate_ids.update(pool['by_genre'].get(genre_name, ()))
+    
+    scored = []
+    for story_id in candidate_ids:
+        candidate = pool['stories'][story_id]
+        match = sum(weights.get(g, 0.0) for g in candidate['story']['genre']) / candidate['genre_norm']
+        scored.append((match + candidate['base_score'], story_id))
+    
+    return [pool['stories'][story_id]['story'] for _, story_id in heapq.nlargest(limit, scored)]
+
+SESSION_ANY_EXPIRY = (datetime(1970, 1, 1), datetime(9999, 1, 1))
+
+def session_expiry_bounds(session_token: Any) -> Tuple[datetime, datetime]:
+    # Tokens end with the expiry day (generate_session_token), which names the
+    # sessions partition; older tokens without it fall back to every partition.
+    day = (session_token or '').rpartition('.')[2]
+    if len(day) == 8 and day.isdigit():
+        try:
+            start = datetime.strptime(day, '%Y%m%d')
+            return start, start + timedelta(days=1)
+        except ValueError:
+            pass
+    return SESSION_ANY_EXPIRY
+
+def personal_feed(cur, session_token: str) -> Optional[Dict[str, Any]]:
+    started = time.perf_counter()
+    execute_prepared(cur, 'session_affinity', (session_token, AFFINITY_HALF_LIFE_DAYS, *session_expiry_bounds(session_token)))
+    rows = cur.fetchall()
+    if not rows:
+        return None
+    
+    user_id = rows[0]['user_id']
+    affinity = {row['genre']: row['score'] for row in rows if row['genre'] and row['score'] and row['score'] > 0}
+    if not affinity:
+        return None
+    
+    pool = load_candidate_pool(cur)
+    ranked = rank_personal_feed(pool, affinity, PERSONAL_FEED_SIZE * 2)
+    if not ranked:
+        return None
+    
+    execute_prepared(cur, 'liked_among', (user_id, [story['id'] for story in ranked]))
+    liked = {row['story_id'] for row in cur.fetchall()}
+    stories = [story for story in ranked if story['id'] not in liked][:PERSONAL_FEED_SIZE]
+    
+    return {
+        'stories': stories,
+        'total': len(stories),
+        'feed': 'personal',
+        'elapsedMs': round((time.perf_counter() - started) * 1000, 3)
+    }
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: API для управления рассказами ужасов - получение списка, поиск, фильтрация
@@ -19,7 +704,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Session-Token, X-Consistency-Token, If-None-Match, If-Modified-Since',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
@@ -30,28 +715,241 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         story_id = params.get('id')
         genre = params.get('genre')
         sort_by = params.get('sort', 'latest')
+        related_to = params.get('relatedTo')
         
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        if (story_id and params.get('include') == 'page') or params.get('export'):
+            conn, read_source = get_connection(), 'primary'
+        else:
+            conn, read_source = get_read_connection(request_consistency_token(event))
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
+        if params.get('export'):
+            dataset = params['export']
+            export_format = params.get('format', 'ndjson')
+            export_id = params.get('id', '')
+            
+            if (dataset not in HTTP_EXPORTS or export_format not in EXPORT_FORMATS
+                    or dataset == 'author' and not export_id.isdigit()):
+                cur.close()
+                release_connection(conn)
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({
+                        'error': 'Invalid export request',
+                        'validExports': list(HTTP_EXPORTS),
+                        'validFormats': list(EXPORT_FORMATS.keys())
+                    })
+                }
+            
+            if dataset == 'me':
+                request_headers = event.get('headers', {}) or {}
+                session_token = request_headers.get('X-Session-Token') or request_headers.get('x-session-token')
+                row = None
+                if session_token:
+                    execute_prepared(cur, 'session_user_id', (session_token, *session_expiry_bounds(session_token)))
+                    row = cur.fetchone()
+                if not row:
+                    cur.close()
+                    release_connection(conn)
+                    return {
+                        'statusCode': 401,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'Unauthorized'})
+                    }
+                dataset, export_id = 'user', str(row['user_id'])
+            
+            started = time.perf_counter()
+            records = export_records(conn, dataset, {'id': int(export_id) if export_id.isdigit() else None})
+            stream = gzip_chunks(encode_records(records, export_format))
+            chunks, size = [], 0
+            for chunk in stream:
+                size += len(chunk)
+                if size > EXPORT_MAX_RESPONSE_BYTES:
+                    break
+                chunks.append(chunk)
+            stream.close()
+            records.close()
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 3)
+            cur.close()
+            release_connection(conn)
+            
+            if size > EXPORT_MAX_RESPONSE_BYTES:
+                return {
+                    'statusCode': 413,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'Export too large, use scripts/export_data.py'})
+                }
+            
+            body = b''.join(chunks)
+            filename = f"{params['export']}{'-' + export_id if dataset == 'author' else ''}.{export_format}"
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': EXPORT_FORMATS[export_format],
+                    'Content-Encoding': 'gzip',
+                    'Content-Disposition': f'attachment; filename="{filename}"',
+                    'Access-Control-Allow-Origin': '*',
+                    'Cache-Control': 'private, no-store',
+                    'X-Export-Ms': str(elapsed_ms)
+                },
+                'isBase64Encoded': True,
+                'body': base64.b64encode(body).decode('ascii')
+            }
+        
+        if params.get('feed') in ('rss', 'atom') or params.get('sitemap'):
+            if params.get('sitemap'):
+                kind = 'sitemap'
+                key = syndication_snapshot_key(kind, value=params['sitemap'])
+            elif params.get('author', '').isdigit():
+                kind = params['feed']
+                key = syndication_snapshot_key(kind, 'author', int(params['author']))
+            else:
+                kind = params['feed']
+                key = syndication_snapshot_key(kind, 'genre', genre) if genre else syndication_snapshot_key(kind)
+            
+            snapshot = load_snapshot(cur, key, SYNDICATION_MAX_AGE)
+            cur.close()
+            release_connection(conn)
+            
+            if not snapshot:
+                return {
+                    'statusCode': 404,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'Feed not found'})
+                }
+            
+            return snapshot_response(event, snapshot, {
+                'Content-Type': SYNDICATION_CONTENT_TYPES[kind],
+                'Access-Control-Allow-Origin': '*',
+                'Cache-Control': 'public, max-age=300'
+            })
+        
+        if related_to:
+            limit_param = params.get('limit') or str(RELATED_LIMIT_MAX)
+            if not related_to.isdigit() or not 0 < int(related_to) <= MAX_INT4 or not limit_param.isdigit():
+                cur.close()
+                release_connection(conn)
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'relatedTo and limit must be positive integers'})
+                }
+            limit = min(max(int(limit_param), 1), RELATED_LIMIT_MAX)
+            execute_prepared(cur, 'story_related', (int(related_to), limit))
+            rows = cur.fetchall()
+            cur.close()
+            release_connection(conn)
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    'Cache-Control': 'public, max-age=300',
+                    'X-Read-Source': read_source
+                },
+                'isBase64Encoded': False,
+                'body': json.dumps({'storyId': int(related_to), 'stories': [format_story(row) for row in rows]})
+            }
+        
+        if story_id and params.get('include') == 'page':
+            request_headers = event.get('headers', {}) or {}
+            session_token = request_headers.get('X-Session-Token') or request_headers.get('x-session-token')
+            session_from, session_until = session_expiry_bounds(session_token)
+            query_params = {
+                'story_id': int(story_id),
+                'session_token': session_token,
+                'session_from': session_from,
+                'session_until': session_until,
+                'comments_limit': PAGE_COMMENTS_LIMIT + 1,
+                'related_limit': PAGE_RELATED_LIMIT
+            }
+            
+            started = time.perf_counter()
+            story_rows, comment_rows, related_rows, viewer_rows = fetch_all_concurrently(
+                cur, [(STORY_PAGE_QUERIES[name], query_params)
+                      for name in ('story', 'comments', 'related', 'viewer')]
+            )
+            view_rows = []
+            if story_rows:
+                cur.execute(STORY_PAGE_QUERIES['view'], query_params)
+                view_rows = cur.fetchall()
+                conn.commit()
+                content, content_source = load_story_content(cur, story_rows[0])
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 3)
+            cur.close()
+            release_connection(conn)
+            
+            if not story_rows:
+                return {
+                    'statusCode': 404,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'Story not found'})
+                }
+            
+            story = format_story(story_rows[0])
+            story['content'] = content
+            comments = [dict(row) for row in comment_rows[:PAGE_COMMENTS_LIMIT]]
+            viewer = viewer_rows[0] if viewer_rows else None
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    'Cache-Control': 'private, no-store',
+                    'X-Content-Source': content_source
+                },
+                'isBase64Encoded': False,
+                'body': json.dumps({
+                    'story': story,
+                    'comments': comments,
+                    'hasMoreComments': len(comment_rows) > PAGE_COMMENTS_LIMIT,
+                    'commentsCursor': max((c['id'] for c in comments), default=0),
+                    'related': [format_story(row) for row in related_rows],
+                    'viewer': {
+                        'userId': viewer['user_id'] if viewer else None,
+                        'liked': bool(viewer and viewer['liked']),
+                        'bookmarked': bool(viewer and viewer['bookmarked'])
+                    },
+                    'viewRecorded': bool(view_rows),
+                    'elapsedMs': elapsed_ms
+                })
+            }
+        
         if story_id:
-            cur.execute('''
-                SELECT s.id, s.title, s.description, s.content, s.rating, s.views, 
-                       s.likes, s.comments_count as comments, s.reading_time as "readingTime",
-                       s.published_at::text as "publishedAt",
-                       a.id as author_id, a.name as author_name, a.avatar as author_avatar,
-                       a.rating as author_rating, a.stories_count as author_stories,
-                       array_agg(sg.genre) as genre
-                FROM stories s
-                JOIN authors a ON s.author_id = a.id
-                LEFT JOIN story_genres sg ON s.id = sg.story_id
-                WHERE s.id = %s
-                GROUP BY s.id, a.id
-            ''', (int(story_id),))
+            execute_prepared(cur, 'story_detail', (int(story_id),))
             
             row = cur.fetchone()
+            if row:
+                content, content_source = load_story_content(cur, row)
             cur.close()
-            conn.close()
+            release_connection(conn)
             
             if not row:
                 return {
@@ -64,102 +962,67 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps({'error': 'Story not found'})
                 }
             
-            story = {
-                'id': row['id'],
-                'title': row['title'],
-                'description': row['description'],
-                'content': row['content'],
-                'rating': float(row['rating']) if row['rating'] else 0,
-                'views': row['views'],
-                'likes': row['likes'],
-                'comments': row['comments'],
-                'readingTime': row['readingTime'],
-                'publishedAt': row['publishedAt'],
-                'genre': [g for g in row['genre'] if g],
-                'author': {
-                    'id': row['author_id'],
-                    'name': row['author_name'],
-                    'avatar': row['author_avatar'],
-                    'rating': float(row['author_rating']) if row['author_rating'] else 0,
-                    'stories': row['author_stories']
-                }
-            }
+            story = format_story(row)
+            story['content'] = content
             
             return {
                 'statusCode': 200,
                 'headers': {
                     'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
+                    'Access-Control-Allow-Origin': '*',
+                    'X-Read-Source': read_source,
+                    'X-Content-Source': content_source
                 },
                 'isBase64Encoded': False,
                 'body': json.dumps(story)
             }
         
-        order_clause = 's.published_at DESC'
-        if sort_by == 'popular':
-            order_clause = 's.views DESC'
-        elif sort_by == 'rating':
-            order_clause = 's.rating DESC'
+        if params.get('feed') == 'personal':
+            headers = event.get('headers', {}) or {}
+            session_token = headers.get('X-Session-Token') or headers.get('x-session-token')
+            feed = personal_feed(cur, session_token) if session_token else None
+            if feed:
+                cur.close()
+                release_connection(conn)
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*',
+                        'Cache-Control': 'private, no-store',
+                        'X-Read-Source': read_source
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps(feed)
+                }
         
-        genre_filter = ''
-        genre_params = []
-        if genre:
-            genre_filter = 'WHERE %s = ANY(array_agg(sg.genre))'
-            genre_params = [genre]
+        if sort_by not in STORY_LIST_ORDERS:
+            sort_by = 'latest'
         
-        query = f'''
-            SELECT s.id, s.title, s.description, s.rating, s.views, 
-                   s.likes, s.comments_count as comments, s.reading_time as "readingTime",
-                   s.published_at::text as "publishedAt",
-                   a.id as author_id, a.name as author_name, a.avatar as author_avatar,
-                   a.rating as author_rating, a.stories_count as author_stories,
-                   array_agg(sg.genre) as genre
-            FROM stories s
-            JOIN authors a ON s.author_id = a.id
-            LEFT JOIN story_genres sg ON s.id = sg.story_id
-            GROUP BY s.id, a.id
-            ORDER BY {order_clause}
-        '''
+        list_headers = {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'X-Read-Source': read_source
+        }
         
-        cur.execute(query)
+        if not request_consistency_token(event):
+            snapshot = load_snapshot(cur, story_list_snapshot_key(sort_by, genre))
+            if snapshot:
+                cur.close()
+                release_connection(conn)
+                return snapshot_response(event, snapshot, list_headers)
+        
+        execute_prepared(cur, f'story_list_{sort_by}')
         rows = cur.fetchall()
         cur.close()
-        conn.close()
-        
-        stories = []
-        for row in rows:
-            genre_list = [g for g in row['genre'] if g]
-            if genre and genre not in genre_list:
-                continue
-                
-            stories.append({
-                'id': row['id'],
-                'title': row['title'],
-                'description': row['description'],
-                'rating': float(row['rating']) if row['rating'] else 0,
-                'views': row['views'],
-                'likes': row['likes'],
-                'comments': row['comments'],
-                'readingTime': row['readingTime'],
-                'publishedAt': row['publishedAt'],
-                'genre': genre_list,
-                'author': {
-                    'id': row['author_id'],
-                    'name': row['author_name'],
-                    'avatar': row['author_avatar'],
-                    'rating': float(row['author_rating']) if row['author_rating'] else 0,
-                    'stories': row['author_stories']
-                }
-            })
+        release_connection(conn)
         
         return {
             'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
+            'headers': list_headers,
             'isBase64Encoded': False,
-            'body': json.dumps({'stories': stories, 'total': len(stories)})
+            'body': render_story_list(rows, genre)
         }
     
     return {
@@ -0,0 +1,6 @@
+ALTER TABLE stories ADD COLUMN IF NOT EXISTS status VARCHAR(20) DEFAULT 'published';
+
+UPDATE stories SET status = 'published' WHERE status IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_stories_status_published ON stories(status, published_at DESC);
+CREATE INDEX IF NOT EXISTS idx_user_stories_story ON user_stories(story_id);
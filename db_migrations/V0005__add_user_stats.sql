@@ -0,0 +1,32 @@
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id),
+    stories_count INTEGER DEFAULT 0,
+    comments_count INTEGER DEFAULT 0,
+    views_received INTEGER DEFAULT 0,
+    likes_received INTEGER DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_stories_created_by_published ON stories(created_by, published_at DESC);
+CREATE INDEX IF NOT EXISTS idx_comments_created_by ON comments(created_by);
+
+INSERT INTO user_stats (user_id, stories_count, comments_count, views_received, likes_received)
+SELECT u.id,
+       COALESCE(s.stories_count, 0),
+       COALESCE(c.comments_count, 0),
+       COALESCE(s.views_received, 0),
+       COALESCE(s.likes_received, 0)
+FROM users u
+LEFT JOIN (
+    SELECT created_by, COUNT(*) AS stories_count, SUM(views) AS views_received, SUM(likes) AS likes_received
+    FROM stories
+    WHERE created_by IS NOT NULL
+    GROUP BY created_by
+) s ON s.created_by = u.id
+LEFT JOIN (
+    SELECT created_by, COUNT(*) AS comments_count
+    FROM comments
+    WHERE created_by IS NOT NULL
+    GROUP BY created_by
+) c ON c.created_by = u.id
+ON CONFLICT (user_id) DO NOTHING;
@@ -0,0 +1,18 @@
+CREATE TABLE IF NOT EXISTS author_leaderboard (
+    mode VARCHAR(20) NOT NULL,
+    rank INTEGER NOT NULL,
+    author_id INTEGER NOT NULL REFERENCES authors(id),
+    score DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY (mode, rank)
+);
+
+CREATE TABLE IF NOT EXISTS author_leaderboard_refresh (
+    mode VARCHAR(20) PRIMARY KEY,
+    refreshed_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    authors_count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_author_leaderboard_author ON author_leaderboard(author_id);
+CREATE INDEX IF NOT EXISTS idx_authors_followers ON authors(followers DESC, id);
+CREATE INDEX IF NOT EXISTS idx_likes_created ON likes(created_at);
+CREATE INDEX IF NOT EXISTS idx_comments_created ON comments(created_at);
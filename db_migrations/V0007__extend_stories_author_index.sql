@@ -0,0 +1,5 @@
+CREATE INDEX IF NOT EXISTS idx_stories_author_published
+    ON stories(author_id, published_at DESC, id DESC)
+    WHERE status = 'published';
+
+DROP INDEX IF EXISTS idx_stories_author;
@@ -0,0 +1,16 @@
+CREATE TABLE IF NOT EXISTS story_ratings (
+    story_id INTEGER NOT NULL REFERENCES stories(id),
+    user_id INTEGER NOT NULL,
+    score SMALLINT NOT NULL CHECK (score BETWEEN 1 AND 5),
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (story_id, user_id)
+);
+
+ALTER TABLE stories ADD COLUMN IF NOT EXISTS rating_sum INTEGER DEFAULT 0;
+ALTER TABLE stories ADD COLUMN IF NOT EXISTS rating_count INTEGER DEFAULT 0;
+ALTER TABLE authors ADD COLUMN IF NOT EXISTS rating_sum INTEGER DEFAULT 0;
+ALTER TABLE authors ADD COLUMN IF NOT EXISTS rating_count INTEGER DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS idx_story_ratings_user ON story_ratings(user_id);
+CREATE INDEX IF NOT EXISTS idx_stories_rating ON stories(rating DESC) WHERE status = 'published';
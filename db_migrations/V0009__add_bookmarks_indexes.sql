@@ -0,0 +1,7 @@
+ALTER TABLE user_stories ADD COLUMN IF NOT EXISTS bookmarked_at TIMESTAMP;
+
+UPDATE user_stories SET bookmarked_at = NOW() WHERE is_bookmarked AND bookmarked_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_user_stories_reading_list
+    ON user_stories(user_id, bookmarked_at DESC, story_id DESC)
+    WHERE is_bookmarked;
@@ -0,0 +1,9 @@
+CREATE TABLE IF NOT EXISTS reading_progress (
+    user_id INTEGER NOT NULL,
+    story_id INTEGER NOT NULL REFERENCES stories(id),
+    progress REAL NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, story_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_reading_progress_recent ON reading_progress(user_id, updated_at DESC);
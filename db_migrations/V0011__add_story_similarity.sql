@@ -0,0 +1,17 @@
+CREATE TABLE IF NOT EXISTS story_similar (
+    story_id INTEGER NOT NULL REFERENCES stories(id),
+    rank SMALLINT NOT NULL,
+    similar_story_id INTEGER NOT NULL REFERENCES stories(id),
+    score REAL NOT NULL,
+    PRIMARY KEY (story_id, rank)
+);
+
+CREATE TABLE IF NOT EXISTS similarity_builds (
+    id SERIAL PRIMARY KEY,
+    built_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    stories_rebuilt INTEGER NOT NULL DEFAULT 0,
+    rows_written INTEGER NOT NULL DEFAULT 0,
+    duration_ms INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_story_similar_target ON story_similar(similar_story_id);
@@ -0,0 +1,21 @@
+CREATE TABLE IF NOT EXISTS user_genre_affinity (
+    user_id INTEGER NOT NULL,
+    genre VARCHAR(100) NOT NULL,
+    score REAL NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, genre)
+);
+
+INSERT INTO user_genre_affinity (user_id, genre, score, updated_at)
+SELECT e.user_id, sg.genre, SUM(e.weight), NOW()
+FROM (
+    SELECT user_id, story_id, 3.0 AS weight FROM likes
+    UNION ALL
+    SELECT user_id, story_id, 2.0 AS weight FROM comments
+) e
+JOIN story_genres sg ON sg.story_id = e.story_id
+GROUP BY e.user_id, sg.genre
+ON CONFLICT (user_id, genre) DO NOTHING;
+
+CREATE INDEX IF NOT EXISTS idx_story_genres_genre ON story_genres(genre, story_id);
+CREATE INDEX IF NOT EXISTS idx_likes_user ON likes(user_id, story_id);
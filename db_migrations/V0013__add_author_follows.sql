@@ -0,0 +1,23 @@
+CREATE TABLE IF NOT EXISTS author_follows (
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    author_id INTEGER NOT NULL REFERENCES authors(id),
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, author_id)
+);
+
+CREATE TABLE IF NOT EXISTS following_inbox (
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    story_id INTEGER NOT NULL REFERENCES stories(id),
+    author_id INTEGER NOT NULL REFERENCES authors(id),
+    published_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (user_id, story_id)
+);
+
+ALTER TABLE authors ADD COLUMN IF NOT EXISTS fanout_pull BOOLEAN NOT NULL DEFAULT false;
+
+-- authors.followers keeps its existing counts; follow/unfollow adjust it from here on.
+
+CREATE INDEX IF NOT EXISTS idx_author_follows_author ON author_follows(author_id, user_id);
+CREATE INDEX IF NOT EXISTS idx_following_inbox_feed ON following_inbox(user_id, published_at DESC, story_id DESC);
+CREATE INDEX IF NOT EXISTS idx_following_inbox_author ON following_inbox(user_id, author_id);
+CREATE INDEX IF NOT EXISTS idx_following_inbox_story ON following_inbox(story_id);
@@ -0,0 +1,13 @@
+CREATE OR REPLACE FUNCTION notify_comment_inserted() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('story_comments', NEW.story_id || ':' || NEW.id);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_comments_notify ON comments;
+CREATE TRIGGER trg_comments_notify
+    AFTER INSERT ON comments
+    FOR EACH ROW EXECUTE FUNCTION notify_comment_inserted();
+
+CREATE INDEX IF NOT EXISTS idx_comments_story_id ON comments(story_id, id);
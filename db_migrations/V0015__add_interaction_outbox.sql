@@ -0,0 +1,26 @@
+CREATE TABLE IF NOT EXISTS interaction_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    event_type VARCHAR(20) NOT NULL,
+    story_id INTEGER NOT NULL,
+    user_id INTEGER,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS story_trending (
+    story_id INTEGER PRIMARY KEY REFERENCES stories(id),
+    score REAL NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS notifications (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    story_id INTEGER NOT NULL REFERENCES stories(id),
+    likes INTEGER NOT NULL DEFAULT 0,
+    comments INTEGER NOT NULL DEFAULT 0,
+    is_read BOOLEAN NOT NULL DEFAULT false,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_story_trending_score ON story_trending(score DESC);
+CREATE INDEX IF NOT EXISTS idx_notifications_user ON notifications(user_id, created_at DESC);
@@ -0,0 +1,39 @@
+CREATE TABLE IF NOT EXISTS engagement_hourly (
+    scope VARCHAR(10) NOT NULL,
+    scope_id INTEGER NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    views INTEGER NOT NULL DEFAULT 0,
+    likes INTEGER NOT NULL DEFAULT 0,
+    comments INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, scope_id, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS engagement_daily (
+    scope VARCHAR(10) NOT NULL,
+    scope_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    views INTEGER NOT NULL DEFAULT 0,
+    likes INTEGER NOT NULL DEFAULT 0,
+    comments INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, scope_id, day)
+);
+
+INSERT INTO engagement_daily (scope, scope_id, day, views, likes, comments)
+SELECT scoped.scope, scoped.scope_id, scoped.day, 0, SUM(scoped.likes), SUM(scoped.comments)
+FROM (
+    SELECT e.story_id, s.author_id, e.created_at::date AS day, e.likes, e.comments
+    FROM (
+        SELECT story_id, created_at, 1 AS likes, 0 AS comments FROM likes
+        UNION ALL
+        SELECT story_id, created_at, 0 AS likes, 1 AS comments FROM comments
+    ) e
+    JOIN stories s ON s.id = e.story_id
+) x
+CROSS JOIN LATERAL (
+    VALUES ('story', x.story_id, x.day, x.likes, x.comments),
+           ('author', x.author_id, x.day, x.likes, x.comments),
+           ('site', 0, x.day, x.likes, x.comments)
+) AS scoped(scope, scope_id, day, likes, comments)
+WHERE scoped.scope_id IS NOT NULL
+GROUP BY scoped.scope, scoped.scope_id, scoped.day
+ON CONFLICT (scope, scope_id, day) DO NOTHING;
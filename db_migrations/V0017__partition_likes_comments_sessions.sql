@@ -0,0 +1,87 @@
+-- likes and comments: 16 hash partitions on story_id, so per-story reads and
+-- story deletes touch one partition and vacuum works on 1/16 of the heap.
+-- sessions: daily range partitions on expires_at; expired days are dropped
+-- by scripts/manage_partitions.py instead of being deleted row by row.
+-- The id sequences are kept, so ids continue where the old tables stopped.
+
+ALTER TABLE likes RENAME TO likes_unpartitioned;
+ALTER TABLE comments RENAME TO comments_unpartitioned;
+ALTER TABLE sessions RENAME TO sessions_unpartitioned;
+
+CREATE TABLE likes (
+    id INTEGER NOT NULL DEFAULT nextval('likes_id_seq'),
+    story_id INTEGER NOT NULL REFERENCES stories(id),
+    user_id INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW()
+) PARTITION BY HASH (story_id);
+
+CREATE TABLE comments (
+    id INTEGER NOT NULL DEFAULT nextval('comments_id_seq'),
+    story_id INTEGER NOT NULL REFERENCES stories(id),
+    user_id INTEGER NOT NULL,
+    user_name VARCHAR(255) NOT NULL,
+    text TEXT NOT NULL,
+    likes INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT NOW(),
+    created_by INTEGER REFERENCES users(id)
+) PARTITION BY HASH (story_id);
+
+CREATE TABLE sessions (
+    id INTEGER NOT NULL DEFAULT nextval('sessions_id_seq'),
+    user_id INTEGER REFERENCES users(id),
+    session_token VARCHAR(500) NOT NULL,
+    expires_at TIMESTAMP NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW()
+) PARTITION BY RANGE (expires_at);
+
+DO $$
+BEGIN
+    FOR r IN 0..15 LOOP
+        EXECUTE format('CREATE TABLE likes_p%s PARTITION OF likes FOR VALUES WITH (MODULUS 16, REMAINDER %s)',
+                       lpad(r::text, 2, '0'), r);
+        EXECUTE format('CREATE TABLE comments_p%s PARTITION OF comments FOR VALUES WITH (MODULUS 16, REMAINDER %s)',
+                       lpad(r::text, 2, '0'), r);
+    END LOOP;
+
+    FOR d IN 0..35 LOOP
+        EXECUTE format('CREATE TABLE sessions_p%s PARTITION OF sessions FOR VALUES FROM (%L) TO (%L)',
+                       to_char(CURRENT_DATE + d, 'YYYYMMDD'), CURRENT_DATE + d, CURRENT_DATE + d + 1);
+    END LOOP;
+END $$;
+
+CREATE TABLE sessions_default PARTITION OF sessions DEFAULT;
+
+INSERT INTO likes (id, story_id, user_id, created_at)
+SELECT id, story_id, user_id, created_at FROM likes_unpartitioned WHERE story_id IS NOT NULL;
+
+INSERT INTO comments (id, story_id, user_id, user_name, text, likes, created_at, created_by)
+SELECT id, story_id, user_id, user_name, text, likes, created_at, created_by
+FROM comments_unpartitioned WHERE story_id IS NOT NULL;
+
+INSERT INTO sessions (id, user_id, session_token, expires_at, created_at)
+SELECT id, user_id, session_token, expires_at, created_at
+FROM sessions_unpartitioned WHERE expires_at > NOW();
+
+ALTER SEQUENCE likes_id_seq OWNED BY likes.id;
+ALTER SEQUENCE comments_id_seq OWNED BY comments.id;
+ALTER SEQUENCE sessions_id_seq OWNED BY sessions.id;
+
+DROP TABLE likes_unpartitioned;
+DROP TABLE comments_unpartitioned;
+DROP TABLE sessions_unpartitioned;
+
+ALTER TABLE likes ADD PRIMARY KEY (story_id, id);
+ALTER TABLE likes ADD UNIQUE (story_id, user_id);
+ALTER TABLE comments ADD PRIMARY KEY (story_id, id);
+ALTER TABLE sessions ADD PRIMARY KEY (expires_at, id);
+
+CREATE INDEX IF NOT EXISTS idx_likes_user ON likes(user_id, story_id);
+CREATE INDEX IF NOT EXISTS idx_likes_created ON likes(created_at);
+CREATE INDEX IF NOT EXISTS idx_comments_created ON comments(created_at);
+CREATE INDEX IF NOT EXISTS idx_comments_created_by ON comments(created_by);
+CREATE INDEX IF NOT EXISTS idx_sessions_token ON sessions(session_token);
+CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions(user_id);
+
+CREATE TRIGGER trg_comments_notify
+    AFTER INSERT ON comments
+    FOR EACH ROW EXECUTE FUNCTION notify_comment_inserted();
@@ -0,0 +1,11 @@
+ALTER TABLE stories ADD COLUMN IF NOT EXISTS content_archived BOOLEAN NOT NULL DEFAULT false;
+
+CREATE TABLE IF NOT EXISTS story_content_archive (
+    story_id INTEGER PRIMARY KEY REFERENCES stories(id),
+    codec VARCHAR(10) NOT NULL,
+    content BYTEA NOT NULL,
+    original_bytes INTEGER NOT NULL,
+    archived_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE story_content_archive ALTER COLUMN content SET STORAGE EXTERNAL;
@@ -0,0 +1,24 @@
+CREATE TABLE IF NOT EXISTS feed_snapshots (
+    snapshot_key VARCHAR(300) PRIMARY KEY,
+    content_hash VARCHAR(40) NOT NULL,
+    body BYTEA NOT NULL,
+    raw_bytes INTEGER NOT NULL,
+    built_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    refreshed_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE feed_snapshots ALTER COLUMN body SET STORAGE EXTERNAL;
+
+CREATE OR REPLACE FUNCTION notify_story_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('story_changes', json_build_object(
+        'stories', json_build_array(CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END)
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_stories_changed ON stories;
+CREATE TRIGGER trg_stories_changed
+    AFTER INSERT OR DELETE OR UPDATE OF status, title, description, reading_time, rating, author_id ON stories
+    FOR EACH ROW EXECUTE FUNCTION notify_story_changed();
@@ -0,0 +1,5 @@
+CREATE TABLE IF NOT EXISTS syndication_state (
+    name VARCHAR(50) PRIMARY KEY,
+    high_water_mark TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
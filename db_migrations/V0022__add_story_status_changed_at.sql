@@ -0,0 +1,8 @@
+ALTER TABLE stories ADD COLUMN IF NOT EXISTS status_changed_at TIMESTAMP;
+
+UPDATE stories SET status_changed_at = COALESCE(published_at, NOW()) WHERE status_changed_at IS NULL;
+
+ALTER TABLE stories ALTER COLUMN status_changed_at SET DEFAULT NOW();
+ALTER TABLE stories ALTER COLUMN status_changed_at SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_stories_status_changed ON stories(status_changed_at);
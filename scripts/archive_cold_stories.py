@@ -0,0 +1,200 @@
+'''
+Moves the content of cold stories out of the hot stories heap.
+
+Usage:
+  pip install -r scripts/requirements.txt
+  DATABASE_URL=postgres://... python scripts/archive_cold_stories.py --cold-days 21 --vacuum
+  DATABASE_URL=postgres://... python scripts/archive_cold_stories.py --dry-run
+
+A story is cold when it was published more than --cold-days ago and has had no
+views in engagement_hourly / engagement_daily for that long. Its content is
+compressed (zstd when the zstandard package is installed, zlib otherwise) into
+story_content_archive and the stories row keeps an empty content with
+content_archived = true. backend/stories rehydrates archived bodies on the
+detail endpoints through an in-process LRU.
+
+Prints stories table sizes and list-query latency before and after. Heap space
+freed by the emptied rows becomes reusable after VACUUM (--vacuum); the file
+itself only shrinks with VACUUM FULL.
+'''
+import argparse
+import importlib.util
+import json
+import os
+import time
+import zlib
+from typing import Dict, Any, List
+
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+MIN_ARCHIVE_BYTES = 512
+ZSTD_LEVEL = 19
+ZLIB_LEVEL = 9
+
+COLD_STORIES_SQL = '''
+    SELECT s.id, s.content
+    FROM stories s
+    WHERE NOT s.content_archived
+      AND s.published_at < NOW() - make_interval(days => %(cold_days)s)
+      AND octet_length(s.content) >= %(min_bytes)s
+      AND NOT EXISTS (
+          SELECT 1 FROM engagement_hourly h
+          WHERE h.scope = 'story' AND h.scope_id = s.id AND h.views > 0
+            AND h.bucket > NOW() - make_interval(days => %(cold_days)s)
+      )
+      AND NOT EXISTS (
+          SELECT 1 FROM engagement_daily d
+          WHERE d.scope = 'story' AND d.scope_id = s.id AND d.views > 0
+            AND d.day > CURRENT_DATE - %(cold_days)s
+      )
+    ORDER BY s.id
+    LIMIT %(batch_size)s
+    FOR UPDATE OF s SKIP LOCKED
+'''
+
+ARCHIVE_SQL = '''
+    WITH v(story_id, codec, content, original_bytes) AS (VALUES %s),
+    archived AS (
+        INSERT INTO story_content_archive (story_id, codec, content, original_bytes)
+        SELECT story_id, codec, content, original_bytes FROM v
+        ON CONFLICT (story_id) DO UPDATE
+        SET codec = EXCLUDED.codec, content = EXCLUDED.content,
+            original_bytes = EXCLUDED.original_bytes, archived_at = NOW()
+        RETURNING story_id
+    )
+    UPDATE stories s
+    SET content = '', content_archived = true
+    FROM archived
+    WHERE s.id = archived.story_id
+'''
+
+SIZES_SQL = '''
+    SELECT pg_relation_size('stories') AS heap_bytes,
+           COALESCE(pg_total_relation_size(NULLIF(c.reltoastrelid, 0)), 0) AS toast_bytes,
+           pg_total_relation_size('stories') AS total_bytes,
+           pg_total_relation_size('story_content_archive') AS archive_bytes
+    FROM pg_class c
+    WHERE c.oid = 'stories'::regclass
+'''
+
+
+def load_stories_module() -> Any:
+    spec = importlib.util.spec_from_file_location('function_stories', os.path.join(BACKEND_DIR, 'stories', 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 3) if ordered else 0.0
+
+
+def compress(codec: str, content: str) -> bytes:
+    data = content.encode('utf-8')
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return zlib.compress(data, ZLIB_LEVEL)
+
+
+def table_sizes(conn) -> Dict[str, int]:
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur.execute(SIZES_SQL)
+    sizes = dict(cur.fetchone())
+    cur.close()
+    conn.rollback()
+    return sizes
+
+
+def list_query_latency(conn, module: Any, iterations: int) -> Dict[str, float]:
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        cur.execute(module.PREPARED_STATEMENTS['story_list_latest'])
+        cur.fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    cur.close()
+    conn.rollback()
+    timings.sort()
+    return {'p50Ms': percentile(timings, 0.50), 'p95Ms': percentile(timings, 0.95), 'maxMs': round(timings[-1], 3)}
+
+
+def archive_batch(conn, codec: str, cold_days: int, batch_size: int, dry_run: bool) -> Dict[str, int]:
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur.execute(COLD_STORIES_SQL, {
+        'cold_days': cold_days, 'min_bytes': MIN_ARCHIVE_BYTES, 'batch_size': batch_size
+    })
+    rows = cur.fetchall()
+    values, original, compressed = [], 0, 0
+    for row in rows:
+        data = compress(codec, row['content'])
+        size = len(row['content'].encode('utf-8'))
+        values.append((row['id'], codec, psycopg2.Binary(data), size))
+        original += size
+        compressed += len(data)
+    if values and not dry_run:
+        execute_values(cur, ARCHIVE_SQL, values, page_size=len(values))
+        conn.commit()
+    else:
+        conn.rollback()
+    cur.close()
+    return {'stories': len(rows), 'originalBytes': original, 'compressedBytes': compressed}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Archive content of cold stories')
+    parser.add_argument('--cold-days', type=int, default=21)
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--codec', choices=['zstd', 'zlib'], default='zstd' if zstandard else 'zlib')
+    parser.add_argument('--iterations', type=int, default=20, help='list query runs for the latency report')
+    parser.add_argument('--vacuum', action='store_true', help='VACUUM ANALYZE stories after archiving')
+    parser.add_argument('--dry-run', action='store_true', help='compress one batch and report, without writing')
+    args = parser.parse_args()
+
+    if args.codec == 'zstd' and zstandard is None:
+        parser.error('zstandard is not installed; use --codec zlib')
+
+    module = load_stories_module()
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        before = {'sizes': table_sizes(conn), 'listQuery': list_query_latency(conn, module, args.iterations)}
+
+        totals = {'stories': 0, 'originalBytes': 0, 'compressedBytes': 0}
+        started = time.perf_counter()
+        while True:
+            batch = archive_batch(conn, args.codec, args.cold_days, args.batch_size, args.dry_run)
+            for key in totals:
+                totals[key] += batch[key]
+            if args.dry_run or batch['stories'] < args.batch_size:
+                break
+        archive_seconds = time.perf_counter() - started
+
+        if args.vacuum and not args.dry_run:
+            conn.autocommit = True
+            conn.cursor().execute('VACUUM ANALYZE stories')
+            conn.autocommit = False
+
+        after = {'sizes': table_sizes(conn), 'listQuery': list_query_latency(conn, module, args.iterations)}
+    finally:
+        conn.close()
+
+    print(json.dumps({
+        'codec': args.codec,
+        'dryRun': args.dry_run,
+        'archived': totals,
+        'compressionRatio': round(totals['originalBytes'] / totals['compressedBytes'], 2) if totals['compressedBytes'] else 0.0,
+        'archiveSeconds': round(archive_seconds, 2),
+        'before': before,
+        'after': after
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
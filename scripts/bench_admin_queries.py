@@ -0,0 +1,89 @@
+'''
+Benchmarks the admin stats queries run one by one against the pipelined path.
+
+Usage:
+  pip install -r backend/auth/requirements.txt
+  DATABASE_URL=postgres://... python scripts/bench_admin_queries.py --requests 500
+
+Runs ADMIN_STATS_QUERIES from backend/auth in two ways and reports latency per
+request:
+  - sequential: each query sent on the psycopg2 connection and read back before
+    the next one is sent (one network round trip per query)
+  - pipelined: the handler's fetch_all_concurrently, which sends them all over
+    its psycopg3 connection in one pipeline
+The gap grows with the round-trip time to the database, so run it from where
+the functions run. Only SELECTs are issued.
+'''
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+from typing import Dict, Any, List
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+
+
+def load_auth_module() -> Any:
+    spec = importlib.util.spec_from_file_location('function_auth', os.path.join(BACKEND_DIR, 'auth', 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 3) if ordered else 0.0
+
+
+def latency(timings: List[float]) -> Dict[str, float]:
+    timings.sort()
+    return {'p50Ms': percentile(timings, 0.50), 'p95Ms': percentile(timings, 0.95), 'meanMs': round(sum(timings) / len(timings), 3)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark sequential vs pipelined admin queries')
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    module = load_auth_module()
+    if module.psycopg is None:
+        sys.exit('psycopg (v3) is not installed; fetch_all_concurrently would fall back to sequential queries')
+    queries = module.ADMIN_STATS_QUERIES
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn.autocommit = True
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        module.fetch_all_concurrently(cur, queries)
+        sequential, pipelined = [], []
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            for sql, query_params in queries:
+                cur.execute(sql, query_params)
+                cur.fetchall()
+            sequential.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            module.fetch_all_concurrently(cur, queries)
+            pipelined.append((time.perf_counter() - started) * 1000)
+    finally:
+        cur.close()
+        conn.close()
+        module.close_async_connection()
+
+    report = {
+        'requests': args.requests,
+        'queriesPerRequest': len(queries),
+        'sequential': latency(sequential),
+        'pipelined': latency(pipelined)
+    }
+    report['speedup'] = round(report['sequential']['meanMs'] / report['pipelined']['meanMs'], 2) if report['pipelined']['meanMs'] else None
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+'''
+Benchmarks the "following" feed for a reader who follows thousands of authors.
+
+Usage:
+  DATABASE_URL=postgres://... python scripts/bench_following_feed.py --authors 5000 --popular 50
+
+Seeds a throwaway user, authors, follows, stories and inbox rows inside one
+transaction, times the following_feed statement from backend/authors for the first
+page and a few deeper pages, then rolls everything back.
+'''
+import argparse
+import importlib.util
+import json
+import os
+import time
+from typing import Dict, Any, List
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+
+
+def load_authors_module() -> Any:
+    spec = importlib.util.spec_from_file_location('function_authors', os.path.join(BACKEND_DIR, 'authors', 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 3) if ordered else 0.0
+
+
+def seed(cur, authors: int, popular: int, stories_per_author: int) -> int:
+    cur.execute('''
+        INSERT INTO users (email, password_hash, username)
+        VALUES ('bench-following@example.invalid', '-', 'bench-following')
+        RETURNING id
+    ''')
+    user_id = cur.fetchone()['id']
+
+    cur.execute('''
+        INSERT INTO authors (name, avatar, bio, rating, stories_count, followers, fanout_pull)
+        SELECT 'bench author ' || n, '', '', 0, %s, 0, n <= %s
+        FROM generate_series(1, %s) n
+        RETURNING id, fanout_pull
+    ''', (stories_per_author, popular, authors))
+    author_rows = cur.fetchall()
+    author_ids = [row['id'] for row in author_rows]
+
+    cur.execute('''
+        INSERT INTO author_follows (user_id, author_id)
+        SELECT %s, unnest(%s::int[])
+    ''', (user_id, author_ids))
+    cur.execute('UPDATE authors SET followers = followers + 1 WHERE id = ANY(%s)', (author_ids,))
+
+    cur.execute('''
+        INSERT INTO stories (title, description, content, author_id, reading_time, published_at, status)
+        SELECT 'bench story', '', '', a.id, 5,
+               NOW() - (random() * INTERVAL '90 days'), 'published'
+        FROM unnest(%s::int[]) a(id), generate_series(1, %s)
+    ''', (author_ids, stories_per_author))
+
+    cur.execute('''
+        INSERT INTO following_inbox (user_id, story_id, author_id, published_at)
+        SELECT %s, s.id, s.author_id, s.published_at
+        FROM stories s
+        JOIN authors a ON a.id = s.author_id AND NOT a.fanout_pull
+        WHERE s.author_id = ANY(%s)
+    ''', (user_id, author_ids))
+    cur.execute('ANALYZE author_follows')
+    cur.execute('ANALYZE following_inbox')
+    return user_id
+
+
+def run(cur, module: Any, user_id: int, iterations: int, pages: int) -> Dict[str, Any]:
+    cur.execute(f"PREPARE following_feed AS {module.PREPARED_STATEMENTS['following_feed']}")
+    report = {}
+    cursor_published_at, cursor_id = None, None
+    for page in range(1, pages + 1):
+        timings = []
+        rows = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            cur.execute('EXECUTE following_feed (%s, %s, %s, %s)',
+                        (user_id, cursor_published_at, cursor_id, module.FOLLOWING_FEED_SIZE + 1))
+            rows = cur.fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        report[f'page{page}'] = {
+            'rows': len(rows),
+            'p50Ms': percentile(timings, 0.50),
+            'p95Ms': percentile(timings, 0.95),
+            'maxMs': round(timings[-1], 3)
+        }
+        if len(rows) <= module.FOLLOWING_FEED_SIZE:
+            break
+        last = rows[module.FOLLOWING_FEED_SIZE - 1]
+        cursor_published_at, cursor_id = last['publishedAt'], last['id']
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the following feed')
+    parser.add_argument('--authors', type=int, default=5000, help='authors the reader follows')
+    parser.add_argument('--popular', type=int, default=50, help='how many of them are read with pull')
+    parser.add_argument('--stories-per-author', type=int, default=20)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--pages', type=int, default=5)
+    args = parser.parse_args()
+
+    module = load_authors_module()
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        started = time.perf_counter()
+        user_id = seed(cur, args.authors, args.popular, args.stories_per_author)
+        seed_seconds = time.perf_counter() - started
+        report = run(cur, module, user_id, args.iterations, args.pages)
+    finally:
+        conn.rollback()
+        cur.close()
+        conn.close()
+
+    print(json.dumps({
+        'authors': args.authors,
+        'popularAuthors': args.popular,
+        'storiesPerAuthor': args.stories_per_author,
+        'seedSeconds': round(seed_seconds, 2),
+        'pages': report
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+'''
+Measures the overhead of Idempotency-Key handling in backend/interactions.
+
+Usage:
+  DATABASE_URL=postgres://... python scripts/bench_idempotency.py --requests 5000
+
+Runs the handler's own helpers against idempotency_keys inside one transaction
+that is rolled back at the end, and reports latency for:
+  - first request: claiming a new key and storing the response (the two extra
+    statements a keyed write pays inside its transaction)
+  - database replay: a retried key found in idempotency_keys
+  - front-cache replay: a retried key answered from the in-process cache,
+    with no database work at all
+'''
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import time
+import uuid
+from typing import Dict, Any, List
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+BENCH_SCOPE = 'bench'
+
+
+def load_interactions_module() -> Any:
+    spec = importlib.util.spec_from_file_location('function_interactions', os.path.join(BACKEND_DIR, 'interactions', 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 4) if ordered else 0.0
+
+
+def latency(timings: List[float]) -> Dict[str, float]:
+    timings.sort()
+    return {'p50Ms': percentile(timings, 0.50), 'p95Ms': percentile(timings, 0.95), 'maxMs': round(timings[-1], 4)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark Idempotency-Key lookups')
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    module = load_interactions_module()
+    body = {'success': True, 'storyId': 1, 'likes': 42, 'liked': True, 'message': 'Story liked successfully'}
+    requests = []
+    for _ in range(args.requests):
+        raw = json.dumps({'storyId': 1, 'action': 'like', 'nonce': uuid.uuid4().hex})
+        requests.append({'scope': BENCH_SCOPE, 'key': str(uuid.uuid4()), 'hash': hashlib.sha1(raw.encode('utf-8')).digest()})
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    report: Dict[str, Any] = {'requests': args.requests}
+    try:
+        timings = []
+        for idempotency in requests:
+            started = time.perf_counter()
+            module.claim_idempotency_key(cur, idempotency)
+            module.save_idempotent_response(cur, idempotency, 200, body)
+            timings.append((time.perf_counter() - started) * 1000)
+        report['firstRequest'] = latency(timings)
+
+        timings, replayed = [], 0
+        for idempotency in requests:
+            started = time.perf_counter()
+            response = module.claim_idempotency_key(cur, idempotency)
+            timings.append((time.perf_counter() - started) * 1000)
+            replayed += bool(response and response['statusCode'] == 200)
+        report['databaseReplay'] = latency(timings)
+        report['databaseReplayed'] = replayed
+
+        for idempotency in requests:
+            module._idempotency_cache[module.idempotency_cache_key(idempotency)] = (
+                time.monotonic() + module.IDEMPOTENCY_CACHE_TTL, idempotency['hash'], 200, json.dumps(body)
+            )
+        timings = []
+        for idempotency in requests:
+            started = time.perf_counter()
+            module.cached_idempotent_response(idempotency)
+            timings.append((time.perf_counter() - started) * 1000)
+        report['frontCacheReplay'] = latency(timings)
+    finally:
+        conn.rollback()
+        cur.close()
+        conn.close()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
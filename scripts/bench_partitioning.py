@@ -0,0 +1,204 @@
+'''
+Compares the unpartitioned and partitioned layouts from V0017.
+
+Usage:
+  DATABASE_URL=postgres://... python scripts/bench_partitioning.py --likes 1000000 --sessions 300000
+
+Builds both layouts side by side in scratch schemas inside one transaction and
+measures, for each:
+  - insert throughput: batched likes inserts and single-row session inserts
+  - lookup latency: likes of one story, a session by token (prepared, as in backend/auth),
+    both with the expiry-day bounds the handlers take from the token and with
+    open bounds (tokens issued before the day suffix, which probe every partition)
+  - cleanup cost: removing every expired session
+then rolls everything back.
+'''
+import argparse
+import json
+import os
+import random
+import secrets
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Tuple
+
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
+
+HASH_PARTITIONS = 16
+SESSION_TTL_DAYS = 30
+EXPIRED_DAYS = 10
+INSERT_BATCH = 1000
+ANY_EXPIRY = (datetime(1970, 1, 1), datetime(9999, 1, 1))
+
+LAYOUTS = {
+    'plain': '''
+        CREATE TABLE {schema}.likes (
+            id SERIAL PRIMARY KEY,
+            story_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT NOW(),
+            UNIQUE (story_id, user_id)
+        );
+        CREATE INDEX ON {schema}.likes(story_id);
+        CREATE TABLE {schema}.sessions (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER,
+            session_token VARCHAR(500) UNIQUE NOT NULL,
+            expires_at TIMESTAMP NOT NULL,
+            created_at TIMESTAMP DEFAULT NOW()
+        );
+    ''',
+    'partitioned': '''
+        CREATE TABLE {schema}.likes (
+            id SERIAL,
+            story_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (story_id, id),
+            UNIQUE (story_id, user_id)
+        ) PARTITION BY HASH (story_id);
+        CREATE TABLE {schema}.sessions (
+            id SERIAL,
+            user_id INTEGER,
+            session_token VARCHAR(500) NOT NULL,
+            expires_at TIMESTAMP NOT NULL,
+            created_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (expires_at, id)
+        ) PARTITION BY RANGE (expires_at);
+    '''
+}
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 3) if ordered else 0.0
+
+
+def latency(timings: List[float]) -> Dict[str, float]:
+    timings.sort()
+    return {'p50Ms': percentile(timings, 0.50), 'p95Ms': percentile(timings, 0.95), 'maxMs': round(timings[-1], 3)}
+
+
+def create_layout(cur, schema: str, layout: str) -> None:
+    cur.execute(f'CREATE SCHEMA {schema}')
+    cur.execute(LAYOUTS[layout].format(schema=schema))
+    if layout == 'partitioned':
+        for r in range(HASH_PARTITIONS):
+            cur.execute(f'CREATE TABLE {schema}.likes_p{r:02d} PARTITION OF {schema}.likes '
+                        f'FOR VALUES WITH (MODULUS {HASH_PARTITIONS}, REMAINDER {r})')
+        cur.execute('SELECT CURRENT_DATE AS today')
+        today = cur.fetchone()['today']
+        for offset in range(-EXPIRED_DAYS, SESSION_TTL_DAYS + 1):
+            day = today + timedelta(days=offset)
+            cur.execute(f"CREATE TABLE {schema}.sessions_p{day.strftime('%Y%m%d')} PARTITION OF {schema}.sessions "
+                        f'FOR VALUES FROM (%s) TO (%s)', (day, day + timedelta(days=1)))
+        cur.execute(f'CREATE TABLE {schema}.sessions_default PARTITION OF {schema}.sessions DEFAULT')
+        cur.execute(f'CREATE INDEX ON {schema}.sessions(session_token)')
+    cur.execute(f'CREATE INDEX ON {schema}.likes(user_id, story_id)')
+    cur.execute(f'CREATE INDEX ON {schema}.sessions(user_id)')
+
+
+def expiry_day_bounds(expires_at: datetime) -> Tuple[datetime, datetime]:
+    start = datetime(expires_at.year, expires_at.month, expires_at.day)
+    return start, start + timedelta(days=1)
+
+def bench_layout(cur, schema: str, layout: str, likes: List[tuple], sessions: List[tuple],
+                 stories: int, lookups: int) -> Dict[str, Any]:
+    create_layout(cur, schema, layout)
+    report: Dict[str, Any] = {}
+
+    started = time.perf_counter()
+    for i in range(0, len(likes), INSERT_BATCH):
+        execute_values(cur, f'INSERT INTO {schema}.likes (story_id, user_id) VALUES %s',
+                       likes[i:i + INSERT_BATCH], page_size=INSERT_BATCH)
+    elapsed = time.perf_counter() - started
+    report['likesInsertRps'] = round(len(likes) / elapsed, 1)
+
+    started = time.perf_counter()
+    for row in sessions:
+        cur.execute(f'INSERT INTO {schema}.sessions (user_id, session_token, expires_at) VALUES (%s, %s, %s)', row)
+    elapsed = time.perf_counter() - started
+    report['sessionsInsertRps'] = round(len(sessions) / elapsed, 1)
+
+    cur.execute(f'ANALYZE {schema}.likes')
+    cur.execute(f'ANALYZE {schema}.sessions')
+
+    cur.execute(f'PREPARE {schema}_story_likes AS SELECT COUNT(*) AS count FROM {schema}.likes WHERE story_id = $1')
+    timings = []
+    for _ in range(lookups):
+        started = time.perf_counter()
+        cur.execute(f'EXECUTE {schema}_story_likes (%s)', (random.randint(1, stories),))
+        cur.fetchone()
+        timings.append((time.perf_counter() - started) * 1000)
+    report['storyLikesLookup'] = latency(timings)
+
+    cur.execute(f'''
+        PREPARE {schema}_session AS
+        SELECT user_id FROM {schema}.sessions
+        WHERE session_token = $1 AND expires_at > NOW() AND expires_at >= $2 AND expires_at < $3
+    ''')
+    live = [row for row in sessions if row[2] > datetime.now()]
+    for label, bounds in (('sessionLookup', expiry_day_bounds), ('sessionLookupAllPartitions', lambda _: ANY_EXPIRY)):
+        timings = []
+        for _ in range(lookups):
+            _, token, expires_at = random.choice(live)
+            started = time.perf_counter()
+            cur.execute(f'EXECUTE {schema}_session (%s, %s, %s)', (token, *bounds(expires_at)))
+            cur.fetchone()
+            timings.append((time.perf_counter() - started) * 1000)
+        report[label] = latency(timings)
+
+    started = time.perf_counter()
+    if layout == 'partitioned':
+        cur.execute('SELECT CURRENT_DATE AS today')
+        today = cur.fetchone()['today']
+        for offset in range(-EXPIRED_DAYS, 0):
+            cur.execute(f"DROP TABLE {schema}.sessions_p{(today + timedelta(days=offset)).strftime('%Y%m%d')}")
+    cur.execute(f'DELETE FROM {schema}.sessions WHERE expires_at < NOW()')
+    report['expiredCleanupMs'] = round((time.perf_counter() - started) * 1000, 3)
+
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark partitioned likes and sessions')
+    parser.add_argument('--likes', type=int, default=1000000)
+    parser.add_argument('--stories', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--sessions', type=int, default=100000)
+    parser.add_argument('--lookups', type=int, default=2000)
+    args = parser.parse_args()
+
+    random.seed(42)
+    pairs = set()
+    while len(pairs) < args.likes:
+        pairs.add((random.randint(1, args.stories), random.randint(1, args.users)))
+    likes = list(pairs)
+    now = datetime.now()
+    sessions = [
+        (random.randint(1, args.users), f"{secrets.token_urlsafe(32)}.{expires_at.strftime('%Y%m%d')}", expires_at)
+        for expires_at in (now + timedelta(seconds=random.uniform(-EXPIRED_DAYS, SESSION_TTL_DAYS) * 86400)
+                           for _ in range(args.sessions))
+    ]
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    report = {}
+    try:
+        for layout in ('plain', 'partitioned'):
+            report[layout] = bench_layout(cur, f'bench_{layout}', layout, likes, sessions, args.stories, args.lookups)
+    finally:
+        conn.rollback()
+        cur.close()
+        conn.close()
+
+    print(json.dumps({
+        'likes': args.likes,
+        'sessions': args.sessions,
+        'expiredSessionShare': round(EXPIRED_DAYS / (EXPIRED_DAYS + SESSION_TTL_DAYS), 2),
+        'layouts': report
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+'''
+Compares prepared and unprepared execution of the hot read statements.
+
+Usage:
+  DATABASE_URL=postgres://... python scripts/bench_prepared_statements.py --story-id 1 --author-id 1 --user-id 1
+
+Each statement is taken verbatim from a function's PREPARED_STATEMENTS and run
+--iterations times on one connection in two ways:
+  - prepared: PREPARE once, then EXECUTE (what execute_prepared does on a warm
+    connection); the one-off PREPARE cost is reported separately
+  - unprepared: the same SQL sent as a plain parameterised query, parsed and
+    planned by the server on every call
+For the unprepared form the server-side planning time is also reported, taken
+from EXPLAIN (SUMMARY) on the same query. Everything runs in one transaction
+that is rolled back.
+'''
+import argparse
+import importlib.util
+import json
+import os
+import re
+import time
+from datetime import datetime
+from typing import Dict, Any, List
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+PLAN_SAMPLES = 20
+
+BENCH_STATEMENTS = [
+    ('stories', 'story_detail', lambda a: (a.story_id,)),
+    ('stories', 'feed_snapshot', lambda a: ('stories:rating', 600)),
+    ('interactions', 'comments_by_story', lambda a: (a.story_id,)),
+    ('interactions', 'progress_for_story', lambda a: (a.user_id, a.story_id)),
+    ('authors', 'author_page', lambda a: (a.author_id, None, None, 21)),
+    ('authors', 'following_feed', lambda a: (a.user_id, None, None, 21)),
+    ('auth', 'session_user', lambda a: ('bench-missing-session', datetime(1970, 1, 1), datetime(9999, 1, 1))),
+]
+
+
+def load_module(name: str) -> Any:
+    spec = importlib.util.spec_from_file_location(
+        f'function_{name.replace("-", "_")}', os.path.join(BACKEND_DIR, name, 'index.py')
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 4) if ordered else 0.0
+
+
+def latency(timings: List[float]) -> Dict[str, float]:
+    timings.sort()
+    return {'p50Ms': percentile(timings, 0.50), 'p95Ms': percentile(timings, 0.95), 'meanMs': round(sum(timings) / len(timings), 4)}
+
+
+def unprepared_sql(sql: str) -> str:
+    return re.sub(r'\$(\d+)', r'%(p\1)s', sql.replace('%', '%%'))
+
+
+def bench_statement(cur, label: str, sql: str, params: tuple, iterations: int) -> Dict[str, Any]:
+    named = {f'p{i}': value for i, value in enumerate(params, 1)}
+    plain = unprepared_sql(sql)
+
+    started = time.perf_counter()
+    cur.execute(f'PREPARE {label} AS {sql}')
+    prepare_ms = (time.perf_counter() - started) * 1000
+    execute = f"EXECUTE {label} ({', '.join(['%s'] * len(params))})" if params else f'EXECUTE {label}'
+
+    prepared, unprepared = [], []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        cur.execute(execute, params)
+        cur.fetchall()
+        prepared.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        cur.execute(plain, named)
+        cur.fetchall()
+        unprepared.append((time.perf_counter() - started) * 1000)
+
+    planning = []
+    for _ in range(PLAN_SAMPLES):
+        cur.execute(f'EXPLAIN (SUMMARY) {plain}', named)
+        for row in cur.fetchall():
+            line = row['QUERY PLAN']
+            if line.startswith('Planning Time:'):
+                planning.append(float(line.split(':', 1)[1].split()[0]))
+    cur.execute(f'DEALLOCATE {label}')
+
+    prepared_stats, unprepared_stats = latency(prepared), latency(unprepared)
+    return {
+        'prepareMs': round(prepare_ms, 4),
+        'prepared': prepared_stats,
+        'unprepared': unprepared_stats,
+        'unpreparedPlanningMs': latency(planning) if planning else None,
+        'savedPerCallMs': round(unprepared_stats['meanMs'] - prepared_stats['meanMs'], 4)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark prepared vs unprepared statements')
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--story-id', type=int, default=1)
+    parser.add_argument('--author-id', type=int, default=1)
+    parser.add_argument('--user-id', type=int, default=1)
+    args = parser.parse_args()
+
+    modules = {name: load_module(name) for name in sorted({function for function, _, _ in BENCH_STATEMENTS})}
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    report: Dict[str, Any] = {'iterations': args.iterations}
+    try:
+        for function, name, build_params in BENCH_STATEMENTS:
+            sql = modules[function].PREPARED_STATEMENTS[name]
+            label = f'bench_{function.replace("-", "_")}_{name}'
+            report[f'{function}.{name}'] = bench_statement(cur, label, sql, build_params(args), args.iterations)
+    finally:
+        conn.rollback()
+        cur.close()
+        conn.close()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
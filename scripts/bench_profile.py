@@ -0,0 +1,140 @@
+'''
+Benchmarks the profile endpoint for a user who owns thousands of stories.
+
+Usage:
+  DATABASE_URL=postgres://... python scripts/bench_profile.py --stories 5000 --comments 20000
+
+Seeds a throwaway user with stories, comments and a user_stats row inside one
+transaction and times two ways of building the profile:
+  - counters: PROFILE_QUERY from backend/auth (user_stats plus the ten latest
+    stories in one statement)
+  - aggregates: the previous three statements, COUNT(*) over the user's stories
+    and comments plus the recent-stories query
+then rolls everything back. Run it at a few --stories sizes: the counters path
+should stay flat while the aggregates grow with the row counts.
+'''
+import argparse
+import importlib.util
+import json
+import os
+import time
+from typing import Dict, Any, List
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+
+AGGREGATE_QUERIES = [
+    'SELECT COUNT(*) as count FROM stories WHERE created_by = %(user_id)s',
+    '''
+        SELECT s.id, s.title, s.rating, s.views, s.likes, s.published_at::text as published_at
+        FROM stories s
+        WHERE s.created_by = %(user_id)s
+        ORDER BY s.published_at DESC
+        LIMIT 10
+    ''',
+    'SELECT COUNT(*) as count FROM comments WHERE created_by = %(user_id)s'
+]
+
+
+def load_auth_module() -> Any:
+    spec = importlib.util.spec_from_file_location('function_auth', os.path.join(BACKEND_DIR, 'auth', 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 3) if ordered else 0.0
+
+
+def latency(timings: List[float]) -> Dict[str, float]:
+    timings.sort()
+    return {'p50Ms': percentile(timings, 0.50), 'p95Ms': percentile(timings, 0.95), 'maxMs': round(timings[-1], 3)}
+
+
+def seed(cur, stories: int, comments: int) -> int:
+    cur.execute('''
+        INSERT INTO users (email, password_hash, username)
+        VALUES ('bench-profile@example.invalid', '-', 'bench-profile')
+        RETURNING id
+    ''')
+    user_id = cur.fetchone()['id']
+    cur.execute('''
+        INSERT INTO authors (name, avatar, bio, rating, stories_count, followers)
+        VALUES ('bench profile author', '', '', 0, %s, 0)
+        RETURNING id
+    ''', (stories,))
+    author_id = cur.fetchone()['id']
+
+    cur.execute('''
+        INSERT INTO stories (title, description, content, author_id, reading_time, published_at, status, created_by)
+        SELECT 'bench story ' || n, '', '', %s, 5, NOW() - (random() * INTERVAL '365 days'), 'published', %s
+        FROM generate_series(1, %s) n
+        RETURNING id
+    ''', (author_id, user_id, stories))
+    story_ids = [row['id'] for row in cur.fetchall()]
+
+    cur.execute('''
+        INSERT INTO comments (story_id, user_id, user_name, text, created_by)
+        SELECT (%s::int[])[1 + (n %% array_length(%s::int[], 1))], %s, 'bench-profile', 'bench comment', %s
+        FROM generate_series(1, %s) n
+    ''', (story_ids, story_ids, user_id, user_id, comments))
+
+    cur.execute('''
+        INSERT INTO user_stats (user_id, stories_count, comments_count)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (user_id) DO UPDATE
+        SET stories_count = EXCLUDED.stories_count, comments_count = EXCLUDED.comments_count
+    ''', (user_id, stories, comments))
+    cur.execute('ANALYZE stories')
+    cur.execute('ANALYZE comments')
+    return user_id
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the profile endpoint')
+    parser.add_argument('--stories', type=int, default=5000, help='stories owned by the profile user')
+    parser.add_argument('--comments', type=int, default=20000, help='comments written by the profile user')
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    module = load_auth_module()
+    profile_sql = module.PROFILE_QUERY.format(profile_filter='u.id = %s')
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        started = time.perf_counter()
+        user_id = seed(cur, args.stories, args.comments)
+        seed_seconds = time.perf_counter() - started
+
+        counters, aggregates = [], []
+        for _ in range(args.iterations):
+            started = time.perf_counter()
+            cur.execute(profile_sql, (user_id,))
+            profile = cur.fetchone()
+            counters.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            for sql in AGGREGATE_QUERIES:
+                cur.execute(sql, {'user_id': user_id})
+                cur.fetchall()
+            aggregates.append((time.perf_counter() - started) * 1000)
+    finally:
+        conn.rollback()
+        cur.close()
+        conn.close()
+
+    print(json.dumps({
+        'stories': args.stories,
+        'comments': args.comments,
+        'seedSeconds': round(seed_seconds, 2),
+        'profileStories': profile['stories_count'],
+        'counters': latency(counters),
+        'aggregates': latency(aggregates)
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
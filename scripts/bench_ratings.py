@@ -0,0 +1,150 @@
+'''
+Benchmarks rating throughput when many readers rate one popular story at once.
+
+Usage:
+  DATABASE_URL=postgres://... python scripts/bench_ratings.py --users 200 --workers 32 --seconds 20
+
+Creates a throwaway author and story, then runs --workers threads, each with its
+own connection and its own copy of backend/interactions, calling apply_rating
+in a committed transaction per rating for random users out of --users and a
+random score. Every rating takes the per-(story, user) advisory lock and
+updates the same story and author rows, which is where a popular story
+contends. Reports ratings/s, latency, how many ratings changed the score and
+the final counters, then deletes the story, its ratings and the author.
+The HTTP path cannot measure this from one host: the per-IP and per-user rate
+limits reject almost every request first.
+'''
+import argparse
+import importlib.util
+import json
+import os
+import random
+import threading
+import time
+from typing import Dict, Any, List
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+BENCH_USER_BASE = 2000000000
+
+
+def load_interactions_module() -> Any:
+    spec = importlib.util.spec_from_file_location('function_interactions', os.path.join(BACKEND_DIR, 'interactions', 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 3) if ordered else 0.0
+
+
+def latency(timings: List[float]) -> Dict[str, float]:
+    timings.sort()
+    return {'p50Ms': percentile(timings, 0.50), 'p95Ms': percentile(timings, 0.95), 'p99Ms': percentile(timings, 0.99),
+            'maxMs': round(timings[-1], 3) if timings else 0.0}
+
+
+def seed(cur) -> Dict[str, int]:
+    cur.execute('''
+        INSERT INTO authors (name, avatar, bio, rating, stories_count, followers)
+        VALUES ('bench ratings author', '', '', 0, 1, 0)
+        RETURNING id
+    ''')
+    author_id = cur.fetchone()['id']
+    cur.execute('''
+        INSERT INTO stories (title, description, content, author_id, reading_time, published_at, status)
+        VALUES ('bench ratings story', '', '', %s, 5, NOW(), 'draft')
+        RETURNING id
+    ''', (author_id,))
+    return {'author_id': author_id, 'story_id': cur.fetchone()['id']}
+
+
+def cleanup(cur, ids: Dict[str, int]) -> None:
+    cur.execute('DELETE FROM story_ratings WHERE story_id = %s', (ids['story_id'],))
+    cur.execute('DELETE FROM stories WHERE id = %s', (ids['story_id'],))
+    cur.execute('DELETE FROM authors WHERE id = %s', (ids['author_id'],))
+
+
+def worker(story_id: int, users: int, deadline: float, results: Dict[str, Any], lock: threading.Lock) -> None:
+    module = load_interactions_module()
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    timings, changed, errors = [], 0, 0
+    try:
+        while time.monotonic() < deadline:
+            user_id = BENCH_USER_BASE + random.randrange(users)
+            started = time.perf_counter()
+            try:
+                result = module.apply_rating(cur, story_id, user_id, random.randint(1, 5))
+                conn.commit()
+            except psycopg2.Error:
+                conn.rollback()
+                errors += 1
+                continue
+            timings.append((time.perf_counter() - started) * 1000)
+            changed += result['changed']
+    finally:
+        cur.close()
+        conn.close()
+    with lock:
+        results['timings'].extend(timings)
+        results['changed'] += changed
+        results['errors'] += errors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark concurrent ratings on one story')
+    parser.add_argument('--users', type=int, default=200, help='distinct readers rating the story')
+    parser.add_argument('--workers', type=int, default=32, help='concurrent connections')
+    parser.add_argument('--seconds', type=float, default=20.0)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn.autocommit = True
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    ids = seed(cur)
+    results: Dict[str, Any] = {'timings': [], 'changed': 0, 'errors': 0}
+    try:
+        lock = threading.Lock()
+        started = time.monotonic()
+        deadline = started + args.seconds
+        threads = [
+            threading.Thread(target=worker, args=(ids['story_id'], args.users, deadline, results, lock))
+            for _ in range(args.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        cur.execute('SELECT rating, rating_sum, rating_count FROM stories WHERE id = %s', (ids['story_id'],))
+        story = cur.fetchone()
+        cur.execute('SELECT COUNT(*) AS count, COALESCE(SUM(score), 0) AS total FROM story_ratings WHERE story_id = %s',
+                    (ids['story_id'],))
+        ratings = cur.fetchone()
+    finally:
+        cleanup(cur, ids)
+        cur.close()
+        conn.close()
+
+    timings = results['timings']
+    print(json.dumps({
+        'users': args.users,
+        'workers': args.workers,
+        'seconds': round(elapsed, 2),
+        'ratings': len(timings),
+        'ratingsPerSecond': round(len(timings) / elapsed, 1) if elapsed else 0.0,
+        'changed': results['changed'],
+        'errors': results['errors'],
+        'latency': latency(timings),
+        'story': {'rating': float(story['rating'] or 0), 'ratingCount': story['rating_count'], 'ratingSum': story['rating_sum']},
+        'countersMatch': story['rating_count'] == ratings['count'] and story['rating_sum'] == ratings['total']
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+'''
+Builds the "more like this" index stored in story_similar.
+
+Usage:
+  DATABASE_URL=postgres://... python scripts/build_similar_stories.py            # incremental
+  DATABASE_URL=postgres://... python scripts/build_similar_stories.py --full     # rewrite every story
+  python scripts/build_similar_stories.py --synthetic 100000                     # timing only, no database
+
+Similarity between two stories is
+  GENRE_WEIGHT * cosine(genre vectors) + CO_LIKE_WEIGHT * cosine(like vectors)
+plus a small popularity prior that breaks ties between stories sharing the same genres.
+Only stories that share a liker or rank among the best genre-only matches are scored, so
+the build is close to linear in the number of stories rather than quadratic.
+
+An incremental run rewrites neighbours only for stories published or liked since the
+previous build (watermark in similarity_builds), plus stories that had one of those
+as a neighbour.
+'''
+import argparse
+import os
+import time
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+TOP_K = 12
+BLOCK_SIZE = 512
+GENRE_WEIGHT = 0.6
+CO_LIKE_WEIGHT = 0.4
+POPULARITY_WEIGHT = 0.01
+MAX_LIKES_PER_USER = 500
+
+
+def normalize_rows(matrix: sp.csr_matrix) -> sp.csr_matrix:
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sp.diags(1.0 / norms).dot(matrix).tocsr().astype(np.float32)
+
+
+def build_matrices(story_ids: np.ndarray, genre_pairs: List[Tuple[int, str]],
+                   like_pairs: List[Tuple[int, int]]) -> Tuple[np.ndarray, sp.csr_matrix, np.ndarray]:
+    row_of = {int(story_id): i for i, story_id in enumerate(story_ids)}
+    n = len(story_ids)
+
+    genre_index: Dict[str, int] = {}
+    g_rows, g_cols = [], []
+    for story_id, genre in genre_pairs:
+        if story_id in row_of:
+            g_rows.append(row_of[story_id])
+            g_cols.append(genre_index.setdefault(genre, len(genre_index)))
+    genres = sp.csr_matrix((np.ones(len(g_rows), dtype=np.float32), (g_rows, g_cols)),
+                           shape=(n, max(len(genre_index), 1)))
+    genres_dense = normalize_rows(genres).toarray()
+
+    user_index: Dict[int, int] = {}
+    l_rows, l_cols = [], []
+    for story_id, user_id in like_pairs:
+        if story_id in row_of:
+            l_rows.append(row_of[story_id])
+            l_cols.append(user_index.setdefault(user_id, len(user_index)))
+    likes = sp.csr_matrix((np.ones(len(l_rows), dtype=np.float32), (l_rows, l_cols)),
+                          shape=(n, max(len(user_index), 1)))
+    popularity = np.log1p(np.asarray(likes.sum(axis=1)).ravel()).astype(np.float32)
+    if popularity.max() > 0:
+        popularity /= popularity.max()
+
+    # Users who liked a large share of the catalogue say little about similarity but would
+    # make the co-like product quadratic in their like count, so they are left out of it.
+    likes_per_user = np.asarray(likes.sum(axis=0)).ravel()
+    likes = likes[:, np.flatnonzero(likes_per_user <= MAX_LIKES_PER_USER)]
+
+    return genres_dense, normalize_rows(likes), popularity
+
+
+def genre_candidates(sig_of_row: np.ndarray, sig_sim: np.ndarray, popularity: np.ndarray,
+                     top_k: int) -> List[np.ndarray]:
+    # Without co-likes a story's score is sig_sim[a, b] + popularity, so the best genre-only
+    # neighbours of any story with signature a are among the most popular top_k + 1 stories
+    # of each signature b. Scoring that pool once per signature is exact and O(signatures^2).
+    n_sigs = sig_sim.shape[0]
+    order = np.lexsort((-popularity, sig_of_row))
+    sorted_sigs = sig_of_row[order]
+    starts = np.searchsorted(sorted_sigs, np.arange(n_sigs))
+    rank_in_sig = np.arange(len(order)) - starts[sorted_sigs]
+    pool = order[rank_in_sig <= top_k]
+    pool_sigs = sig_of_row[pool]
+    pool_pop = POPULARITY_WEIGHT * popularity[pool]
+    keep = min(top_k + 1, len(pool))
+
+    candidates = []
+    for start in range(0, n_sigs, BLOCK_SIZE):
+        scores = sig_sim[start:start + BLOCK_SIZE][:, pool_sigs] + pool_pop
+        best = np.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+        candidates.extend(pool[best])
+    return candidates
+
+
+def top_neighbours(genres_dense: np.ndarray, likes_norm: sp.csr_matrix, popularity: np.ndarray,
+                   rows: np.ndarray, top_k: int = TOP_K) -> Tuple[np.ndarray, np.ndarray]:
+    k = min(top_k, genres_dense.shape[0] - 1)
+    neighbours = np.zeros((len(rows), k), dtype=np.int64)
+    scores = np.full((len(rows), k), -np.inf, dtype=np.float32)
+
+    sig_vectors, sig_of_row = np.unique(genres_dense, axis=0, return_inverse=True)
+    sig_of_row = sig_of_row.ravel()
+    sig_sim = GENRE_WEIGHT * (sig_vectors @ sig_vectors.T)
+    by_genre = genre_candidates(sig_of_row, sig_sim, popularity, k)
+    likes_t = likes_norm.T.tocsr()
+
+    for start in range(0, len(rows), BLOCK_SIZE):
+        block = rows[start:start + BLOCK_SIZE]
+        co_likes = (likes_norm[block] @ likes_t).tocsr()
+        for offset, row in enumerate(block):
+            like_cols = co_likes.indices[co_likes.indptr[offset]:co_likes.indptr[offset + 1]]
+            like_vals = co_likes.data[co_likes.indptr[offset]:co_likes.indptr[offset + 1]]
+            candidates = np.union1d(by_genre[sig_of_row[row]], like_cols)
+
+            candidate_scores = sig_sim[sig_of_row[row], sig_of_row[candidates]]
+            candidate_scores += POPULARITY_WEIGHT * popularity[candidates]
+            candidate_scores[np.searchsorted(candidates, like_cols)] += CO_LIKE_WEIGHT * like_vals
+            candidate_scores[candidates == row] = -np.inf
+
+            take = min(k, len(candidates))
+            best = np.argpartition(-candidate_scores, take - 1)[:take]
+            best = best[np.argsort(-candidate_scores[best])]
+            neighbours[start + offset, :take] = candidates[best]
+            scores[start + offset, :take] = candidate_scores[best]
+
+    return neighbours, scores
+
+
+def load_from_database(cur) -> Tuple[np.ndarray, List[Tuple[int, str]], List[Tuple[int, int]]]:
+    cur.execute("SELECT id FROM stories WHERE status = 'published' ORDER BY id")
+    story_ids = np.array([row[0] for row in cur.fetchall()], dtype=np.int64)
+    cur.execute('SELECT story_id, genre FROM story_genres')
+    genre_pairs = cur.fetchall()
+    cur.execute('SELECT story_id, user_id FROM likes')
+    like_pairs = cur.fetchall()
+    return story_ids, genre_pairs, like_pairs
+
+
+def dirty_rows(cur, story_ids: np.ndarray) -> Tuple[np.ndarray, Any]:
+    cur.execute('SELECT MAX(built_at) FROM similarity_builds')
+    watermark = cur.fetchone()[0]
+    if watermark is None:
+        return np.arange(len(story_ids)), None
+
+    cur.execute('''
+        SELECT id FROM stories WHERE published_at > %s
+        UNION
+        SELECT story_id FROM likes WHERE created_at > %s
+    ''', (watermark, watermark))
+    changed = {row[0] for row in cur.fetchall()}
+    if changed:
+        cur.execute('SELECT story_id FROM story_similar WHERE similar_story_id = ANY(%s)', (list(changed),))
+        changed.update(row[0] for row in cur.fetchall())
+
+    return np.flatnonzero(np.isin(story_ids, list(changed))), watermark
+
+
+def write_neighbours(cur, story_ids: np.ndarray, rows: np.ndarray,
+                     neighbours: np.ndarray, scores: np.ndarray) -> int:
+    from psycopg2.extras import execute_values
+
+    written = 0
+    for start in range(0, len(rows), 5000):
+        chunk = slice(start, start + 5000)
+        chunk_ids = story_ids[rows[chunk]].tolist()
+        cur.execute('DELETE FROM story_similar WHERE story_id = ANY(%s)', (chunk_ids,))
+        values = []
+        for story_id, neighbour_rows, neighbour_scores in zip(chunk_ids, neighbours[chunk], scores[chunk]):
+            for rank, (neighbour_row, score) in enumerate(zip(neighbour_rows, neighbour_scores), start=1):
+                if np.isfinite(score) and score > POPULARITY_WEIGHT:
+                    values.append((story_id, rank, int(story_ids[neighbour_row]), float(score)))
+        execute_values(cur, '''
+            INSERT INTO story_similar (story_id, rank, similar_story_id, score) VALUES %s
+        ''', values, page_size=10000)
+        written += len(values)
+    return written
+
+
+def synthetic_data(n_stories: int, n_users: int, n_genres: int = 24,
+                   likes_per_story: int = 20, seed: int = 7) -> Tuple[np.ndarray, List, List]:
+    rng = np.random.default_rng(seed)
+    story_ids = np.arange(1, n_stories + 1, dtype=np.int64)
+    genre_pairs = []
+    for story_id in story_ids.tolist():
+        for genre in rng.choice(n_genres, size=rng.integers(1, 4), replace=False).tolist():
+            genre_pairs.append((story_id, f'genre-{genre}'))
+    like_counts = rng.poisson(likes_per_story, size=n_stories)
+    like_story = np.repeat(story_ids, like_counts)
+    like_users = rng.zipf(1.3, size=len(like_story)) % n_users
+    return story_ids, genre_pairs, list(zip(like_story.tolist(), like_users.tolist()))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Build the story similarity index')
+    parser.add_argument('--full', action='store_true', help='rewrite neighbours for every story')
+    parser.add_argument('--synthetic', type=int, metavar='N', help='time a build over N synthetic stories')
+    args = parser.parse_args()
+
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+
+    if args.synthetic:
+        story_ids, genre_pairs, like_pairs = synthetic_data(args.synthetic, n_users=args.synthetic * 2)
+        timings['loadSeconds'] = time.perf_counter() - started
+        step = time.perf_counter()
+        genres_dense, likes_norm, popularity = build_matrices(story_ids, genre_pairs, like_pairs)
+        timings['matricesSeconds'] = time.perf_counter() - step
+        step = time.perf_counter()
+        top_neighbours(genres_dense, likes_norm, popularity, np.arange(len(story_ids)))
+        timings['neighboursSeconds'] = time.perf_counter() - step
+        print({'stories': len(story_ids), 'likes': len(like_pairs),
+               **{k: round(v, 2) for k, v in timings.items()}})
+        return
+
+    import psycopg2
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    cur.execute('SELECT NOW()')
+    build_started_at_row = cur.fetchone()[0]
+
+    story_ids, genre_pairs, like_pairs = load_from_database(cur)
+    timings['loadSeconds'] = time.perf_counter() - started
+
+    if args.full:
+        rows = np.arange(len(story_ids))
+    else:
+        rows, _ = dirty_rows(cur, story_ids)
+
+    written = 0
+    if len(story_ids) > 1 and len(rows):
+        step = time.perf_counter()
+        genres_dense, likes_norm, popularity = build_matrices(story_ids, genre_pairs, like_pairs)
+        timings['matricesSeconds'] = time.perf_counter() - step
+        step = time.perf_counter()
+        neighbours, scores = top_neighbours(genres_dense, likes_norm, popularity, rows)
+        timings['neighboursSeconds'] = time.perf_counter() - step
+        step = time.perf_counter()
+        written = write_neighbours(cur, story_ids, rows, neighbours, scores)
+        timings['writeSeconds'] = time.perf_counter() - step
+
+    cur.execute('''
+        INSERT INTO similarity_builds (built_at, stories_rebuilt, rows_written, duration_ms)
+        VALUES (%s, %s, %s, %s)
+    ''', (build_started_at_row, len(rows), written, int((time.perf_counter() - started) * 1000)))
+    conn.commit()
+    cur.close()
+    conn.close()
+
+    print({'stories': len(story_ids), 'rebuilt': len(rows), 'rowsWritten': written,
+           **{k: round(v, 2) for k, v in timings.items()}})
+
+
+if __name__ == '__main__':
+    main()
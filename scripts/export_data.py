@@ -0,0 +1,104 @@
+'''
+Streams bulk exports to a file or stdout.
+
+Usage:
+  DATABASE_URL=postgres://... python scripts/export_data.py catalogue -o catalogue.ndjson.gz
+  DATABASE_URL=postgres://... python scripts/export_data.py author --id 7 --format csv -o author-7.csv.gz
+  DATABASE_URL=postgres://... python scripts/export_data.py user --id 42 --no-gzip > user-42.ndjson
+  DATABASE_URL=postgres://... python scripts/export_data.py catalogue -o /dev/null --materialize   # baseline
+
+Uses the export helpers from backend/stories (the same ones behind
+GET /stories?export=...). Rows come from server-side named cursors
+EXPORT_ITERSIZE at a time and are encoded and gzip-compressed as they
+arrive, so memory stays flat whatever the table size. --materialize loads
+every record before encoding, as fetchall() would, for comparison.
+
+Prints rows, bytes, throughput (MB/s of encoded output) and peak RSS to stderr.
+'''
+import argparse
+import importlib.util
+import json
+import os
+import resource
+import sys
+import time
+from typing import Any, Iterator
+
+import psycopg2
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+
+
+def load_stories_module() -> Any:
+    spec = importlib.util.spec_from_file_location('function_stories', os.path.join(BACKEND_DIR, 'stories', 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def counted(records: Iterator[Any], stats: dict) -> Iterator[Any]:
+    for record in records:
+        stats['rows'] += 1
+        yield record
+
+
+def measured(chunks: Iterator[str], stats: dict) -> Iterator[str]:
+    for chunk in chunks:
+        stats['rawBytes'] += len(chunk.encode('utf-8'))
+        yield chunk
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Export stories, comments and user data')
+    parser.add_argument('dataset', choices=['catalogue', 'author', 'user'])
+    parser.add_argument('--id', type=int, help='author id or user id')
+    parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson')
+    parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    parser.add_argument('--no-gzip', action='store_true')
+    parser.add_argument('--materialize', action='store_true', help='load all rows before encoding (baseline)')
+    args = parser.parse_args()
+
+    if args.dataset != 'catalogue' and args.id is None:
+        parser.error(f'--id is required for {args.dataset}')
+
+    stories = load_stories_module()
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    stats = {'rows': 0, 'rawBytes': 0, 'outputBytes': 0}
+    started = time.perf_counter()
+    try:
+        records = counted(stories.export_records(conn, args.dataset, {'id': args.id}), stats)
+        if args.materialize:
+            records = iter(list(records))
+        chunks = measured(stories.encode_records(records, args.format), stats)
+        if args.no_gzip:
+            for chunk in chunks:
+                data = chunk.encode('utf-8')
+                stats['outputBytes'] += len(data)
+                out.write(data)
+        else:
+            for data in stories.gzip_chunks(chunks):
+                stats['outputBytes'] += len(data)
+                out.write(data)
+        out.flush()
+    finally:
+        if args.output:
+            out.close()
+        conn.rollback()
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    stats.update({
+        'dataset': args.dataset,
+        'format': args.format,
+        'gzip': not args.no_gzip,
+        'materialized': args.materialize,
+        'seconds': round(elapsed, 3),
+        'mbPerSecond': round(stats['rawBytes'] / 1e6 / elapsed, 2) if elapsed else 0.0,
+        'peakRssMb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    })
+    print(json.dumps(stats), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+'''
+Load generator for the local gateway.
+
+Usage:
+  python scripts/load_test.py --target 'GET /stories' --target 'GET /stories?id=1' \
+      --concurrency 32 --requests 5000
+  python scripts/load_test.py --target 'POST /interactions {"storyId":1,"action":"view"}'
+
+Targets are picked round-robin. Each worker thread keeps one HTTP/1.1 keep-alive
+connection. Prints client-side latency percentiles per target (with the number
+of 429 responses), overall throughput and, when available, the gateway's own
+/__metrics report.
+'''
+import argparse
+import http.client
+import json
+import threading
+import time
+from typing import Dict, Any, List, Tuple
+from urllib.parse import urlsplit
+
+
+def parse_target(raw: str) -> Tuple[str, str, str]:
+    parts = raw.split(' ', 2)
+    if len(parts) == 1:
+        return 'GET', parts[0], ''
+    method, path = parts[0].upper(), parts[1]
+    return method, path, parts[2] if len(parts) > 2 else ''
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    if not ordered:
+        return 0.0
+    return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 3)
+
+
+def summarize(latencies: List[float], errors: int, rate_limited: int) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    return {
+        'requests': len(ordered) + errors,
+        'errors': errors,
+        'rateLimited': rate_limited,
+        'meanMs': round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+        'p50Ms': percentile(ordered, 0.50),
+        'p95Ms': percentile(ordered, 0.95),
+        'p99Ms': percentile(ordered, 0.99),
+        'maxMs': round(ordered[-1], 3) if ordered else 0.0
+    }
+
+
+def run(base: str, targets: List[Tuple[str, str, str]], headers: Dict[str, str],
+        concurrency: int, total: int) -> Dict[str, Any]:
+    url = urlsplit(base)
+    counter = iter(range(total))
+    lock = threading.Lock()
+    latencies: Dict[int, List[float]] = {i: [] for i in range(len(targets))}
+    errors: Dict[int, int] = {i: 0 for i in range(len(targets))}
+    rate_limited: Dict[int, int] = {i: 0 for i in range(len(targets))}
+
+    def worker() -> None:
+        conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+        while True:
+            with lock:
+                n = next(counter, None)
+            if n is None:
+                break
+            index = n % len(targets)
+            method, path, body = targets[index]
+            request_headers = dict(headers)
+            if body:
+                request_headers['Content-Type'] = 'application/json'
+            started = time.perf_counter()
+            try:
+                conn.request(method, path, body=body or None, headers=request_headers)
+                response = conn.getresponse()
+                response.read()
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    if response.status >= 500:
+                        errors[index] += 1
+                    else:
+                        latencies[index].append(elapsed)
+                        rate_limited[index] += response.status == 429
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+                with lock:
+                    errors[index] += 1
+        conn.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'elapsedSeconds': round(elapsed, 3),
+        'throughputRps': round(total / elapsed, 1) if elapsed else 0.0,
+        'targets': {
+            f'{m} {p}': summarize(latencies[i], errors[i], rate_limited[i]) for i, (m, p, _) in enumerate(targets)
+        }
+    }
+
+
+def fetch_gateway_metrics(base: str) -> Any:
+    url = urlsplit(base)
+    try:
+        conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=5)
+        conn.request('GET', '/__metrics')
+        response = conn.getresponse()
+        return json.loads(response.read()) if response.status == 200 else None
+    except (OSError, ValueError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Load test the local gateway')
+    parser.add_argument('--base', default='http://127.0.0.1:8000')
+    parser.add_argument('--target', action='append', required=True,
+                        help="'METHOD /path[?query] [json body]', repeatable")
+    parser.add_argument('--header', action='append', default=[], help="'Name: value', repeatable")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=1000)
+    args = parser.parse_args()
+
+    headers = {}
+    for raw in args.header:
+        key, _, value = raw.partition(':')
+        headers[key.strip()] = value.strip()
+
+    report = run(args.base, [parse_target(t) for t in args.target], headers, args.concurrency, args.requests)
+    report['gateway'] = fetch_gateway_metrics(args.base)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+'''
+Local gateway that hosts every function from backend/func2url.json in one process.
+
+Usage: DATABASE_URL=postgres://... python scripts/local_gateway.py --port 8000 --workers 4
+
+Each function is served under /<name> (e.g. /stories?id=1, /auth?resource=profile).
+Requests are translated into the platform event shape and executed by a pool of
+worker processes, so module-level state (connections, caches) behaves like it does
+in warm function instances. GET /__metrics returns per-route latency statistics.
+
+Long-polls (requests with a `wait` parameter, such as interactions?resource=comments)
+hold a worker for up to the wait time. At most --max-waits of them wait at once;
+beyond that the gateway rewrites `wait` to 0 so the function answers immediately
+with a Retry-After hint, and the client backs off before polling again, leaving
+the remaining workers for ordinary requests. A missing `wait` means no wait, as
+it does in the functions.
+'''
+import argparse
+import asyncio
+import base64
+import importlib.util
+import json
+import os
+import sys
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qsl
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+LATENCY_WINDOW = 10000
+MAX_BODY_BYTES = 10 * 1024 * 1024
+SHORTENED_WAIT_RETRY_SECONDS = 5
+
+STATUS_REASONS = {
+    200: 'OK', 201: 'Created', 204: 'No Content', 304: 'Not Modified',
+    400: 'Bad Request', 401: 'Unauthorized', 403: 'Forbidden', 404: 'Not Found',
+    405: 'Method Not Allowed', 409: 'Conflict', 413: 'Payload Too Large',
+    429: 'Too Many Requests', 500: 'Internal Server Error', 502: 'Bad Gateway'
+}
+
+_handlers: Dict[str, Any] = {}
+
+
+class LocalContext:
+    def __init__(self, function_name: str, request_id: str):
+        self.function_name = function_name
+        self.request_id = request_id
+
+
+def function_names() -> List[str]:
+    with open(os.path.join(BACKEND_DIR, 'func2url.json')) as f:
+        return sorted(json.load(f).keys())
+
+
+def load_handler(name: str) -> Any:
+    if name not in _handlers:
+        function_dir = os.path.join(BACKEND_DIR, name)
+        spec = importlib.util.spec_from_file_location(
+            f'function_{name.replace("-", "_")}', os.path.join(function_dir, 'index.py')
+        )
+        module = importlib.util.module_from_spec(spec)
+        sys.path.insert(0, function_dir)
+        try:
+            spec.loader.exec_module(module)
+        finally:
+            sys.path.remove(function_dir)
+        _handlers[name] = module.handler
+    return _handlers[name]
+
+
+def init_worker(names: List[str]) -> None:
+    for name in names:
+        load_handler(name)
+
+
+def invoke(name: str, event: Dict[str, Any]) -> Dict[str, Any]:
+    handler = load_handler(name)
+    context = LocalContext(name, event['requestContext']['requestId'])
+    try:
+        return handler(event, context)
+    except Exception as e:
+        return {
+            'statusCode': 502,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Function raised', 'type': type(e).__name__, 'message': str(e)})
+        }
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.count = 0
+        self.statuses: Dict[int, int] = {}
+        self.latencies_ms: deque = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, status: int, latency_ms: float) -> None:
+        self.count += 1
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.latencies_ms.append(latency_ms)
+
+    def summary(self) -> Dict[str, Any]:
+        ordered = sorted(self.latencies_ms)
+
+        def percentile(p: float) -> float:
+            if not ordered:
+                return 0.0
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 3)
+
+        return {
+            'requests': self.count,
+            'statuses': {str(k): v for k, v in sorted(self.statuses.items())},
+            'meanMs': round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+            'p50Ms': percentile(0.50),
+            'p95Ms': percentile(0.95),
+            'p99Ms': percentile(0.99),
+            'maxMs': round(ordered[-1], 3) if ordered else 0.0
+        }
+
+
+class Gateway:
+    def __init__(self, names: List[str], workers: int, max_waits: int):
+        self.names = names
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(names,))
+        self.metrics: Dict[str, RouteMetrics] = {name: RouteMetrics() for name in names}
+        self.started_at = time.time()
+        self.max_waits = max_waits
+        self.active_waits = 0
+        self.shortened_waits = 0
+
+    def build_event(self, method: str, target: str, headers: Dict[str, str], body: bytes,
+                    peer: Optional[Tuple[str, int]]) -> Tuple[str, Dict[str, Any]]:
+        url = urlsplit(target)
+        parts = [p for p in url.path.split('/') if p]
+        name = parts[0] if parts else ''
+        try:
+            body_text, is_base64 = body.decode('utf-8'), False
+        except UnicodeDecodeError:
+            body_text, is_base64 = base64.b64encode(body).decode('ascii'), True
+        event = {
+            'httpMethod': method,
+            'url': target,
+            'path': '/' + '/'.join(parts[1:]),
+            'headers': headers,
+            'queryStringParameters': dict(parse_qsl(url.query, keep_blank_values=True)),
+            'body': body_text,
+            'isBase64Encoded': is_base64,
+            'requestContext': {
+                'requestId': uuid.uuid4().hex,
+                'identity': {'sourceIp': peer[0] if peer else '127.0.0.1'}
+            }
+        }
+        return name, event
+
+    def metrics_report(self) -> Dict[str, Any]:
+        return {
+            'uptimeSeconds': round(time.time() - self.started_at, 1),
+            'longPolls': {'active': self.active_waits, 'max': self.max_waits, 'shortened': self.shortened_waits},
+            'routes': {name: m.summary() for name, m in self.metrics.items()}
+        }
+
+    async def dispatch(self, method: str, target: str, headers: Dict[str, str], body: bytes,
+                       peer: Optional[Tuple[str, int]]) -> Dict[str, Any]:
+        if urlsplit(target).path.rstrip('/') == '/__metrics':
+            return {'statusCode': 200, 'headers': {'Content-Type': 'application/json'},
+                    'body': json.dumps(self.metrics_report())}
+
+        name, event = self.build_event(method, target, headers, body, peer)
+        if name not in self.metrics:
+            return {'statusCode': 404, 'headers': {'Content-Type': 'application/json'},
+                    'body': json.dumps({'error': 'Unknown function', 'functions': self.names})}
+
+        params = event['queryStringParameters']
+        waiting = params.get('wait', '0') not in ('', '0')
+        shortened = waiting and self.active_waits >= self.max_waits
+        if shortened:
+            params['wait'] = '0'
+            self.shortened_waits += 1
+            waiting = False
+
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        if waiting:
+            self.active_waits += 1
+        try:
+            response = await loop.run_in_executor(self.pool, invoke, name, event)
+        finally:
+            if waiting:
+                self.active_waits -= 1
+        if shortened:
+            headers = response['headers'] = dict(response.get('headers') or {})
+            headers.setdefault('Retry-After', str(SHORTENED_WAIT_RETRY_SECONDS))
+            headers.setdefault('Access-Control-Expose-Headers', 'Retry-After')
+        self.metrics[name].record(response.get('statusCode', 200), (time.perf_counter() - started) * 1000)
+        return response
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        peer = writer.get_extra_info('peername')
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line or request_line in (b'\r\n', b'\n'):
+                    break
+                method, target, version = request_line.decode('latin-1').strip().split(' ', 2)
+
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip()] = value.strip()
+
+                lowered = {k.lower(): v for k, v in headers.items()}
+                length = int(lowered.get('content-length', 0) or 0)
+                keep_alive = lowered.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                if length > MAX_BODY_BYTES:
+                    response = {'statusCode': 413, 'body': ''}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    response = await self.dispatch(method, target, headers, body, peer)
+
+                await self.write_response(writer, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def write_response(self, writer: asyncio.StreamWriter, response: Dict[str, Any], keep_alive: bool) -> None:
+        status = response.get('statusCode', 200)
+        body = response.get('body', '') or ''
+        if response.get('isBase64Encoded'):
+            payload = base64.b64decode(body)
+        else:
+            payload = body.encode('utf-8') if isinstance(body, str) else body
+
+        headers = dict(response.get('headers') or {})
+        headers['Content-Length'] = str(len(payload))
+        headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+
+        head = f'HTTP/1.1 {status} {STATUS_REASONS.get(status, "Unknown")}\r\n'
+        head += ''.join(f'{k}: {v}\r\n' for k, v in headers.items())
+        writer.write(head.encode('latin-1') + b'\r\n' + payload)
+        await writer.drain()
+
+
+async def serve(host: str, port: int, workers: int, max_waits: int) -> None:
+    names = function_names()
+    gateway = Gateway(names, workers, max_waits)
+    server = await asyncio.start_server(gateway.handle_connection, host, port)
+    print(f'Local gateway on http://{host}:{port} with {workers} workers ({max_waits} long-polls)')
+    for name in names:
+        print(f'  /{name}')
+    print('  /__metrics')
+    async with server:
+        await server.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Serve all backend functions from one local process')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+    parser.add_argument('--max-waits', type=int, default=None,
+                        help='concurrent long-polls allowed to wait (default: half the workers)')
+    args = parser.parse_args()
+    max_waits = args.max_waits if args.max_waits is not None else max(1, args.workers // 2)
+
+    if 'DATABASE_URL' not in os.environ:
+        sys.exit('DATABASE_URL must be set')
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, max_waits))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
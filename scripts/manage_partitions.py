@@ -0,0 +1,163 @@
+'''
+Maintains the partitions created by V0017.
+
+Usage:
+  DATABASE_URL=postgres://... python scripts/manage_partitions.py              # run once (cron: daily)
+  DATABASE_URL=postgres://... python scripts/manage_partitions.py --dry-run
+
+sessions is range-partitioned by expires_at, one partition per day:
+  - partitions are created AHEAD_DAYS ahead, longer than the 30 day session TTL,
+    so logins never land in sessions_default. Rows that did land there are moved
+    into the new partition before it is attached.
+  - a partition whose whole day has passed only holds expired sessions and is
+    dropped, which replaces DELETE ... WHERE expires_at < NOW() and its vacuum.
+likes and comments are hash-partitioned by story_id and need no upkeep; their
+per-partition row counts are reported so skew is visible.
+'''
+import argparse
+import json
+import os
+import re
+import time
+from datetime import date, timedelta
+from typing import Dict, Any, List
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+AHEAD_DAYS = 35
+SESSION_PARTITION = re.compile(r'^sessions_p(\d{8})$')
+LOCK_KEY = 'manage_partitions'
+
+
+def list_partitions(cur, parent: str) -> List[Dict[str, Any]]:
+    cur.execute('''
+        SELECT c.relname AS name, c.reltuples::bigint AS rows,
+               pg_total_relation_size(c.oid) AS bytes
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+        ORDER BY c.relname
+    ''', (parent,))
+    return [dict(row) for row in cur.fetchall()]
+
+
+def session_partition_days(partitions: List[Dict[str, Any]]) -> Dict[date, str]:
+    days = {}
+    for partition in partitions:
+        match = SESSION_PARTITION.match(partition['name'])
+        if match:
+            raw = match.group(1)
+            days[date(int(raw[:4]), int(raw[4:6]), int(raw[6:]))] = partition['name']
+    return days
+
+
+def create_session_partition(cur, day: date) -> int:
+    name = f"sessions_p{day.strftime('%Y%m%d')}"
+    cur.execute(f'CREATE TABLE {name} (LIKE sessions INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    cur.execute(f'''
+        WITH moved AS (
+            DELETE FROM sessions_default
+            WHERE expires_at >= %s AND expires_at < %s
+            RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    ''', (day, day + timedelta(days=1)))
+    moved = cur.rowcount
+    cur.execute(f'ALTER TABLE sessions ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)',
+                (day, day + timedelta(days=1)))
+    return moved
+
+
+def maintain_sessions(conn, ahead_days: int, dry_run: bool) -> Dict[str, Any]:
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur.execute('SELECT pg_try_advisory_xact_lock(hashtext(%s)) AS locked', (LOCK_KEY,))
+    if not cur.fetchone()['locked']:
+        conn.rollback()
+        cur.close()
+        return {'skipped': 'another run holds the lock'}
+
+    cur.execute('SELECT CURRENT_DATE AS today')
+    today = cur.fetchone()['today']
+    existing = session_partition_days(list_partitions(cur, 'sessions'))
+
+    created, moved = [], 0
+    started = time.perf_counter()
+    for offset in range(ahead_days + 1):
+        day = today + timedelta(days=offset)
+        if day not in existing:
+            created.append(day.isoformat())
+            if not dry_run:
+                moved += create_session_partition(cur, day)
+    create_ms = (time.perf_counter() - started) * 1000
+
+    dropped = []
+    started = time.perf_counter()
+    for day, name in sorted(existing.items()):
+        if day < today:
+            dropped.append(name)
+            if not dry_run:
+                cur.execute(f'DROP TABLE {name}')
+    drop_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    if dry_run:
+        cur.execute('SELECT COUNT(*) AS count FROM sessions_default WHERE expires_at < NOW()')
+        default_expired = cur.fetchone()['count']
+    else:
+        cur.execute('DELETE FROM sessions_default WHERE expires_at < NOW()')
+        default_expired = cur.rowcount
+    default_ms = (time.perf_counter() - started) * 1000
+
+    if dry_run:
+        conn.rollback()
+    else:
+        conn.commit()
+    cur.close()
+    return {
+        'created': created,
+        'rowsMovedFromDefault': moved,
+        'dropped': dropped,
+        'expiredDeletedFromDefault': default_expired,
+        'createMs': round(create_ms, 3),
+        'dropMs': round(drop_ms, 3),
+        'defaultCleanupMs': round(default_ms, 3)
+    }
+
+
+def hash_partition_report(conn, parent: str) -> Dict[str, Any]:
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    partitions = list_partitions(cur, parent)
+    cur.close()
+    conn.rollback()
+    rows = [max(p['rows'], 0) for p in partitions]
+    mean = sum(rows) / len(rows) if rows else 0
+    return {
+        'partitions': len(partitions),
+        'rows': sum(rows),
+        'bytes': sum(p['bytes'] for p in partitions),
+        'skew': round(max(rows) / mean, 2) if mean else 0.0
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Create and drop table partitions')
+    parser.add_argument('--ahead-days', type=int, default=AHEAD_DAYS)
+    parser.add_argument('--dry-run', action='store_true', help='report what would change and roll back')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        report = {
+            'sessions': maintain_sessions(conn, args.ahead_days, args.dry_run),
+            'likes': hash_partition_report(conn, 'likes'),
+            'comments': hash_partition_report(conn, 'comments'),
+            'dryRun': args.dry_run
+        }
+    finally:
+        conn.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
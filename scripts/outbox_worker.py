@@ -0,0 +1,403 @@
+'''
+Consumes interaction_outbox events written by backend/interactions.
+
+Usage:
+  DATABASE_URL=postgres://... python scripts/outbox_worker.py --consumers 4 --batch-size 500
+  DATABASE_URL=postgres://... python scripts/outbox_worker.py --once          # drain and exit
+
+Each consumer claims a batch with FOR UPDATE SKIP LOCKED, so any number of
+consumers (threads here, or several worker processes) can run side by side.
+A batch is folded into one set-based update per side effect:
+  - stories.likes / views / comments_count and the authors' user_stats
+  - commenters' user_stats.comments_count
+  - user_genre_affinity (same weights and decay as before)
+  - story_trending, a decayed engagement score
+  - notifications for story owners
+  - pg_notify('story_changes', ...) so caches can drop the touched stories
+  - engagement_hourly rollups per story, author and the whole site
+and the events are deleted in the same transaction.
+
+A consumer that hits a database error rolls back, reconnects if the
+connection was lost and retries with exponential backoff (up to
+ERROR_BACKOFF_MAX seconds); errors are logged to stderr and counted in the
+periodic report.
+
+Hourly rollups older than HOURLY_RETENTION_DAYS are compacted into
+engagement_daily every COMPACT_INTERVAL seconds (or once with --compact).
+'''
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Any, List, Tuple
+
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
+
+AFFINITY_WEIGHTS = {'like': 3.0, 'comment': 2.0, 'view': 1.0}
+AFFINITY_HALF_LIFE_DAYS = 30
+TRENDING_WEIGHTS = {'like': 3.0, 'comment': 5.0, 'view': 1.0}
+TRENDING_HALF_LIFE_HOURS = 24
+CHANGES_CHANNEL = 'story_changes'
+NOTIFY_CHUNK = 500
+HOURLY_RETENTION_DAYS = 7
+COMPACT_INTERVAL = 3600
+ERROR_BACKOFF_MIN = 0.5
+ERROR_BACKOFF_MAX = 30.0
+
+STORY_COUNTERS_SQL = f'''
+    WITH v(story_id, likes, views, comments) AS (VALUES %s),
+    updated AS (
+        UPDATE stories s
+        SET likes = s.likes + v.likes,
+            views = s.views + v.views,
+            comments_count = s.comments_count + v.comments
+        FROM v
+        WHERE s.id = v.story_id
+        RETURNING s.id, s.created_by, v.likes, v.views, v.comments
+    ),
+    owner_stats AS (
+        INSERT INTO user_stats (user_id, views_received, likes_received)
+        SELECT created_by, SUM(views), SUM(likes)
+        FROM updated
+        WHERE created_by IS NOT NULL
+        GROUP BY created_by
+        ORDER BY created_by
+        ON CONFLICT (user_id) DO UPDATE
+        SET views_received = user_stats.views_received + EXCLUDED.views_received,
+            likes_received = user_stats.likes_received + EXCLUDED.likes_received,
+            updated_at = NOW()
+    ),
+    trending AS (
+        INSERT INTO story_trending (story_id, score, updated_at)
+        SELECT id,
+               likes * {TRENDING_WEIGHTS['like']} + comments * {TRENDING_WEIGHTS['comment']}
+               + views * {TRENDING_WEIGHTS['view']},
+               NOW()
+        FROM updated
+        ORDER BY id
+        ON CONFLICT (story_id) DO UPDATE
+        SET score = story_trending.score
+                    * POWER(0.5, EXTRACT(EPOCH FROM NOW() - story_trending.updated_at) / 3600.0 / {TRENDING_HALF_LIFE_HOURS})
+                    + EXCLUDED.score,
+            updated_at = NOW()
+    ),
+    notified AS (
+        INSERT INTO notifications (user_id, story_id, likes, comments)
+        SELECT created_by, id, likes, comments
+        FROM updated
+        WHERE created_by IS NOT NULL AND (likes > 0 OR comments > 0)
+    )
+    SELECT id FROM updated
+'''
+
+ROLLUP_SQL = '''
+    WITH v(story_id, bucket, views, likes, comments) AS (VALUES %s)
+    INSERT INTO engagement_hourly (scope, scope_id, bucket, views, likes, comments)
+    SELECT scoped.scope, scoped.scope_id, v.bucket, SUM(v.views), SUM(v.likes), SUM(v.comments)
+    FROM v
+    JOIN stories s ON s.id = v.story_id
+    CROSS JOIN LATERAL (
+        VALUES ('story', s.id), ('author', s.author_id), ('site', 0)
+    ) AS scoped(scope, scope_id)
+    WHERE scoped.scope_id IS NOT NULL
+    GROUP BY scoped.scope, scoped.scope_id, v.bucket
+    ORDER BY scoped.scope, scoped.scope_id, v.bucket
+    ON CONFLICT (scope, scope_id, bucket) DO UPDATE
+    SET views = engagement_hourly.views + EXCLUDED.views,
+        likes = engagement_hourly.likes + EXCLUDED.likes,
+        comments = engagement_hourly.comments + EXCLUDED.comments
+'''
+
+COMPACT_SQL = f'''
+    WITH moved AS (
+        DELETE FROM engagement_hourly
+        WHERE bucket < date_trunc('day', NOW() - INTERVAL '{HOURLY_RETENTION_DAYS} days')
+        RETURNING scope, scope_id, bucket, views, likes, comments
+    )
+    INSERT INTO engagement_daily (scope, scope_id, day, views, likes, comments)
+    SELECT scope, scope_id, bucket::date, SUM(views), SUM(likes), SUM(comments)
+    FROM moved
+    GROUP BY scope, scope_id, bucket::date
+    ON CONFLICT (scope, scope_id, day) DO UPDATE
+    SET views = engagement_daily.views + EXCLUDED.views,
+        likes = engagement_daily.likes + EXCLUDED.likes,
+        comments = engagement_daily.comments + EXCLUDED.comments
+'''
+
+COMMENTER_STATS_SQL = '''
+    INSERT INTO user_stats (user_id, comments_count)
+    SELECT u.id, v.comments
+    FROM (VALUES %s) AS v(user_id, comments)
+    JOIN users u ON u.id = v.user_id
+    ORDER BY u.id
+    ON CONFLICT (user_id) DO UPDATE
+    SET comments_count = user_stats.comments_count + EXCLUDED.comments_count,
+        updated_at = NOW()
+'''
+
+AFFINITY_SQL = f'''
+    INSERT INTO user_genre_affinity (user_id, genre, score, updated_at)
+    SELECT v.user_id, sg.genre, SUM(v.weight), NOW()
+    FROM (VALUES %s) AS v(user_id, story_id, weight)
+    JOIN story_genres sg ON sg.story_id = v.story_id
+    GROUP BY v.user_id, sg.genre
+    ORDER BY v.user_id, sg.genre
+    ON CONFLICT (user_id, genre) DO UPDATE
+    SET score = user_genre_affinity.score
+                * POWER(0.5, EXTRACT(EPOCH FROM NOW() - user_genre_affinity.updated_at) / 86400.0 / {AFFINITY_HALF_LIFE_DAYS})
+                + EXCLUDED.score,
+        updated_at = NOW()
+'''
+
+
+def fold_events(events: List[Dict[str, Any]]) -> Tuple[List[tuple], List[tuple], List[tuple], List[tuple]]:
+    counters: Dict[int, List[int]] = defaultdict(lambda: [0, 0, 0])
+    hourly: Dict[Tuple[int, Any], List[int]] = defaultdict(lambda: [0, 0, 0])
+    commenters: Dict[int, int] = defaultdict(int)
+    affinity: Dict[Tuple[int, int], float] = defaultdict(float)
+
+    for event in events:
+        kind, story_id, user_id = event['event_type'], event['story_id'], event['user_id']
+        if kind not in AFFINITY_WEIGHTS:
+            continue
+        counters[story_id][('like', 'view', 'comment').index(kind)] += 1
+        hourly[(story_id, event['bucket'])][('view', 'like', 'comment').index(kind)] += 1
+        if user_id:
+            affinity[(user_id, story_id)] += AFFINITY_WEIGHTS[kind]
+            if kind == 'comment':
+                commenters[user_id] += 1
+
+    story_rows = [(story_id, *counts) for story_id, counts in sorted(counters.items())]
+    commenter_rows = sorted(commenters.items())
+    affinity_rows = [(user_id, story_id, weight) for (user_id, story_id), weight in sorted(affinity.items())]
+    rollup_rows = [(story_id, bucket, *counts) for (story_id, bucket), counts in sorted(hourly.items())]
+    return story_rows, commenter_rows, affinity_rows, rollup_rows
+
+
+def process_batch(conn, batch_size: int) -> Dict[str, Any]:
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        cur.execute('''
+            SELECT id, event_type, story_id, user_id,
+                   date_trunc('hour', created_at) AS bucket,
+                   EXTRACT(EPOCH FROM NOW() - created_at) AS age_seconds
+            FROM interaction_outbox
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        ''', (batch_size,))
+        events = cur.fetchall()
+        if not events:
+            conn.commit()
+            return {'events': 0, 'lagSeconds': 0.0}
+
+        story_rows, commenter_rows, affinity_rows, rollup_rows = fold_events(events)
+        touched: List[int] = []
+        if story_rows:
+            touched = [row['id'] for row in execute_values(
+                cur, STORY_COUNTERS_SQL, story_rows, template='(%s::int, %s::int, %s::int, %s::int)',
+                page_size=len(story_rows), fetch=True
+            )]
+        if commenter_rows:
+            execute_values(cur, COMMENTER_STATS_SQL, commenter_rows,
+                           template='(%s::int, %s::int)', page_size=len(commenter_rows))
+        if affinity_rows:
+            execute_values(cur, AFFINITY_SQL, affinity_rows,
+                           template='(%s::int, %s::int, %s::real)', page_size=len(affinity_rows))
+        if rollup_rows:
+            execute_values(cur, ROLLUP_SQL, rollup_rows,
+                           template='(%s::int, %s::timestamp, %s::int, %s::int, %s::int)',
+                           page_size=len(rollup_rows))
+        for start in range(0, len(touched), NOTIFY_CHUNK):
+            cur.execute('SELECT pg_notify(%s, %s)',
+                        (CHANGES_CHANNEL, json.dumps({'stories': touched[start:start + NOTIFY_CHUNK]})))
+
+        cur.execute('DELETE FROM interaction_outbox WHERE id = ANY(%s)', ([e['id'] for e in events],))
+        conn.commit()
+        return {'events': len(events), 'lagSeconds': float(max(e['age_seconds'] for e in events))}
+    except psycopg2.extensions.TransactionRollbackError:
+        conn.rollback()
+        return {'events': 0, 'lagSeconds': 0.0, 'retried': True}
+    except psycopg2.Error as error:
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                conn.close()
+        return {'events': 0, 'lagSeconds': 0.0, 'error': f'{type(error).__name__}: {error}'.strip()}
+    finally:
+        if not cur.closed:
+            cur.close()
+
+
+def outbox_backlog(conn) -> Dict[str, Any]:
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur.execute('''
+        SELECT COALESCE(MAX(id) - MIN(id) + 1, 0) AS approx_pending,
+               COALESCE(EXTRACT(EPOCH FROM NOW() - MIN(created_at)), 0) AS oldest_seconds
+        FROM interaction_outbox
+    ''')
+    row = cur.fetchone()
+    conn.commit()
+    cur.close()
+    return {'approxPending': int(row['approx_pending']), 'oldestSeconds': round(float(row['oldest_seconds']), 3)}
+
+
+def compact_rollups(conn) -> int:
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        cur.execute("SELECT pg_try_advisory_xact_lock(hashtext('engagement_compaction')) AS locked")
+        if not cur.fetchone()['locked']:
+            conn.rollback()
+            return 0
+        cur.execute(COMPACT_SQL)
+        compacted = cur.rowcount
+        conn.commit()
+        return compacted
+    finally:
+        cur.close()
+
+
+class ConsumerStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events = 0
+        self.batches = 0
+        self.retries = 0
+        self.errors = 0
+        self.batch_ms: List[float] = []
+        self.max_lag = 0.0
+
+    def record(self, result: Dict[str, Any], elapsed_ms: float) -> None:
+        with self.lock:
+            if result.get('retried'):
+                self.retries += 1
+            if result.get('error'):
+                self.errors += 1
+            if result['events']:
+                self.events += result['events']
+                self.batches += 1
+                self.batch_ms.append(elapsed_ms)
+                self.max_lag = max(self.max_lag, result['lagSeconds'])
+
+    def drain(self) -> Dict[str, Any]:
+        with self.lock:
+            ordered = sorted(self.batch_ms)
+            report = {
+                'events': self.events,
+                'batches': self.batches,
+                'deadlockRetries': self.retries,
+                'errors': self.errors,
+                'batchP50Ms': round(ordered[len(ordered) // 2], 3) if ordered else 0.0,
+                'batchMaxMs': round(ordered[-1], 3) if ordered else 0.0,
+                'maxLagSeconds': round(self.max_lag, 3)
+            }
+            self.events = self.batches = self.retries = self.errors = 0
+            self.batch_ms = []
+            self.max_lag = 0.0
+            return report
+
+
+def log_error(message: str) -> None:
+    print(json.dumps({'thread': threading.current_thread().name, 'error': message}), file=sys.stderr, flush=True)
+
+
+def consume(stats: ConsumerStats, stop: threading.Event, batch_size: int, idle_sleep: float, once: bool) -> None:
+    conn = None
+    backoff = ERROR_BACKOFF_MIN
+    try:
+        while not stop.is_set():
+            if conn is None or conn.closed:
+                try:
+                    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+                except psycopg2.Error as error:
+                    log_error(f'connect failed: {error}'.strip())
+                    stop.wait(backoff)
+                    backoff = min(backoff * 2, ERROR_BACKOFF_MAX)
+                    continue
+            started = time.perf_counter()
+            result = process_batch(conn, batch_size)
+            stats.record(result, (time.perf_counter() - started) * 1000)
+            if result.get('error'):
+                log_error(result['error'])
+                stop.wait(backoff)
+                backoff = min(backoff * 2, ERROR_BACKOFF_MAX)
+                continue
+            backoff = ERROR_BACKOFF_MIN
+            if not result['events'] and not result.get('retried'):
+                if once:
+                    return
+                stop.wait(idle_sleep)
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Process interaction outbox events')
+    parser.add_argument('--consumers', type=int, default=2)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--idle-sleep', type=float, default=0.5, help='seconds to wait when the outbox is empty')
+    parser.add_argument('--report-interval', type=float, default=10.0)
+    parser.add_argument('--once', action='store_true', help='drain the outbox and exit')
+    parser.add_argument('--compact', action='store_true', help='compact old hourly rollups into daily and exit')
+    args = parser.parse_args()
+
+    if args.compact:
+        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        started = time.perf_counter()
+        compacted = compact_rollups(conn)
+        conn.close()
+        print(json.dumps({'dailyRowsWritten': compacted, 'elapsedMs': round((time.perf_counter() - started) * 1000, 3)}))
+        return
+
+    stats = ConsumerStats()
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=consume, args=(stats, stop, args.batch_size, args.idle_sleep, args.once),
+                         name=f'outbox-consumer-{i}', daemon=True)
+        for i in range(args.consumers)
+    ]
+    for t in threads:
+        t.start()
+
+    monitor = psycopg2.connect(os.environ['DATABASE_URL'])
+    last_report = time.perf_counter()
+    last_compaction = 0.0
+    try:
+        while any(t.is_alive() for t in threads):
+            time.sleep(min(args.report_interval, 1.0))
+            now = time.perf_counter()
+            report_due = now - last_report >= args.report_interval or not any(t.is_alive() for t in threads)
+            try:
+                if monitor.closed:
+                    monitor = psycopg2.connect(os.environ['DATABASE_URL'])
+                if not args.once and now - last_compaction >= COMPACT_INTERVAL:
+                    compact_rollups(monitor)
+                    last_compaction = now
+                backlog = outbox_backlog(monitor) if report_due else None
+            except psycopg2.Error as error:
+                log_error(f'monitor: {error}'.strip())
+                if not monitor.closed:
+                    monitor.close()
+                backlog = None
+            if report_due:
+                report = stats.drain()
+                report['throughputEps'] = round(report['events'] / (now - last_report), 1)
+                report['backlog'] = backlog
+                print(json.dumps(report), flush=True)
+                last_report = now
+    except KeyboardInterrupt:
+        stop.set()
+        for t in threads:
+            t.join()
+    finally:
+        monitor.close()
+
+
+if __name__ == '__main__':
+    main()
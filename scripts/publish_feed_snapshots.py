@@ -0,0 +1,233 @@
+'''
+Pre-renders the public story lists and author leaderboards into feed_snapshots.
+
+Usage:
+  DATABASE_URL=postgres://... python scripts/publish_feed_snapshots.py              # build, then follow changes
+  DATABASE_URL=postgres://... python scripts/publish_feed_snapshots.py --once
+  DATABASE_URL=postgres://... python scripts/publish_feed_snapshots.py --out-dir dist/snapshots
+
+Snapshots are rendered with the handlers' own helpers (render_story_list,
+render_leaderboard), so a snapshot is byte-for-byte the JSON the handler would
+compute. Bodies are gzip-compressed and keyed by the SHA-1 of the JSON; a key
+whose hash did not change only gets its refreshed_at bumped. Handlers stop
+serving a snapshot that has not been refreshed for SNAPSHOT_MAX_AGE seconds.
+
+After the first full build the publisher listens on story_changes (sent by the
+outbox worker and the stories trigger) and, after a short debounce, re-renders
+only the unfiltered lists and the genres of the changed stories. Everything is
+rebuilt every --interval seconds, which also drops genres that no longer exist.
+Every --authors-interval seconds the author_leaderboard table is rebuilt and the
+leaderboard snapshots re-rendered from it; the handler only reads that table
+(it builds a mode inline only if it has never been built at all).
+
+--out-dir also writes each snapshot as <key>.<hash>.json.gz plus manifest.json,
+for serving from a CDN or static host.
+'''
+import argparse
+import gzip
+import hashlib
+import importlib.util
+import json
+import os
+import select
+import time
+from typing import Dict, Any, List, Optional, Set
+from urllib.parse import quote
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+CHANGES_CHANNEL = 'story_changes'
+DEBOUNCE_SECONDS = 2.0
+
+
+def load_function_module(name: str) -> Any:
+    spec = importlib.util.spec_from_file_location(f'function_{name}', os.path.join(BACKEND_DIR, name, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def render_story_snapshots(cur, stories: Any, genres: Optional[Set[str]]) -> Dict[str, str]:
+    bodies = {}
+    for sort_by in stories.STORY_LIST_ORDERS:
+        cur.execute(stories.PREPARED_STATEMENTS[f'story_list_{sort_by}'])
+        rows = cur.fetchall()
+        bodies[stories.story_list_snapshot_key(sort_by, None)] = stories.render_story_list(rows, None)
+        present = {g for row in rows for g in row['genre'] if g}
+        for genre in sorted(present if genres is None else genres & present):
+            bodies[stories.story_list_snapshot_key(sort_by, genre)] = stories.render_story_list(rows, genre)
+    return bodies
+
+
+def render_author_snapshots(conn, cur, authors: Any, tops: List[int]) -> Dict[str, str]:
+    sorts = list(authors.LEADERBOARD_SCORES.keys())
+    authors.rebuild_leaderboards(conn, cur, sorts)
+    bodies = {}
+    for sort_by in sorts:
+        for limit in tops:
+            authors.execute_prepared(cur, 'leaderboard_top', (sort_by, limit))
+            leaderboard = [authors.format_author(row) for row in cur.fetchall()]
+            bodies[authors.leaderboard_snapshot_key(sort_by, limit)] = authors.render_leaderboard(leaderboard, sort_by)
+    return bodies
+
+
+def snapshot_filename(key: str, content_hash: str) -> str:
+    return '/'.join(quote(part, safe='') for part in key.split(':')) + f'.{content_hash[:12]}.json.gz'
+
+
+def write_files(out_dir: str, written: Dict[str, Dict[str, Any]]) -> None:
+    manifest_path = os.path.join(out_dir, 'manifest.json')
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    for key, snapshot in written.items():
+        filename = snapshot_filename(key, snapshot['hash'])
+        path = os.path.join(out_dir, filename)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(snapshot['body'])
+        manifest[key] = filename
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def publish(conn, bodies: Dict[str, str], prune_prefix: Optional[str], out_dir: Optional[str]) -> Dict[str, Any]:
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur.execute('SELECT snapshot_key, content_hash FROM feed_snapshots WHERE snapshot_key = ANY(%s)', (list(bodies),))
+    current = {row['snapshot_key']: row['content_hash'] for row in cur.fetchall()}
+
+    changed, unchanged, raw_bytes, gzip_bytes = {}, [], 0, 0
+    for key, raw in bodies.items():
+        data = raw.encode('utf-8')
+        content_hash = hashlib.sha1(data).hexdigest()
+        if current.get(key) == content_hash:
+            unchanged.append(key)
+            continue
+        body = gzip.compress(data, compresslevel=9, mtime=0)
+        changed[key] = {'hash': content_hash, 'body': body}
+        raw_bytes += len(data)
+        gzip_bytes += len(body)
+        cur.execute('''
+            INSERT INTO feed_snapshots (snapshot_key, content_hash, body, raw_bytes, built_at, refreshed_at)
+            VALUES (%s, %s, %s, %s, NOW(), NOW())
+            ON CONFLICT (snapshot_key) DO UPDATE
+            SET content_hash = EXCLUDED.content_hash, body = EXCLUDED.body, raw_bytes = EXCLUDED.raw_bytes,
+                built_at = NOW(), refreshed_at = NOW()
+        ''', (key, content_hash, psycopg2.Binary(body), len(data)))
+
+    if unchanged:
+        cur.execute('UPDATE feed_snapshots SET refreshed_at = NOW() WHERE snapshot_key = ANY(%s)', (unchanged,))
+    pruned = 0
+    if prune_prefix:
+        cur.execute('DELETE FROM feed_snapshots WHERE snapshot_key LIKE %s AND snapshot_key <> ALL(%s)',
+                    (prune_prefix + '%', list(bodies)))
+        pruned = cur.rowcount
+    conn.commit()
+    cur.close()
+
+    if out_dir and changed:
+        write_files(out_dir, changed)
+    return {
+        'rendered': len(bodies),
+        'written': len(changed),
+        'unchanged': len(unchanged),
+        'pruned': pruned,
+        'rawBytes': raw_bytes,
+        'gzipBytes': gzip_bytes
+    }
+
+
+def changed_genres(conn, story_ids: Set[int]) -> Set[str]:
+    cur = conn.cursor()
+    cur.execute('SELECT DISTINCT genre FROM story_genres WHERE story_id = ANY(%s)', (list(story_ids),))
+    genres = {row[0] for row in cur.fetchall()}
+    cur.close()
+    conn.rollback()
+    return genres
+
+
+def build(conn, stories: Any, authors: Any, kind: str, genres: Optional[Set[str]],
+          tops: List[int], out_dir: Optional[str]) -> None:
+    started = time.perf_counter()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    if kind == 'authors':
+        bodies = render_author_snapshots(conn, cur, authors, tops)
+        prune_prefix = None
+    else:
+        bodies = render_story_snapshots(cur, stories, genres)
+        prune_prefix = 'stories:' if genres is None else None
+    cur.close()
+    conn.rollback()
+    report = publish(conn, bodies, prune_prefix, out_dir)
+    report.update({'kind': kind if genres is None else 'stories-incremental',
+                   'elapsedMs': round((time.perf_counter() - started) * 1000, 3)})
+    print(json.dumps(report), flush=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Publish pre-rendered feed snapshots')
+    parser.add_argument('--once', action='store_true', help='build everything once and exit')
+    parser.add_argument('--interval', type=float, default=300.0, help='seconds between full story rebuilds')
+    parser.add_argument('--authors-interval', type=float, default=60.0, help='seconds between leaderboard rebuilds')
+    parser.add_argument('--author-tops', default='4,10', help='leaderboard sizes to snapshot, comma-separated')
+    parser.add_argument('--out-dir', help='also write content-hashed .json.gz files and manifest.json here')
+    args = parser.parse_args()
+
+    tops = [int(top) for top in args.author_tops.split(',') if top.strip().isdigit()]
+    stories = load_function_module('stories')
+    authors = load_function_module('authors')
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+
+    build(conn, stories, authors, 'stories', None, tops, args.out_dir)
+    build(conn, stories, authors, 'authors', None, tops, args.out_dir)
+    if args.once:
+        conn.close()
+        return
+
+    listener = psycopg2.connect(os.environ['DATABASE_URL'])
+    listener.autocommit = True
+    listener.cursor().execute(f'LISTEN {CHANGES_CHANNEL}')
+    last_full = last_authors = time.monotonic()
+    pending: Set[int] = set()
+    first_pending = 0.0
+    try:
+        while True:
+            if select.select([listener], [], [], 1.0)[0]:
+                listener.poll()
+                while listener.notifies:
+                    notify = listener.notifies.pop(0)
+                    try:
+                        story_ids = json.loads(notify.payload).get('stories', [])
+                    except ValueError:
+                        continue
+                    if story_ids and not pending:
+                        first_pending = time.monotonic()
+                    pending.update(int(story_id) for story_id in story_ids)
+
+            now = time.monotonic()
+            if now - last_full >= args.interval:
+                build(conn, stories, authors, 'stories', None, tops, args.out_dir)
+                pending.clear()
+                last_full = now
+            elif pending and now - first_pending >= DEBOUNCE_SECONDS:
+                genres = changed_genres(conn, pending)
+                pending.clear()
+                build(conn, stories, authors, 'stories', genres, tops, args.out_dir)
+            if now - last_authors >= args.authors_interval:
+                build(conn, stories, authors, 'authors', None, tops, args.out_dir)
+                last_authors = now
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,356 @@
+'''
+Generates RSS/Atom feeds and a sharded sitemap into feed_snapshots.
+
+Usage:
+  SITE_URL=https://example.com DATABASE_URL=postgres://... python scripts/publish_syndication.py --once --full
+  SITE_URL=https://example.com DATABASE_URL=postgres://... python scripts/publish_syndication.py --interval 60
+
+Feeds (the latest FEED_ITEMS stories) exist for the whole site, each genre and
+each author, as RSS 2.0 and Atom. The sitemap is split into shards of
+SITEMAP_SHARD_SIZE story ids plus an index. backend/stories serves them:
+  GET /stories?feed=rss|atom[&genre=...|&author=N]
+  GET /stories?sitemap=index | ?sitemap=<shard>
+with ETag / Last-Modified and 304 responses.
+
+Runs are incremental: syndication_state keeps a high-water mark on
+stories.status_changed_at (set on insert and by every publish/unpublish, so
+approved and re-published stories count as changes even though their
+published_at is old), and only the global feeds plus the genre feeds, author
+feeds and sitemap shards touched by stories changed since then are re-rendered
+(with a SAFETY_WINDOW overlap for transactions that committed late). Every document
+is produced by a generator over an indexed query and gzip-compressed as it is
+written; documents whose hash did not change keep their built_at. Every run
+bumps refreshed_at on all syndication documents, so the handler (which drops
+documents older than SYNDICATION_MAX_AGE) keeps serving quiet feeds. --full
+rebuilds everything and drops documents for genres or authors that are gone,
+which also picks up deleted stories; the loop runs one every --full-interval
+seconds (default: daily).
+'''
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from typing import Dict, Any, Iterator, List, Set
+from urllib.parse import quote
+from xml.sax.saxutils import escape, quoteattr
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+STATE_NAME = 'stories'
+FEED_ITEMS = 50
+SITEMAP_SHARD_SIZE = 10000
+SAFETY_WINDOW = timedelta(minutes=5)
+FULL_RUN_INTERVAL = 24 * 3600
+SITE_TITLE = 'Dark Tales'
+
+FEED_ITEM_COLUMNS = '''
+    s.id, s.title, s.description, s.published_at, a.name AS author_name,
+    ARRAY(SELECT sg.genre FROM story_genres sg WHERE sg.story_id = s.id ORDER BY sg.genre) AS genre
+'''
+
+FEED_QUERIES = {
+    'global': f'''
+        SELECT {FEED_ITEM_COLUMNS}
+        FROM stories s
+        JOIN authors a ON a.id = s.author_id
+        WHERE s.status = 'published'
+        ORDER BY s.published_at DESC, s.id DESC
+        LIMIT %(limit)s
+    ''',
+    'genre': f'''
+        SELECT {FEED_ITEM_COLUMNS}
+        FROM story_genres g
+        JOIN stories s ON s.id = g.story_id
+        JOIN authors a ON a.id = s.author_id
+        WHERE g.genre = %(value)s AND s.status = 'published'
+        ORDER BY s.published_at DESC, s.id DESC
+        LIMIT %(limit)s
+    ''',
+    'author': f'''
+        SELECT {FEED_ITEM_COLUMNS}
+        FROM stories s
+        JOIN authors a ON a.id = s.author_id
+        WHERE s.author_id = %(value)s AND s.status = 'published'
+        ORDER BY s.published_at DESC, s.id DESC
+        LIMIT %(limit)s
+    '''
+}
+
+CHANGED_STORIES_SQL = '''
+    SELECT s.id, s.author_id, s.status_changed_at,
+           ARRAY(SELECT sg.genre FROM story_genres sg WHERE sg.story_id = s.id) AS genre
+    FROM stories s
+    WHERE s.status_changed_at > %s
+    ORDER BY s.status_changed_at
+'''
+
+SHARD_SQL = '''
+    SELECT id, published_at
+    FROM stories
+    WHERE status = 'published' AND id >= %s AND id < %s
+    ORDER BY id
+'''
+
+STORE_SQL = '''
+    INSERT INTO feed_snapshots (snapshot_key, content_hash, body, raw_bytes, built_at, refreshed_at)
+    VALUES (%s, %s, %s, %s, NOW(), NOW())
+    ON CONFLICT (snapshot_key) DO UPDATE
+    SET body = CASE WHEN feed_snapshots.content_hash = EXCLUDED.content_hash
+                    THEN feed_snapshots.body ELSE EXCLUDED.body END,
+        raw_bytes = EXCLUDED.raw_bytes,
+        built_at = CASE WHEN feed_snapshots.content_hash = EXCLUDED.content_hash
+                        THEN feed_snapshots.built_at ELSE NOW() END,
+        content_hash = EXCLUDED.content_hash,
+        refreshed_at = NOW()
+    RETURNING built_at = NOW() AS changed
+'''
+
+REFRESH_SQL = '''
+    UPDATE feed_snapshots SET refreshed_at = NOW()
+    WHERE snapshot_key LIKE 'rss:%' OR snapshot_key LIKE 'atom:%' OR snapshot_key LIKE 'sitemap:%'
+'''
+
+
+def load_stories_module() -> Any:
+    spec = importlib.util.spec_from_file_location('function_stories', os.path.join(BACKEND_DIR, 'stories', 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_stories_url() -> str:
+    with open(os.path.join(BACKEND_DIR, 'func2url.json')) as f:
+        return json.load(f)['stories']
+
+
+def utc(ts: datetime) -> datetime:
+    return ts.replace(microsecond=0, tzinfo=timezone.utc)
+
+
+def rss_chunks(title: str, site_url: str, self_url: str, rows: List[Dict[str, Any]]) -> Iterator[str]:
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom">\n<channel>\n'
+    yield f'<title>{escape(title)}</title>\n<link>{escape(site_url)}/</link>\n'
+    yield f'<description>{escape(title)}</description>\n<language>ru</language>\n'
+    yield f'<atom:link href={quoteattr(self_url)} rel="self" type="application/rss+xml"/>\n'
+    if rows:
+        yield f'<lastBuildDate>{format_datetime(utc(rows[0]["published_at"]))}</lastBuildDate>\n'
+    for row in rows:
+        link = f'{site_url}/story/{row["id"]}'
+        yield '<item>\n'
+        yield f'<title>{escape(row["title"])}</title>\n<link>{escape(link)}</link>\n'
+        yield f'<guid isPermaLink="true">{escape(link)}</guid>\n'
+        yield f'<description>{escape(row["description"] or "")}</description>\n'
+        for genre in row['genre']:
+            if genre:
+                yield f'<category>{escape(genre)}</category>\n'
+        yield f'<pubDate>{format_datetime(utc(row["published_at"]))}</pubDate>\n'
+        yield '</item>\n'
+    yield '</channel>\n</rss>\n'
+
+
+def atom_chunks(title: str, site_url: str, self_url: str, rows: List[Dict[str, Any]]) -> Iterator[str]:
+    updated = utc(rows[0]['published_at']) if rows else datetime(1970, 1, 1, tzinfo=timezone.utc)
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<feed xmlns="http://www.w3.org/2005/Atom" xml:lang="ru">\n'
+    yield f'<id>{escape(self_url)}</id>\n<title>{escape(title)}</title>\n<updated>{updated.isoformat()}</updated>\n'
+    yield f'<link rel="self" type="application/atom+xml" href={quoteattr(self_url)}/>\n'
+    yield f'<link rel="alternate" type="text/html" href={quoteattr(site_url + "/")}/>\n'
+    for row in rows:
+        link = f'{site_url}/story/{row["id"]}'
+        published = utc(row['published_at']).isoformat()
+        yield '<entry>\n'
+        yield f'<id>{escape(link)}</id>\n<title>{escape(row["title"])}</title>\n'
+        yield f'<link rel="alternate" type="text/html" href={quoteattr(link)}/>\n'
+        yield f'<published>{published}</published>\n<updated>{published}</updated>\n'
+        yield f'<author><name>{escape(row["author_name"] or "")}</name></author>\n'
+        yield f'<summary>{escape(row["description"] or "")}</summary>\n'
+        for genre in row['genre']:
+            if genre:
+                yield f'<category term={quoteattr(genre)}/>\n'
+        yield '</entry>\n'
+    yield '</feed>\n'
+
+
+def sitemap_shard_chunks(conn, shard: int, site_url: str) -> Iterator[str]:
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    if shard == 0:
+        yield f'<url><loc>{escape(site_url)}/</loc></url>\n'
+    cur = conn.cursor(name=f'sitemap_shard_{shard}')
+    cur.itersize = 2000
+    try:
+        cur.execute(SHARD_SQL, (shard * SITEMAP_SHARD_SIZE, (shard + 1) * SITEMAP_SHARD_SIZE))
+        for story_id, published_at in cur:
+            yield (f'<url><loc>{escape(site_url)}/story/{story_id}</loc>'
+                   f'<lastmod>{published_at.date().isoformat()}</lastmod></url>\n')
+    finally:
+        cur.close()
+    yield '</urlset>\n'
+
+
+def sitemap_index_chunks(shards: List[Any], stories_url: str) -> Iterator[str]:
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for shard, built_at in shards:
+        yield (f'<sitemap><loc>{escape(stories_url)}?sitemap={shard}</loc>'
+               f'<lastmod>{utc(built_at).isoformat()}</lastmod></sitemap>\n')
+    yield '</sitemapindex>\n'
+
+
+def store(cur, stories: Any, key: str, chunks: Iterator[str]) -> bool:
+    digest = hashlib.sha1()
+    raw_bytes = 0
+
+    def hashed() -> Iterator[str]:
+        nonlocal raw_bytes
+        for chunk in chunks:
+            data = chunk.encode('utf-8')
+            digest.update(data)
+            raw_bytes += len(data)
+            yield chunk
+
+    body = b''.join(stories.gzip_chunks(hashed()))
+    cur.execute(STORE_SQL, (key, digest.hexdigest(), psycopg2.Binary(body), raw_bytes))
+    return cur.fetchone()['changed']
+
+
+def feed_title(scope: str, value: Any, rows: List[Dict[str, Any]]) -> str:
+    if scope == 'genre':
+        return f'{SITE_TITLE}: {value}'
+    if scope == 'author':
+        return f'{SITE_TITLE}: {rows[0]["author_name"]}' if rows else SITE_TITLE
+    return SITE_TITLE
+
+
+def run(conn, stories: Any, site_url: str, stories_url: str, full: bool) -> Dict[str, Any]:
+    started = time.perf_counter()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur.execute('SELECT high_water_mark FROM syndication_state WHERE name = %s FOR UPDATE', (STATE_NAME,))
+    state = cur.fetchone()
+    full = full or state is None
+
+    if full:
+        cur.execute("SELECT DISTINCT sg.genre FROM story_genres sg JOIN stories s ON s.id = sg.story_id WHERE s.status = 'published'")
+        genres: Set[str] = {row['genre'] for row in cur.fetchall()}
+        cur.execute("SELECT DISTINCT author_id FROM stories WHERE status = 'published' AND author_id IS NOT NULL")
+        authors: Set[int] = {row['author_id'] for row in cur.fetchall()}
+        cur.execute('''
+            SELECT (SELECT MAX(id) FROM stories WHERE status = 'published') AS max_id,
+                   (SELECT MAX(status_changed_at) FROM stories) AS hwm
+        ''')
+        bounds = cur.fetchone()
+        shards: Set[int] = set(range((bounds['max_id'] or 0) // SITEMAP_SHARD_SIZE + 1))
+        high_water_mark = bounds['hwm']
+        changed_stories = None
+    else:
+        cur.execute(CHANGED_STORIES_SQL, (state['high_water_mark'] - SAFETY_WINDOW,))
+        rows = cur.fetchall()
+        changed_stories = len(rows)
+        genres = {g for row in rows for g in row['genre'] if g}
+        authors = {row['author_id'] for row in rows if row['author_id']}
+        shards = {row['id'] // SITEMAP_SHARD_SIZE for row in rows}
+        high_water_mark = max([row['status_changed_at'] for row in rows] + [state['high_water_mark']])
+        if not rows:
+            cur.execute(REFRESH_SQL)
+            conn.commit()
+            cur.close()
+            return {'full': False, 'changedStories': 0, 'written': 0, 'rendered': 0,
+                    'elapsedMs': round((time.perf_counter() - started) * 1000, 3)}
+
+    scopes = [('global', None)] + [('genre', g) for g in sorted(genres)] + [('author', a) for a in sorted(authors)]
+    rendered, written = [], 0
+    for scope, value in scopes:
+        cur.execute(FEED_QUERIES[scope], {'value': value, 'limit': FEED_ITEMS})
+        rows = cur.fetchall()
+        title = feed_title(scope, value, rows)
+        for kind, render in (('rss', rss_chunks), ('atom', atom_chunks)):
+            key = stories.syndication_snapshot_key(kind, scope, value) if value is not None else stories.syndication_snapshot_key(kind)
+            params = f'feed={kind}' + (f'&{scope}={quote(str(value))}' if value is not None else '')
+            written += store(cur, stories, key, render(title, site_url, f'{stories_url}?{params}', rows))
+            rendered.append(key)
+
+    for shard in sorted(shards):
+        key = stories.syndication_snapshot_key('sitemap', value=shard)
+        written += store(cur, stories, key, sitemap_shard_chunks(conn, shard, site_url))
+        rendered.append(key)
+
+    if full:
+        cur.execute('''
+            DELETE FROM feed_snapshots
+            WHERE (snapshot_key LIKE 'rss:%%' OR snapshot_key LIKE 'atom:%%' OR snapshot_key LIKE 'sitemap:%%')
+              AND snapshot_key <> 'sitemap:index' AND snapshot_key <> ALL(%s)
+        ''', (rendered,))
+
+    cur.execute('''
+        SELECT split_part(snapshot_key, ':', 2)::int AS shard, built_at
+        FROM feed_snapshots
+        WHERE snapshot_key LIKE 'sitemap:%' AND snapshot_key <> 'sitemap:index'
+        ORDER BY 1
+    ''')
+    index_rows = [(row['shard'], row['built_at']) for row in cur.fetchall()]
+    written += store(cur, stories, stories.syndication_snapshot_key('sitemap', value='index'),
+                     sitemap_index_chunks(index_rows, stories_url))
+    rendered.append('sitemap:index')
+
+    cur.execute(REFRESH_SQL)
+    if high_water_mark is not None:
+        cur.execute('''
+            INSERT INTO syndication_state (name, high_water_mark, updated_at)
+            VALUES (%s, %s, NOW())
+            ON CONFLICT (name) DO UPDATE
+            SET high_water_mark = EXCLUDED.high_water_mark, updated_at = NOW()
+        ''', (STATE_NAME, high_water_mark))
+    conn.commit()
+    cur.close()
+    return {
+        'full': full,
+        'changedStories': changed_stories,
+        'rendered': len(rendered),
+        'written': written,
+        'sitemapShards': len(index_rows),
+        'highWaterMark': high_water_mark.isoformat() if high_water_mark else None,
+        'elapsedMs': round((time.perf_counter() - started) * 1000, 3)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Generate RSS/Atom feeds and the sitemap')
+    parser.add_argument('--site-url', default=os.environ.get('SITE_URL'), help='public site origin (or SITE_URL)')
+    parser.add_argument('--full', action='store_true', help='rebuild every document')
+    parser.add_argument('--once', action='store_true', help='run once and exit')
+    parser.add_argument('--interval', type=float, default=60.0)
+    parser.add_argument('--full-interval', type=float, default=FULL_RUN_INTERVAL,
+                        help='seconds between full rebuilds in the loop')
+    args = parser.parse_args()
+
+    if not args.site_url:
+        parser.error('--site-url or SITE_URL is required')
+
+    stories = load_stories_module()
+    stories_url = load_stories_url()
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    last_full = None if args.full else time.monotonic()
+    try:
+        while True:
+            full = last_full is None or time.monotonic() - last_full >= args.full_interval
+            print(json.dumps(run(conn, stories, args.site_url.rstrip('/'), stories_url, full)), flush=True)
+            if full:
+                last_full = time.monotonic()
+            if args.once:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 const AUTH_API = 'https://functions.poehali.dev/52f7c095-46c6-423b-a7f1-107fcec4ad8d';
 const SESSION_KEY = 'horror_session_token';
+const CONSISTENCY_KEY = 'horror_consistency_token';
 
 export interface User {
   id: number;
@@ -115,5 +116,37 @@ export const authService = {
 
   isAuthenticated(): boolean {
     return !!localStorage.getItem(SESSION_KEY);
+  },
+
+  getConsistencyToken(): string | null {
+    return sessionStorage.getItem(CONSISTENCY_KEY);
+  },
+
+  setConsistencyToken(token: string | undefined) {
+    if (token) {
+      sessionStorage.setItem(CONSISTENCY_KEY, token);
+    }
+  },
+
+  async postIdempotent(url: string, payload: unknown, retries = 2): Promise<Response> {
+    const token = this.getToken();
+    const init: RequestInit = {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'Idempotency-Key': crypto.randomUUID(),
+        ...(token ? { 'X-Session-Token': token } : {})
+      },
+      body: JSON.stringify(payload)
+    };
+    for (let attempt = 0; ; attempt++) {
+      try {
+        return await fetch(url, init);
+      } catch (error) {
+        if (attempt >= retries) {
+          throw error;
+        }
+      }
+    }
   }
 };
\ No newline at end of file
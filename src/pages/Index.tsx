@@ -6,6 +6,7 @@ import { Badge } from '@/components/ui/badge';
 import { Avatar, AvatarFallback, AvatarImage } from '@/components/ui/avatar';
 import { Separator } from '@/components/ui/separator';
 import Icon from '@/components/ui/icon';
+import { authService } from '@/lib/auth';
 
 interface Story {
   id: number;
@@ -34,7 +35,14 @@ const Index = () => {
 
   useEffect(() => {
     const fetchData = async () => {
-      const storiesRes = await fetch('https://functions.poehali.dev/abb0e032-b766-470f-a2cd-43149dc1dcd0');
+      const token = authService.getToken();
+      const consistencyToken = authService.getConsistencyToken();
+      const consistencyHeaders: Record<string, string> = consistencyToken ? { 'X-Consistency-Token': consistencyToken } : {};
+      const storiesRes = token
+        ? await fetch('https://functions.poehali.dev/abb0e032-b766-470f-a2cd-43149dc1dcd0?feed=personal', {
+            headers: { 'X-Session-Token': token, ...consistencyHeaders }
+          })
+        : await fetch('https://functions.poehali.dev/abb0e032-b766-470f-a2cd-43149dc1dcd0', { headers: consistencyHeaders });
       const storiesData = await storiesRes.json();
       setStories(storiesData.stories || []);
 
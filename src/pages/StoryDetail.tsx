@@ -8,6 +8,7 @@ import { Separator } from '@/components/ui/separator';
 import { Textarea } from '@/components/ui/textarea';
 import Icon from '@/components/ui/icon';
 import { useToast } from '@/hooks/use-toast';
+import { authService } from '@/lib/auth';
 
 interface Author {
   id: number;
@@ -41,49 +42,168 @@ interface Comment {
   likes: number;
 }
 
+const EMPTY_POLL_DELAY_MS = 1000;
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
 const StoryDetail = () => {
   const { id } = useParams();
   const navigate = useNavigate();
   const { toast } = useToast();
   const [story, setStory] = useState<Story | null>(null);
   const [comments, setComments] = useState<Comment[]>([]);
+  const [related, setRelated] = useState<Story[]>([]);
+  const [commentsCursor, setCommentsCursor] = useState<number | null>(null);
   const [newComment, setNewComment] = useState('');
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
-    const fetchStory = async () => {
-      const response = await fetch(`https://functions.poehali.dev/abb0e032-b766-470f-a2cd-43149dc1dcd0?id=${id}`);
+    const fetchStoryPage = async () => {
+      const token = authService.getToken();
+      const response = await fetch(
+        `https://functions.poehali.dev/abb0e032-b766-470f-a2cd-43149dc1dcd0?id=${id}&include=page`,
+        token ? { headers: { 'X-Session-Token': token } } : undefined
+      );
       const data = await response.json();
-      setStory(data);
-      
-      await fetch(`https://functions.poehali.dev/3acf387b-6b3b-4ab5-b117-a0568daa269e`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ storyId: id, action: 'view', userId: 1 })
-      });
-      
+      setStory(data.story);
+      setComments(data.comments || []);
+      setRelated(data.related || []);
+      setCommentsCursor(data.commentsCursor ?? 0);
       setLoading(false);
+
+      if (data.hasMoreComments) {
+        const consistencyToken = authService.getConsistencyToken();
+        const commentsResponse = await fetch(
+          `https://functions.poehali.dev/3acf387b-6b3b-4ab5-b117-a0568daa269e?storyId=${id}`,
+          consistencyToken ? { headers: { 'X-Consistency-Token': consistencyToken } } : undefined
+        );
+        const commentsData = await commentsResponse.json();
+        setComments((current) => {
+          const byId = new Map<number, Comment>();
+          [...current, ...(commentsData.comments || [])].forEach((comment: Comment) => byId.set(comment.id, comment));
+          return [...byId.values()].sort((a, b) => b.id - a.id);
+        });
+      }
+    };
+
+    fetchStoryPage();
+  }, [id]);
+
+  useEffect(() => {
+    if (loading) return;
+
+    const readProgress = () => {
+      const scrollable = document.documentElement.scrollHeight - window.innerHeight;
+      return scrollable > 0 ? Math.min(1, Math.max(0, window.scrollY / scrollable)) : 1;
+    };
+
+    let lastProgress = readProgress();
+    let lastSentAt = 0;
+
+    const token = authService.getToken();
+    if (!token) return;
+
+    const sendProgress = (final: boolean) => {
+      fetch(`https://functions.poehali.dev/3acf387b-6b3b-4ab5-b117-a0568daa269e`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'X-Session-Token': token },
+        body: JSON.stringify({ storyId: id, action: 'progress', progress: lastProgress, final }),
+        keepalive: final
+      }).catch(() => {});
+    };
+
+    const handleScroll = () => {
+      lastProgress = readProgress();
+      const now = Date.now();
+      if (now - lastSentAt > 3000) {
+        lastSentAt = now;
+        sendProgress(false);
+      }
+    };
+
+    const handleVisibilityChange = () => {
+      if (document.visibilityState === 'hidden') {
+        sendProgress(true);
+      }
     };
 
-    const fetchComments = async () => {
-      const response = await fetch(`https://functions.poehali.dev/3acf387b-6b3b-4ab5-b117-a0568daa269e?storyId=${id}`);
+    const restoreProgress = async () => {
+      const response = await fetch(
+        `https://functions.poehali.dev/3acf387b-6b3b-4ab5-b117-a0568daa269e?resource=progress&storyId=${id}`,
+        { headers: { 'X-Session-Token': token } }
+      );
       const data = await response.json();
-      setComments(data.comments || []);
+      if (data.progress > 0 && data.progress < 0.98) {
+        const scrollable = document.documentElement.scrollHeight - window.innerHeight;
+        window.scrollTo({ top: data.progress * scrollable });
+      }
     };
 
-    fetchStory();
-    fetchComments();
-  }, [id]);
+    restoreProgress().catch(() => {});
+    window.addEventListener('scroll', handleScroll, { passive: true });
+    document.addEventListener('visibilitychange', handleVisibilityChange);
+
+    return () => {
+      window.removeEventListener('scroll', handleScroll);
+      document.removeEventListener('visibilitychange', handleVisibilityChange);
+      sendProgress(true);
+    };
+  }, [id, loading]);
+
+  useEffect(() => {
+    if (commentsCursor === null) return;
+
+    const controller = new AbortController();
+    let cursor = commentsCursor;
+
+    const pollComments = async () => {
+      while (!controller.signal.aborted) {
+        try {
+          const response = await fetch(
+            `https://functions.poehali.dev/3acf387b-6b3b-4ab5-b117-a0568daa269e?resource=comments&storyId=${id}&after=${cursor}&wait=25`,
+            { signal: controller.signal }
+          );
+          const data = await response.json();
+          const incoming: Comment[] = (data.comments || []).slice().reverse();
+          if (incoming.length > 0) {
+            setComments((current) => {
+              const known = new Set(current.map((comment) => comment.id));
+              return [...incoming.filter((comment) => !known.has(comment.id)), ...current];
+            });
+          }
+          cursor = data.cursor ?? cursor;
+          // A busy server answers at once with a Retry-After hint instead of
+          // holding the request; back off rather than re-polling in a loop.
+          const retryAfter = Math.max(Number(response.headers.get('Retry-After')) || 0, Number(data.retry) || 0);
+          if (retryAfter > 1 || incoming.length === 0) {
+            await sleep(Math.max(retryAfter * 1000, EMPTY_POLL_DELAY_MS));
+          }
+        } catch {
+          if (controller.signal.aborted) return;
+          await sleep(5000);
+        }
+      }
+    };
+
+    pollComments();
+    return () => controller.abort();
+  }, [id, commentsCursor]);
 
   const handleLike = async () => {
-    const response = await fetch(`https://functions.poehali.dev/3acf387b-6b3b-4ab5-b117-a0568daa269e`, {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ storyId: id, action: 'like', userId: 1 })
-    });
+    if (!authService.isAuthenticated()) {
+      toast({ title: 'Войдите, чтобы ставить лайки', variant: 'destructive' });
+      return;
+    }
+
+    const response = await authService.postIdempotent(
+      `https://functions.poehali.dev/3acf387b-6b3b-4ab5-b117-a0568daa269e`,
+      { storyId: id, action: 'like' }
+    );
     const data = await response.json();
     
-    if (data.success && story) {
+    if (response.status === 401) {
+      toast({ title: 'Войдите, чтобы ставить лайки', variant: 'destructive' });
+    } else if (data.success && story) {
       setStory({ ...story, likes: data.likes });
       toast({ title: 'Лайк добавлен!' });
     } else {
@@ -93,22 +213,26 @@ const StoryDetail = () => {
 
   const handleAddComment = async () => {
     if (!newComment.trim()) return;
+    if (!authService.isAuthenticated()) {
+      toast({ title: 'Войдите, чтобы оставлять комментарии', variant: 'destructive' });
+      return;
+    }
 
-    const response = await fetch(`https://functions.poehali.dev/3acf387b-6b3b-4ab5-b117-a0568daa269e`, {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({
+    const response = await authService.postIdempotent(
+      `https://functions.poehali.dev/3acf387b-6b3b-4ab5-b117-a0568daa269e`,
+      {
         storyId: id,
         action: 'comment',
-        userId: 1,
-        userName: 'Гость',
         comment: newComment
-      })
-    });
+      }
+    );
     const data = await response.json();
 
     if (data.success) {
-      setComments([data.comment, ...comments]);
+      authService.setConsistencyToken(data.consistencyToken);
+      setComments((current) =>
+        current.some((comment) => comment.id === data.comment.id) ? current : [data.comment, ...current]
+      );
       setNewComment('');
       toast({ title: 'Комментарий добавлен!' });
     }
@@ -247,6 +371,42 @@ const StoryDetail = () => {
             </div>
           </CardContent>
         </Card>
+
+        {related.length > 0 && (
+          <div className="mt-8 space-y-4">
+            <h3 className="text-xl font-heading text-white flex items-center">
+              <Icon name="Sparkles" className="mr-2 text-horror-red" size={20} />
+              Похожие истории
+            </h3>
+            <div className="grid grid-cols-1 md:grid-cols-2 gap-4">
+              {related.map((item) => (
+                <Card
+                  key={item.id}
+                  className="story-card border-horror-red/20 cursor-pointer"
+                  onClick={() => navigate(`/story/${item.id}`)}
+                >
+                  <CardHeader>
+                    <CardTitle className="text-white font-heading text-lg">{item.title}</CardTitle>
+                    <p className="text-horror-gray text-sm">{item.author.name}</p>
+                  </CardHeader>
+                  <CardContent className="flex items-center justify-between text-horror-gray text-sm">
+                    <div className="flex flex-wrap gap-2">
+                      {item.genre.map((tag) => (
+                        <Badge key={tag} variant="secondary" className="bg-horror-red/20 text-horror-red border-horror-red/30">
+                          {tag}
+                        </Badge>
+                      ))}
+                    </div>
+                    <div className="flex items-center">
+                      <Icon name="Star" className="h-3 w-3 text-yellow-500 fill-current mr-1" />
+                      {item.rating}
+                    </div>
+                  </CardContent>
+                </Card>
+              ))}
+            </div>
+          </div>
+        )}
       </div>
     </div>
   );